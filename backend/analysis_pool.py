@@ -0,0 +1,183 @@
+"""Process pool for CPU-bound frame analysis
+
+Frames reach the workers through a shared-memory ring instead of being pickled: the
+parent copies each batch into a free slot and sends only the slot number. Workers are
+recycled after a number of tasks and run under an address-space limit, so a leaking or
+runaway analysis is contained to one short-lived process instead of the API.
+"""
+import asyncio
+import logging
+import multiprocessing
+import resource
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Shared-memory blocks a worker keeps mapped between tasks
+MAX_ATTACHED = 4
+
+_attached: "OrderedDict[str, shared_memory.SharedMemory]" = OrderedDict()
+
+
+class AnalysisCancelled(Exception):
+    """The analysis job was cancelled before all of its batches ran"""
+
+
+def _init_worker(memory_limit: int) -> None:
+    if memory_limit:
+        # Workers run one task at a time, so the process limit is the task limit
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    try:
+        import cv2
+        # One process per core already; cv2's own thread pool would only contend with its siblings
+        cv2.setNumThreads(1)
+    except ImportError:
+        pass
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    shm = _attached.pop(name, None) or shared_memory.SharedMemory(name=name)
+    _attached[name] = shm
+    while len(_attached) > MAX_ATTACHED:
+        try:
+            _attached.popitem(last=False)[1].close()
+        except BufferError:
+            pass
+    return shm
+
+
+def _run_slot(fn: Callable, name: str, shape: tuple, dtype: str, slot: int, count: int):
+    ring = np.ndarray(shape, dtype=dtype, buffer=_attach(name).buf)
+    return fn(ring[slot, :count])
+
+
+class FrameRing:
+    """`slots` batches of up to `batch` frames in one shared-memory block"""
+
+    def __init__(self, slots: int, batch: int, frame_shape: tuple, dtype=np.uint8):
+        self.shape = (slots, batch) + tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(self.shape)) * self.dtype.itemsize)
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+        self.free: asyncio.Queue = asyncio.Queue()
+        for slot in range(slots):
+            self.free.put_nowait(slot)
+
+    def close(self) -> None:
+        self.array = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class _Job:
+    def __init__(self):
+        self.cancelled = False
+        self.futures: List[asyncio.Future] = []
+        self.executors = set()
+
+
+class AnalysisPool:
+    """Runs `fn(frames)` over batches of frames on a pool of worker processes
+
+    `fn` must be a module-level function; it receives a read-only view of up to one
+    batch of frames and should return something small, like boxes or scores.
+    """
+
+    def __init__(self, workers: int, max_tasks_per_child: int = 200, memory_limit_mb: int = 2048,
+                 slots_per_worker: int = 2):
+        self.workers = workers
+        self.slots = workers * slots_per_worker
+        self.max_tasks_per_child = max_tasks_per_child
+        self.memory_limit = memory_limit_mb * 1024 * 1024
+        self.executor = self._new_executor()
+        self._jobs: Dict[str, _Job] = {}
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # Forking a process that runs an event loop and threads is unsafe, so workers are spawned fresh
+        return ProcessPoolExecutor(
+            self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.memory_limit,),
+            max_tasks_per_child=self.max_tasks_per_child,
+        )
+
+    def _replace_broken(self, job: _Job) -> None:
+        """Swap in a fresh executor if the one this job ran on is the current one; it is unusable for good"""
+        if self.executor in job.executors:
+            logger.warning("An analysis worker died (out of memory or crashed), restarting the pool")
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = self._new_executor()
+
+    async def map_batches(self, fn: Callable, batches: Iterable[np.ndarray], job_id: Optional[str] = None) -> list:
+        """fn's result for each batch, in order; batches are pulled from a thread so decoding never blocks the loop"""
+        job = _Job()
+        if job_id:
+            self._jobs[job_id] = job
+        iterator = iter(batches)
+        ring = None
+        try:
+            while True:
+                batch = await asyncio.to_thread(next, iterator, None)
+                if job.cancelled:
+                    raise AnalysisCancelled(job_id)
+                if batch is None:
+                    break
+                if ring is None:
+                    ring = FrameRing(self.slots, len(batch), batch.shape[1:], batch.dtype)
+                if len(batch) > ring.shape[1] or batch.shape[1:] != ring.shape[2:]:
+                    raise ValueError("Every batch must match the first batch's frame shape and be no larger")
+
+                # Waiting for a free slot is the backpressure that keeps decoding at most one ring ahead
+                slot = await ring.free.get()
+                ring.array[slot, :len(batch)] = batch
+                job.executors.add(self.executor)
+                future = asyncio.wrap_future(self.executor.submit(
+                    _run_slot, fn, ring.shm.name, ring.shape, ring.dtype.str, slot, len(batch)
+                ))
+                future.add_done_callback(lambda _, slot=slot: ring.free.put_nowait(slot))
+                job.futures.append(future)
+
+            try:
+                return [await future for future in job.futures]
+            except asyncio.CancelledError:
+                if job.cancelled:
+                    raise AnalysisCancelled(job_id)
+                raise
+        except BrokenProcessPool:
+            # Only the jobs that had batches on the dead pool fail; later ones get the new pool
+            self._replace_broken(job)
+            raise
+        finally:
+            for future in job.futures:
+                future.cancel()
+            if job_id:
+                self._jobs.pop(job_id, None)
+            try:
+                # Stops a generator's decoder now rather than whenever it is collected
+                getattr(iterator, "close", lambda: None)()
+            except ValueError:
+                # Still running in its thread; the caller's cancel token takes care of its subprocess
+                pass
+            if ring is not None:
+                # Batches already running keep their mapping; unlinking only drops the name
+                ring.close()
+
+    def cancel(self, job_id: str) -> bool:
+        """Stop a job: queued batches are dropped, and batches already running are left to finish"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        job.cancelled = True
+        for future in job.futures:
+            future.cancel()
+        return True
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,184 @@
+"""Content-addressed render outputs shared between clips and reference counted by clip ID"""
+import asyncio
+import contextlib
+import hashlib
+import hmac
+import json
+import logging
+import os
+import shutil
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+def artifact_key(video_key: str, start_time: float, end_time: Optional[float], features: List[str], preset: str,
+                 edits: Optional[List[List[float]]] = None) -> str:
+    """Hash of everything that determines the bytes of a rendered clip"""
+    parts = [
+        video_key,
+        round(float(start_time or 0), 3),
+        None if end_time is None else round(float(end_time), 3),
+        sorted(set(features or [])),
+        preset,
+    ]
+    if edits:
+        # Appended only when present, so keys of clips without an edit list stay as they were
+        parts.append(edits)
+    return hashlib.sha256(json.dumps(parts, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def signed_key(secret: str, key: str) -> str:
+    """Name under which an artifact is served without authentication; unlike its content key, nobody can derive it"""
+    return hmac.new(secret.encode("utf-8"), key.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+class ArtifactStore:
+    """One document per artifact; `refs` holds the IDs of the clips using it.
+
+    Adding a clip with $addToSet makes acquiring idempotent across job retries, and the file
+    is only removed once the last reference has been pulled.
+    """
+
+    def __init__(self, db, root_dir: str, collection: str = "artifacts",
+                 render_lease_seconds: float = 600, poll_interval: float = 1.0):
+        self.artifacts = db[collection]
+        self.root_dir = root_dir
+        self.render_lease = timedelta(seconds=render_lease_seconds)
+        self.poll_interval = poll_interval
+
+    async def ensure_indexes(self) -> None:
+        await self.artifacts.create_index("refs")
+
+    def path_for(self, key: str, extension: str) -> str:
+        return os.path.join(self.root_dir, key[:2], key[2:4], f"{key}{extension}")
+
+    async def acquire(self, key: str, clip_id: str) -> dict:
+        """Add a reference from clip_id, creating a pending artifact if none exists yet"""
+        try:
+            return await self.artifacts.find_one_and_update(
+                {"_id": key},
+                {
+                    "$addToSet": {"refs": clip_id},
+                    "$setOnInsert": {"status": "pending", "created_at": datetime.utcnow()},
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # Two concurrent upserts raced to insert; the loser just retries as an update
+            return await self.acquire(key, clip_id)
+
+    async def claim_render(self, key: str, owner: str) -> bool:
+        """Become the renderer of a pending, failed or abandoned artifact"""
+        now = datetime.utcnow()
+        claimed = await self.artifacts.find_one_and_update(
+            {"_id": key, "$or": [
+                {"status": {"$in": ["pending", "failed"]}},
+                {"status": "rendering", "render_lease_expires_at": {"$lt": now}},
+            ]},
+            {"$set": {"status": "rendering", "render_owner": owner, "render_lease_expires_at": now + self.render_lease}},
+        )
+        return claimed is not None
+
+    async def renew_render(self, key: str, owner: str) -> bool:
+        """Extend owner's render lease; False once another renderer has taken the artifact over"""
+        renewed = await self.artifacts.update_one(
+            {"_id": key, "status": "rendering", "render_owner": owner},
+            {"$set": {"render_lease_expires_at": datetime.utcnow() + self.render_lease}},
+        )
+        return renewed.matched_count > 0
+
+    @contextlib.asynccontextmanager
+    async def rendering(self, key: str, owner: str) -> AsyncIterator[None]:
+        """Keep owner's render lease alive for as long as the block runs, however long the render takes"""
+        async def heartbeat() -> None:
+            while True:
+                await asyncio.sleep(self.render_lease.total_seconds() / 3)
+                try:
+                    if not await self.renew_render(key, owner):
+                        logger.warning("Render lease on artifact %s was lost", key)
+                        return
+                except Exception as e:
+                    logger.warning("Could not renew render lease on artifact %s: %s", key, e)
+
+        task = asyncio.create_task(heartbeat())
+        try:
+            yield
+        finally:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def wait_ready(self, key: str, owner: str) -> Optional[dict]:
+        """Wait for another renderer; returns the ready artifact, or None once this caller should render it"""
+        while True:
+            artifact = await self.artifacts.find_one({"_id": key})
+            if artifact is None:
+                raise RuntimeError(f"Artifact {key} disappeared while waiting for it")
+            if artifact["status"] == "ready":
+                if os.path.exists(artifact["path"]):
+                    return artifact
+                # The file was lost (e.g. a wiped volume), so render it again
+                await self.artifacts.update_one({"_id": key, "status": "ready"}, {"$set": {"status": "pending"}})
+            if await self.claim_render(key, owner):
+                return None
+            await asyncio.sleep(self.poll_interval)
+
+    async def publish(self, key: str, source_path: str, extension: str, metadata: Optional[dict] = None) -> Optional[dict]:
+        """Move a finished render into place and mark the artifact ready"""
+        path = self.path_for(key, extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.move(source_path, path)
+        artifact = await self.artifacts.find_one_and_update(
+            {"_id": key},
+            {"$set": {
+                "status": "ready",
+                "path": path,
+                "size": os.path.getsize(path),
+                "metadata": metadata or {},
+                "ready_at": datetime.utcnow(),
+            }, "$unset": {"render_owner": "", "render_lease_expires_at": ""}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if artifact is None:
+            # Every clip referencing it was deleted while it rendered
+            os.remove(path)
+        return artifact
+
+    async def mark_failed(self, key: str, owner: str) -> None:
+        await self.artifacts.update_one(
+            {"_id": key, "render_owner": owner, "status": "rendering"},
+            {"$set": {"status": "failed"}},
+        )
+
+    async def release(self, key: str, clip_id: str) -> bool:
+        """Drop clip_id's reference, deleting the file once nothing uses it; True if it was deleted"""
+        await self.artifacts.update_one({"_id": key}, {"$pull": {"refs": clip_id}})
+        # Only the caller whose delete matches an empty refs array removes the file
+        orphan = await self.artifacts.find_one_and_delete({"_id": key, "refs": {"$size": 0}})
+        if orphan is None:
+            return False
+        if orphan.get("path"):
+            try:
+                os.remove(orphan["path"])
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("Could not remove artifact %s: %s", orphan["path"], e)
+        return True
+
+    async def stats(self) -> dict:
+        pipeline = [{"$group": {
+            "_id": "$status",
+            "artifacts": {"$sum": 1},
+            "references": {"$sum": {"$size": {"$ifNull": ["$refs", []]}}},
+            "bytes": {"$sum": {"$ifNull": ["$size", 0]}},
+        }}]
+        return {row["_id"]: {k: v for k, v in row.items() if k != "_id"} async for row in self.artifacts.aggregate(pipeline)}
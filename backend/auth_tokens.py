@@ -0,0 +1,176 @@
+"""Short-lived claim-carrying access tokens, rotating refresh tokens and an in-memory revocation filter"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set, Tuple
+
+from jose import jwt
+
+logger = logging.getLogger(__name__)
+
+
+class TokenIssuer:
+    """Access tokens carry role and active claims so authorization does not need the database.
+
+    Refresh tokens are opaque to clients, recorded in `refresh_tokens` and rotated on every use.
+    """
+
+    def __init__(self, db, secret_key: str, algorithm: str, access_ttl: timedelta, refresh_ttl: timedelta):
+        self.refresh_tokens = db.refresh_tokens
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.access_ttl = access_ttl
+        self.refresh_ttl = refresh_ttl
+
+    async def ensure_indexes(self) -> None:
+        await self.refresh_tokens.create_index("expires_at", expireAfterSeconds=0)
+        await self.refresh_tokens.create_index("user_id")
+
+    def create_access_token(self, user: dict) -> str:
+        now = datetime.utcnow()
+        claims = {
+            "sub": user["_id"],
+            "role": user["role"],
+            "active": user["is_active"],
+            "type": "access",
+            "jti": uuid.uuid4().hex,
+            "iat": now,
+            "exp": now + self.access_ttl,
+        }
+        return jwt.encode(claims, self.secret_key, algorithm=self.algorithm)
+
+    async def create_refresh_token(self, user_id: str) -> str:
+        now = datetime.utcnow()
+        jti = uuid.uuid4().hex
+        await self.refresh_tokens.insert_one({
+            "_id": jti,
+            "user_id": user_id,
+            "created_at": now,
+            "expires_at": now + self.refresh_ttl,
+        })
+        claims = {"sub": user_id, "type": "refresh", "jti": jti, "iat": now, "exp": now + self.refresh_ttl}
+        return jwt.encode(claims, self.secret_key, algorithm=self.algorithm)
+
+    async def issue(self, user: dict) -> dict:
+        return {
+            "access_token": self.create_access_token(user),
+            "refresh_token": await self.create_refresh_token(user["_id"]),
+            "token_type": "bearer",
+            "expires_in": int(self.access_ttl.total_seconds()),
+        }
+
+    async def redeem_refresh_token(self, token: str) -> Optional[str]:
+        """Consume a refresh token, returning its user ID; each refresh token works once"""
+        claims = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        if claims.get("type") != "refresh":
+            return None
+        record = await self.refresh_tokens.find_one_and_delete({"_id": claims.get("jti")})
+        if record is None:
+            return None
+        return record["user_id"]
+
+    async def revoke_refresh_tokens(self, user_id: str) -> None:
+        await self.refresh_tokens.delete_many({"user_id": user_id})
+
+
+class RevocationFilter:
+    """Revoked access tokens, mirrored in memory from the `revoked_tokens` collection.
+
+    Two kinds of entries exist: a single token by `jti`, and a user-wide cut-off that
+    invalidates every token issued to that user before `not_before`. Entries only need
+    to outlive the tokens they revoke, so a TTL index keeps the collection (and this
+    filter) down to the revocations of the last access-token lifetime.
+    """
+
+    def __init__(self, db, ttl: timedelta, sync_interval: float = 5.0):
+        self.revoked = db.revoked_tokens
+        self.ttl = ttl
+        self.sync_interval = sync_interval
+        self._jtis: Set[str] = set()
+        self._expiry: Dict[str, datetime] = {}
+        self._users: Dict[str, Tuple[datetime, datetime]] = {}
+        self._synced_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def ensure_indexes(self) -> None:
+        await self.revoked.create_index("expires_at", expireAfterSeconds=0)
+        await self.revoked.create_index("created_at")
+
+    def is_revoked(self, claims: dict) -> bool:
+        if claims.get("jti") in self._jtis:
+            return True
+        cutoff = self._users.get(claims.get("sub"))
+        if cutoff is None:
+            return False
+        issued_at = datetime.utcfromtimestamp(claims.get("iat", 0))
+        # iat has whole-second precision, so a token issued later in the cutoff's own second would look older
+        return issued_at < cutoff[0].replace(microsecond=0)
+
+    async def revoke_token(self, jti: str, expires_at: datetime) -> None:
+        now = datetime.utcnow()
+        await self.revoked.replace_one(
+            {"_id": f"jti:{jti}"},
+            {"kind": "jti", "jti": jti, "created_at": now, "expires_at": expires_at},
+            upsert=True,
+        )
+        self._add({"kind": "jti", "jti": jti, "expires_at": expires_at})
+
+    async def revoke_user(self, user_id: str) -> None:
+        """Invalidate every access token issued to user_id so far"""
+        now = datetime.utcnow()
+        entry = {"kind": "user", "user_id": user_id, "not_before": now, "created_at": now, "expires_at": now + self.ttl}
+        await self.revoked.replace_one({"_id": f"user:{user_id}"}, entry, upsert=True)
+        self._add(entry)
+
+    def _add(self, entry: dict) -> None:
+        if entry["kind"] == "jti":
+            self._jtis.add(entry["jti"])
+            self._expiry[entry["jti"]] = entry["expires_at"]
+        else:
+            self._users[entry["user_id"]] = (entry["not_before"], entry["expires_at"])
+
+    def _prune(self, now: datetime) -> None:
+        for jti, expires_at in list(self._expiry.items()):
+            if expires_at <= now:
+                self._jtis.discard(jti)
+                del self._expiry[jti]
+        for user_id, (_, expires_at) in list(self._users.items()):
+            if expires_at <= now:
+                del self._users[user_id]
+
+    async def sync(self) -> None:
+        """Pull entries added since the last sync, with a little overlap for clock skew between nodes"""
+        now = datetime.utcnow()
+        query = {"expires_at": {"$gt": now}}
+        if self._synced_at is not None:
+            query["created_at"] = {"$gte": self._synced_at - timedelta(seconds=self.sync_interval)}
+        async for entry in self.revoked.find(query):
+            self._add(entry)
+        self._synced_at = now
+        self._prune(now)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("Revocation sync failed")
+
+    async def start(self) -> None:
+        await self.sync()
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"revoked_tokens": len(self._jtis), "revoked_users": len(self._users), "synced_at": self._synced_at}
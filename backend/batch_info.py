@@ -0,0 +1,148 @@
+"""Video info for many URLs at once: playlists and channels are enumerated with flat extraction,
+then each video is resolved with bounded concurrency and reported as soon as it is ready
+"""
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, Iterable, List, Optional
+
+import yt_dlp
+
+from video_ids import extract_video_id, video_key
+
+logger = logging.getLogger(__name__)
+
+# A channel root lists its tabs (videos, shorts, live) as playlists of their own
+MAX_NESTING = 1
+
+
+def summarize(info: dict) -> dict:
+    """The video_info fields the API exposes, from full or flat extraction output"""
+    thumbnails = info.get("thumbnails") or [{}]
+    return {
+        "title": info.get("title") or "",
+        "duration": info.get("duration") or 0,
+        "thumbnail": info.get("thumbnail") or thumbnails[-1].get("url", ""),
+        "description": (info.get("description") or "")[:500],
+        "view_count": info.get("view_count") or 0,
+        "uploader": info.get("uploader") or info.get("channel") or "",
+    }
+
+
+def entry_url(entry: dict) -> str:
+    url = entry.get("url") or entry.get("webpage_url") or ""
+    if entry.get("ie_key") == "Youtube" and not url.startswith("http"):
+        url = f"https://www.youtube.com/watch?v={entry.get('id') or url}"
+    return url
+
+
+def flat_entries(url: str, limit: int) -> List[dict]:
+    """Up to `limit` videos behind a URL as {"video_key", "url", "video_info"}, without extracting each one
+
+    A URL naming one video is returned as is, even with a `list=` parameter, so single
+    videos cost no request here.
+    """
+    if extract_video_id(url):
+        return [{"video_key": video_key(url), "url": url, "video_info": None}]
+
+    options = {"quiet": True, "no_warnings": True, "extract_flat": "in_playlist", "playlistend": limit}
+    with yt_dlp.YoutubeDL(options) as ydl:
+        found = []
+        pending = [(ydl.extract_info(url, download=False), 0)]
+        while pending and len(found) < limit:
+            info, depth = pending.pop(0)
+            if info.get("_type") not in ("playlist", "multi_video"):
+                found.append({"video_key": video_key(info.get("webpage_url") or url), "url": info.get("webpage_url") or url,
+                              "video_info": summarize(info)})
+                continue
+            for entry in info.get("entries") or []:
+                if not entry or len(found) >= limit:
+                    continue
+                target = entry_url(entry)
+                if extract_video_id(target):
+                    found.append({"video_key": video_key(target), "url": target, "video_info": summarize(entry)})
+                elif depth < MAX_NESTING and target:
+                    pending.append((ydl.extract_info(target, download=False), depth + 1))
+        return found
+
+
+class BatchInfoExtractor:
+    """Streams video info for a batch of URLs
+
+    Extraction threads are bounded by one semaphore shared by every batch in the process,
+    so a channel import cannot starve single-video lookups running beside it.
+    """
+
+    def __init__(self, metadata, fetch_info: Callable[[str], dict], concurrency: int = 4, max_entries: int = 500):
+        self.metadata = metadata
+        self.fetch_info = fetch_info
+        self.max_entries = max_entries
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def _extract(self, func: Callable, *args):
+        async with self.semaphore:
+            return await asyncio.to_thread(func, *args)
+
+    async def _resolve(self, index: int, entry: dict, details: bool, known: dict) -> dict:
+        result = {"type": "video", "index": index, "video_key": entry["video_key"], "url": entry["url"]}
+        if entry["video_key"] in known:
+            return {**result, "source": "stored", "video_info": known[entry["video_key"]]}
+        if entry["video_info"] and not details:
+            return {**result, "source": "flat", "video_info": entry["video_info"]}
+        try:
+            info = await self._extract(self.fetch_info, entry["url"])
+        except Exception as e:
+            return {**result, "type": "error", "detail": getattr(e, "detail", None) or str(e)}
+        await self.metadata.upsert(entry["video_key"], info, entry["url"])
+        return {**result, "source": "extracted", "video_info": info}
+
+    async def stream(self, urls: Iterable[str], details: bool = True, limit: Optional[int] = None) -> AsyncIterator[dict]:
+        """One result per video in completion order, then a "done" summary; closing the iterator cancels the rest"""
+        limit = min(limit or self.max_entries, self.max_entries)
+        results: asyncio.Queue = asyncio.Queue()
+        seen = set()
+        tasks = set()
+
+        def finished(task: asyncio.Task) -> None:
+            tasks.discard(task)
+            if task.cancelled():
+                return
+            if task.exception() is not None:
+                logger.warning("Batch info task failed: %s", task.exception())
+                results.put_nowait({"type": "error", "detail": str(task.exception())})
+            else:
+                results.put_nowait(task.result())
+
+        def spawn(coro) -> None:
+            task = asyncio.ensure_future(coro)
+            tasks.add(task)
+            task.add_done_callback(finished)
+
+        async def enumerate_source(url: str) -> dict:
+            try:
+                entries = await self._extract(flat_entries, url, limit)
+            except Exception as e:
+                return {"type": "error", "url": url, "detail": str(e)}
+            fresh = []
+            for entry in entries:
+                if entry["video_key"] not in seen and len(seen) < limit:
+                    seen.add(entry["video_key"])
+                    fresh.append((len(seen) - 1, entry))
+            known = await self.metadata.get_many(entry["video_key"] for _, entry in fresh)
+            for index, entry in fresh:
+                spawn(self._resolve(index, entry, details, known))
+            return {"type": "source", "url": url, "entries": len(entries), "new": len(fresh)}
+
+        counts = {"video": 0, "error": 0}
+        try:
+            for url in dict.fromkeys(urls):
+                spawn(enumerate_source(url))
+            # Every task queues exactly one result, and sources spawn their videos before queuing theirs
+            while tasks or not results.empty():
+                result = await results.get()
+                if result["type"] in counts:
+                    counts[result["type"]] += 1
+                yield result
+            yield {"type": "done", "videos": counts["video"], "errors": counts["error"]}
+        finally:
+            for task in list(tasks):
+                task.cancel()
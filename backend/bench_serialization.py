@@ -0,0 +1,91 @@
+"""Before/after benchmark for serializing large clip lists
+
+Compares the generic path (jsonable_encoder + JSONResponse) with the typed path used by
+get_user_clips (ClipList validation + ORJSONResponse via typed_response).
+
+    python bench_serialization.py [--clips 1000] [--repeat 50]
+"""
+import argparse
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from server import ClipList, typed_response
+
+
+def make_clips(count: int) -> list:
+    now = datetime.utcnow()
+    features = ["auto_captions", "hook_titles", "face_tracking"]
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "name": f"Clip {i}",
+            "youtube_url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+            "start_time": float(i),
+            "end_time": float(i + 30),
+            "status": "completed",
+            "progress": {"stage": "done", "progress": 1.0, "message": None, "updated_at": now},
+            "created_at": now - timedelta(minutes=i),
+            "applied_features": [
+                {
+                    "feature_id": feature,
+                    "name": feature.replace("_", " ").title(),
+                    "result": "Feature applied",
+                    "confidence": 0.9,
+                    "processed_at": now,
+                }
+                for feature in features
+            ],
+            "video_info": {
+                "title": "A video title that is reasonably long for a benchmark",
+                "duration": 3600,
+                "thumbnail": "https://i.ytimg.com/vi/dQw4w9WgXcQ/maxresdefault.jpg",
+                "description": "x" * 500,
+                "view_count": 123456789,
+                "uploader": "Uploader",
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def generic(clips: list) -> bytes:
+    return JSONResponse(jsonable_encoder({"clips": clips})).body
+
+
+def typed(clips: list) -> bytes:
+    return typed_response(ClipList(clips=clips)).body
+
+
+def measure(fn, clips: list, repeat: int) -> list:
+    fn(clips)  # warm up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(clips)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark clip list serialization")
+    parser.add_argument("--clips", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    clips = make_clips(args.clips)
+    results = {name: measure(fn, clips, args.repeat) for name, fn in (("before", generic), ("after", typed))}
+
+    print(f"{args.clips} clips, {args.repeat} runs")
+    for name, timings in results.items():
+        print(f"  {name:>6}: median {statistics.median(timings):8.2f} ms   p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:8.2f} ms")
+    speedup = statistics.median(results["before"]) / statistics.median(results["after"])
+    print(f"  speedup: {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
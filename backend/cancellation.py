@@ -0,0 +1,179 @@
+"""Cancellation and deadlines that reach all the way down to ffmpeg and yt-dlp
+
+A CancelToken is bound to a job or request through a context variable. Every media
+subprocess started with `run` or `popen` while a token is bound gets its own process
+group and is registered with the token. Cancelling the token, or running past its
+deadline, then kills the whole process tree at once, children of children included.
+
+`asyncio.to_thread` carries the context into its worker thread; plain
+`loop.run_in_executor` does not, so media work has to be started with the former.
+"""
+import contextlib
+import contextvars
+import os
+import signal
+import subprocess
+import threading
+import time
+from typing import Callable, Iterator, List, Optional
+
+
+class Cancelled(Exception):
+    """The job or request that started the work was cancelled"""
+
+
+class DeadlineExceeded(Exception):
+    """Work ran past the deadline of its job or stage"""
+
+
+def kill_group(process: subprocess.Popen) -> None:
+    # Output of a cancelled run is discarded, so there is no reason to let ffmpeg finish its trailer
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class CancelToken:
+    """Cancellation state of one job or request; `reason` is None until it is cancelled"""
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.reason: Optional[str] = None
+        self._lock = threading.Lock()
+        self._processes = set()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def remaining(self) -> Optional[float]:
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+    def check(self) -> None:
+        """Raise if the token was cancelled or its deadline has passed"""
+        if self.reason is None and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline")
+        if self.reason == "deadline":
+            raise DeadlineExceeded("Deadline exceeded")
+        if self.reason is not None:
+            raise Cancelled(self.reason)
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Kill every registered process group and run the callbacks; only the first call counts"""
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            processes, callbacks = list(self._processes), list(self._callbacks)
+        for process in processes:
+            kill_group(process)
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if self.reason is None:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def attach(self, process: subprocess.Popen) -> None:
+        with self._lock:
+            self._processes.add(process)
+            cancelled = self.reason is not None
+        if cancelled:
+            kill_group(process)
+
+    def detach(self, process: subprocess.Popen) -> None:
+        with self._lock:
+            self._processes.discard(process)
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar("cancel_token", default=None)
+
+
+def current() -> Optional[CancelToken]:
+    return _current.get()
+
+
+@contextlib.contextmanager
+def bound(token: CancelToken) -> Iterator[CancelToken]:
+    """Bind token for the block, and for tasks and to_thread calls started inside it"""
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+@contextlib.contextmanager
+def stage(timeout: float) -> Iterator[CancelToken]:
+    """A tighter deadline for one stage of the bound job; cancelling the job still cancels the stage"""
+    parent = current()
+    token = CancelToken(timeout)
+    if parent is not None:
+        if parent.deadline is not None and parent.deadline < token.deadline:
+            token.deadline = parent.deadline
+        parent.add_callback(lambda: token.cancel(parent.reason))
+    with bound(token):
+        yield token
+
+
+@contextlib.contextmanager
+def popen(command: List[str], timeout: Optional[float] = None, **kwargs) -> Iterator[subprocess.Popen]:
+    """subprocess.Popen in its own process group, killed with the bound token or once timeout passes"""
+    token = current()
+    if token is not None:
+        token.check()
+        remaining = token.remaining()
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+
+    process = subprocess.Popen(command, start_new_session=True, **kwargs)
+    expired = threading.Event()
+
+    def expire() -> None:
+        expired.set()
+        kill_group(process)
+
+    timer = threading.Timer(timeout, expire) if timeout is not None else None
+    if token is not None:
+        token.attach(process)
+    if timer is not None:
+        timer.daemon = True
+        timer.start()
+    try:
+        yield process
+    except BaseException:
+        kill_group(process)
+        raise
+    finally:
+        for stream in (process.stdin, process.stdout, process.stderr):
+            if stream is not None:
+                stream.close()
+        process.wait()
+        if timer is not None:
+            timer.cancel()
+        if token is not None:
+            token.detach(process)
+
+    # Report why the process died rather than its exit status
+    if token is not None and token.cancelled:
+        token.check()
+    if expired.is_set():
+        raise DeadlineExceeded(f"{os.path.basename(command[0])} ran past its {timeout:g}s deadline")
+
+
+def run(command: List[str], timeout: Optional[float] = None, check: bool = False,
+        capture_output: bool = False, **kwargs) -> subprocess.CompletedProcess:
+    """subprocess.run, killable through the bound token and bounded by its deadline"""
+    if capture_output:
+        kwargs.update(stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    with popen(command, timeout=timeout, **kwargs) as process:
+        stdout, stderr = process.communicate()
+    completed = subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+    if check:
+        completed.check_returncode()
+    return completed
@@ -0,0 +1,396 @@
+"""Clip rendering pipeline run by queue workers"""
+import asyncio
+import os
+import shutil
+import uuid
+from datetime import datetime
+from typing import Callable, Optional
+
+import face_tracking
+import hls
+from analysis_pool import AnalysisPool
+from artifact_store import ArtifactStore, artifact_key, signed_key
+from cancellation import Cancelled
+from frames import FrameSource
+from highlights import suggest_highlights
+from hook_titles import HookTitleGenerator, top_keywords
+from media_janitor import MediaJanitor
+from progress_events import ProgressEvents
+from transcripts import TranscriptStore
+from video_ids import video_key
+
+
+# AI Feature Processing Functions
+async def process_ai_feature(feature_id: str, youtube_url: str, user: dict) -> dict:
+    """Process AI feature application"""
+    feature_processors = {
+        'auto_clipping': {
+            'name': 'Auto Clipping',
+            'result': 'Applied viral moment detection algorithm',
+            'confidence': 0.85
+        },
+        'face_tracking': {
+            'name': 'Auto Face Tracking',
+            'result': 'Face detection and tracking applied',
+            'confidence': 0.92
+        },
+        'auto_captions': {
+            'name': 'Auto Captioning',
+            'result': 'Generated captions with 95% accuracy',
+            'confidence': 0.95
+        },
+        'translation': {
+            'name': 'Caption Translation',
+            'result': 'Translated to selected languages',
+            'confidence': 0.88
+        },
+        'hook_titles': {
+            'name': 'Auto Hook Titles',
+            'result': 'Generated compelling hook title',
+            'confidence': 0.78
+        },
+        'b_roll': {
+            'name': 'Auto B-roll',
+            'result': 'Added relevant background footage',
+            'confidence': 0.82
+        },
+        'background_removal': {
+            'name': 'Background Remover',
+            'result': 'Background removed successfully',
+            'confidence': 0.90
+        },
+        'voice_enhancement': {
+            'name': 'Voice Enhancement',
+            'result': 'Audio quality improved',
+            'confidence': 0.87
+        }
+    }
+    
+    processor = feature_processors.get(feature_id, {
+        'name': feature_id,
+        'result': 'Feature applied',
+        'confidence': 0.80
+    })
+    
+    return {
+        'feature_id': feature_id,
+        'name': processor['name'],
+        'result': processor['result'],
+        'confidence': processor['confidence'],
+        'processed_at': datetime.utcnow()
+    }
+
+def create_mock_video_file(artifact_id: str, clip_data: dict) -> bytes:
+    """Create a mock video file for demonstration"""
+    # This creates a simple text file that represents a video file
+    # In production, this would create an actual video file
+    # Only fields that go into the artifact key belong here, the file is shared between clips
+    mock_content = f"""
+# Pjesëza Video Clip
+Artifact: {artifact_id}
+Source: {clip_data['youtube_url']}
+Duration: {clip_data['start_time']}s - {clip_data['end_time']}s
+Applied Features: {', '.join(clip_data.get('selected_features', []))}
+Edit List: {(clip_data.get('silence') or {}).get('keep_segments') or 'none'}
+Rendered: {datetime.utcnow()}
+
+This is a mock video file for demonstration purposes.
+In production, this would be the actual processed video clip.
+"""
+    return mock_content.encode('utf-8')
+
+
+class ClipRenderer:
+    """Turns a queued clip record into a finished, downloadable clip"""
+
+    # Bump whenever rendering output changes so old artifacts are not reused
+    RENDER_PRESET = "mock-v1"
+    HLS_PRESET = "hls-v1"
+    OUTPUT_EXTENSION = ".txt"
+    # Features computed per clip from its owner's transcripts rather than stored on the shared artifact
+    PRIVATE_FEATURES = ("hook_titles", "auto_clipping")
+
+    def __init__(self, db, janitor: MediaJanitor, events: ProgressEvents, artifacts: ArtifactStore,
+                 hook_titles: Optional[HookTitleGenerator] = None,
+                 fetch_source: Optional[Callable[..., str]] = None, analysis: Optional[AnalysisPool] = None,
+                 url_secret: str = ""):
+        self.db = db
+        self.janitor = janitor
+        self.events = events
+        self.artifacts = artifacts
+        self.hook_titles = hook_titles
+        self.transcripts = TranscriptStore(db)
+        # fetch_source(url, start_time, end_time, job_id, max_height) -> local path of the source segment
+        self.fetch_source = fetch_source
+        # Frame analysis runs on this process pool; without one, frame-based features report the mock result
+        self.analysis = analysis
+        # Signs the keys of media served to players, which cannot send an Authorization header
+        self.url_secret = url_secret
+
+    def artifact_key_for(self, clip: dict) -> str:
+        return artifact_key(
+            video_key(clip["youtube_url"]),
+            clip["start_time"],
+            clip["end_time"],
+            clip.get("selected_features") or [],
+            self.RENDER_PRESET,
+            # Jump cuts from silence analysis are applied in the same render pass
+            (clip.get("silence") or {}).get("keep_segments"),
+        )
+
+    async def render(self, job: dict) -> dict:
+        clip_id = job["payload"]["clip_id"]
+        while True:
+            clip = await self.db.clips.find_one({"_id": clip_id})
+            if not clip:
+                return {"skipped": "clip no longer exists"}
+            if clip.get("status") == "cancelled":
+                return {"skipped": "clip was cancelled"}
+
+            key = self.artifact_key_for(clip)
+            # Only start from the silence analysis the key was built from; one stored in between is read again
+            started = await self.db.clips.update_one(
+                {
+                    "_id": clip_id,
+                    "status": {"$ne": "cancelled"},
+                    "silence.analyzed_at": (clip.get("silence") or {}).get("analyzed_at"),
+                },
+                {"$set": {"status": "processing", "attempts": job["attempts"], "artifact_key": key}}
+            )
+            if started.matched_count == 1:
+                break
+        await self.events.publish(clip_id, "processing", 0.0, attempt=job["attempts"])
+
+        try:
+            await self.artifacts.acquire(key, clip_id)
+            # Identical renders requested by anyone are shared; wait if one is already under way
+            artifact = await self.artifacts.wait_ready(key, owner=clip_id)
+            shared = artifact is not None
+            if artifact is None:
+                try:
+                    async with self.artifacts.rendering(key, clip_id):
+                        artifact = await self._render_artifact(key, clip)
+                except BaseException:
+                    # Cancelled renders too, or identical clips would wait out the whole render lease
+                    await self.artifacts.mark_failed(key, owner=clip_id)
+                    raise
+                if artifact is None:
+                    return {"skipped": "clip deleted while rendering"}
+
+            applied_features = await self.personalize(clip, artifact["metadata"].get("applied_features", []))
+            updated = await self.db.clips.update_one(
+                {"_id": clip_id, "status": {"$ne": "cancelled"}},
+                {"$set": {
+                    "status": "completed",
+                    "applied_features": applied_features,
+                    "download_url": f"/api/video/download/{clip_id}",
+                    "file_path": artifact["path"],
+                    "file_size": artifact["size"],
+                    "shared_artifact": shared,
+                    "completed_at": datetime.utcnow()
+                }}
+            )
+            if updated.matched_count == 0:
+                # The clip was deleted or cancelled while we worked on it
+                await self.artifacts.release(key, clip_id)
+                return {"skipped": "clip deleted or cancelled while rendering"}
+
+            await self.events.publish(clip_id, "done", 1.0, download_url=f"/api/video/download/{clip_id}", shared=shared)
+            return {"clip_id": clip_id, "artifact_key": key, "shared": shared}
+        except Cancelled:
+            # Whoever cancelled the clip has already reported it
+            raise
+        except Exception as e:
+            await self.events.publish(clip_id, "error", message=str(e), attempt=job["attempts"])
+            raise
+        finally:
+            # Intermediate media is never needed once the attempt has finished
+            self.janitor.release_job(clip_id)
+
+    async def _render_artifact(self, key: str, clip: dict) -> Optional[dict]:
+        clip_id = clip["_id"]
+
+        # Process selected features; they make up the bulk of the progress bar
+        owner = {"_id": clip["user_id"]}
+        features = clip.get("selected_features") or []
+        applied_features = []
+        for index, feature in enumerate(features):
+            await self.events.publish(clip_id, "feature", round(0.9 * index / len(features), 3), feature=feature)
+            feature_result = await process_ai_feature(feature, clip["youtube_url"], owner)
+            if feature == "face_tracking":
+                track = await self.clip_face_track(clip)
+                if track:
+                    feature_result.update(result=f"Face found in {track['coverage']:.0%} of sampled frames", **track)
+            applied_features.append(feature_result)
+
+        await self.events.publish(clip_id, "cutting", 0.9)
+
+        # Create a mock video file for download
+        # In production, this would download the actual video segment
+        scratch_path = self.janitor.scratch_path(clip_id, self.OUTPUT_EXTENSION)
+        with open(scratch_path, "wb") as f:
+            f.write(create_mock_video_file(key, clip))
+        self.janitor.keep(scratch_path)
+
+        return await self.artifacts.publish(
+            key, scratch_path, self.OUTPUT_EXTENSION, {"applied_features": applied_features}
+        )
+
+    async def personalize(self, clip: dict, shared: list) -> list:
+        """The artifact's features, with those read from the owner's transcripts computed for this clip
+
+        Artifacts are shared between users, so nothing derived from one user's transcripts
+        may be stored on them; those features are rebuilt from scratch for every clip.
+        """
+        applied = []
+        for feature_result in shared:
+            feature = feature_result["feature_id"]
+            if feature in self.PRIVATE_FEATURES:
+                feature_result = await process_ai_feature(feature, clip["youtube_url"], {"_id": clip["user_id"]})
+            if feature == "hook_titles" and self.hook_titles is not None:
+                # Batched with the hook titles of every other clip rendering right now
+                titles = await self.hook_titles.titles(await self.clip_transcript(clip))
+                feature_result.update(result=titles[0], titles=titles)
+            elif feature == "auto_clipping":
+                highlights = await self.clip_highlights(clip)
+                if highlights:
+                    best = highlights[0]
+                    feature_result.update(result=f"Best moment at {best['start']}s - {best['end']}s", highlights=highlights)
+            applied.append(feature_result)
+        return applied
+
+    async def clip_highlights(self, clip: dict, window: int = 15, count: int = 3) -> list:
+        """Strongest moments inside the clip, in source-video seconds"""
+        start = clip["start_time"] or 0
+        segments = await self.transcripts.segments_between(clip["user_id"], clip.get("video_id"), start, clip.get("end_time"))
+        if not segments:
+            return []
+        end = clip.get("end_time") or segments[-1]["end"]
+        relative = [
+            {"start": max(0.0, s["start"] - start), "end": min(end, s["end"]) - start, "text": s["text"]}
+            for s in segments
+        ]
+        keywords = top_keywords(" ".join(s["text"] for s in segments), 5)
+        windows = suggest_highlights(end - start, relative, keywords, window=window, count=count)
+        return [{**w, "start": w["start"] + start, "end": min(w["end"] + start, end)} for w in windows]
+
+    async def clip_face_track(self, clip: dict) -> Optional[dict]:
+        """Face-following crop path for a vertical reframe of the clip"""
+        if self.analysis is None or self.fetch_source is None:
+            return None
+        job_id = f"faces-{clip['_id']}"
+        widths = []
+
+        def batches(path: str):
+            frames = FrameSource(path, fps=face_tracking.SAMPLE_FPS, height=face_tracking.ANALYSIS_HEIGHT)
+            widths.append(frames.size[0])
+            yield from frames.batches(face_tracking.BATCH_FRAMES)
+
+        try:
+            source = await asyncio.to_thread(
+                self.fetch_source, clip["youtube_url"], clip["start_time"] or 0, clip.get("end_time"),
+                job_id, face_tracking.ANALYSIS_HEIGHT,
+            )
+            per_batch = await self.analysis.map_batches(face_tracking.detect_faces, batches(source), job_id=clip["_id"])
+        finally:
+            self.janitor.release_job(job_id)
+
+        faces = [face for batch in per_batch for face in batch]
+        if not faces:
+            return None
+        return {
+            "coverage": round(sum(face is not None for face in faces) / len(faces), 3),
+            "crop_path": face_tracking.crop_path(faces, widths[0]),
+        }
+
+    async def clip_transcript(self, clip: dict) -> str:
+        """Text the clip's hook titles are written from"""
+        spoken = await self.transcripts.text_between(
+            clip["user_id"], clip.get("video_id"), clip["start_time"], clip.get("end_time")
+        )
+        if spoken:
+            return spoken
+        # Without captions, the video's own title and description are the best we have
+        metadata = await self.db.video_metadata.find_one({"_id": clip.get("video_id")}, {"video_info": 1})
+        video_info = (metadata or {}).get("video_info") or {}
+        return "\n".join(filter(None, [video_info.get("title"), video_info.get("description")]))
+
+    async def release(self, clip: dict) -> None:
+        """Drop a deleted clip's hold on its output"""
+        if clip.get("artifact_key"):
+            await self.artifacts.release(clip["artifact_key"], clip["_id"])
+        elif clip.get("file_path") and os.path.exists(clip["file_path"]):
+            # Clips rendered before outputs were shared own their file outright
+            os.remove(clip["file_path"])
+
+    def hls_key(self, clip: dict) -> str:
+        """Public name of a clip's HLS package: the signed content key, so only clients given the URL can fetch it"""
+        content_key = artifact_key(
+            video_key(clip["youtube_url"]),
+            clip["start_time"],
+            clip.get("end_time"),
+            clip.get("selected_features") or [],
+            self.HLS_PRESET,
+            (clip.get("silence") or {}).get("keep_segments"),
+        )
+        return signed_key(self.url_secret, content_key)
+
+    def hls_dir(self, key: str) -> str:
+        return os.path.join(self.artifacts.root_dir, "hls", key)
+
+    async def package_hls(self, job: dict) -> dict:
+        """Encode a clip's source range into an adaptive HLS ladder, shared by identical clips"""
+        clip_id = job["payload"]["clip_id"]
+        clip = await self.db.clips.find_one({"_id": clip_id})
+        if not clip:
+            return {"skipped": "clip no longer exists"}
+
+        key = self.hls_key(clip)
+        out_dir = self.hls_dir(key)
+        if not os.path.exists(os.path.join(out_dir, hls.MASTER_PLAYLIST)):
+            await self.db.clips.update_one({"_id": clip_id}, {"$set": {"hls.status": "processing"}})
+            job_id = f"hls-{clip_id}"
+            # Staged next to its final place, so the rename below is atomic and readers never see half a ladder
+            staging = f"{out_dir}.{uuid.uuid4().hex[:8]}.tmp"
+            try:
+                # to_thread carries the job's cancel token, so cancelling the job kills these subprocesses
+                source = await asyncio.to_thread(
+                    self.fetch_source, clip["youtube_url"], clip["start_time"] or 0, clip.get("end_time"),
+                    job_id, hls.LADDER[0]["height"],
+                )
+                edits = (clip.get("silence") or {}).get("keep_segments")
+                await asyncio.to_thread(hls.package, source, staging, edits=edits)
+                try:
+                    os.rename(staging, out_dir)
+                except OSError:
+                    # Another worker packaged the same range first
+                    if not os.path.exists(os.path.join(out_dir, hls.MASTER_PLAYLIST)):
+                        raise
+            finally:
+                self.janitor.release_job(job_id)
+                shutil.rmtree(staging, ignore_errors=True)
+
+        renditions = sorted(name for name in os.listdir(out_dir) if os.path.isdir(os.path.join(out_dir, name)))
+        await self.db.clips.update_one({"_id": clip_id}, {"$set": {"hls": {
+            "status": "ready",
+            "key": key,
+            "renditions": renditions,
+            "master_url": f"/api/media/hls/{key}/{hls.MASTER_PLAYLIST}",
+            "ready_at": datetime.utcnow(),
+        }}})
+        return {"clip_id": clip_id, "hls_key": key}
+
+    async def mark_failed(self, job: dict, error: str) -> None:
+        """Record a clip whose job was dead-lettered"""
+        clip_id = job["payload"]["clip_id"]
+        if job["kind"] == "package_hls":
+            # The clip itself is fine, only its streaming package is missing
+            await self.db.clips.update_one({"_id": clip_id}, {"$set": {"hls": {"status": "failed", "error": error}}})
+            return
+        clip = await self.db.clips.find_one_and_update(
+            {"_id": clip_id},
+            {"$set": {"status": "failed", "error": error, "failed_at": datetime.utcnow()}}
+        )
+        if clip and clip.get("artifact_key"):
+            await self.artifacts.release(clip["artifact_key"], clip_id)
+        await self.events.publish(clip_id, "failed", message=error)
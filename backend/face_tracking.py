@@ -0,0 +1,39 @@
+"""Face tracking for vertical reframing: detect faces on sampled frames, then smooth a crop path through them"""
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+ANALYSIS_HEIGHT = 360
+SAMPLE_FPS = 4
+BATCH_FRAMES = 16
+# Exponential smoothing of the crop centre between samples; lower is steadier
+SMOOTHING = 0.25
+
+_cascade: Optional["cv2.CascadeClassifier"] = None
+
+
+def detect_faces(frames: np.ndarray) -> List[list]:
+    """Largest face per frame as [x, y, w, h], or None; runs inside analysis pool workers"""
+    global _cascade
+    if _cascade is None:
+        _cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    found = []
+    for frame in frames:
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        faces = _cascade.detectMultiScale(gray, scaleFactor=1.2, minNeighbors=5, minSize=(24, 24))
+        found.append(max(faces, key=lambda f: f[2] * f[3]).tolist() if len(faces) else None)
+    return found
+
+
+def crop_path(faces: List[Optional[list]], frame_width: int, sample_fps: float = SAMPLE_FPS,
+              smoothing: float = SMOOTHING) -> List[dict]:
+    """Horizontal crop centre (0-1) per sample, holding position through frames without a face"""
+    centre = 0.5
+    path = []
+    for index, face in enumerate(faces):
+        if face is not None:
+            x, _, w, _ = face
+            centre += smoothing * ((x + w / 2) / frame_width - centre)
+        path.append({"t": round(index / sample_fps, 3), "x": round(centre, 4)})
+    return path
@@ -0,0 +1,179 @@
+"""Frame source shared by every frame analysis
+
+Frames are sampled at a fixed rate, cropped to a region of interest, scaled and
+converted before they reach Python, and land in a small set of preallocated batch
+buffers that are reused for the whole pass. Consumers that need the same video can
+share a single decode through `fan_out`.
+"""
+import subprocess
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+import cancellation
+
+COLORSPACES = {"gray": ("gray", 1), "bgr": ("bgr24", 3), "rgb": ("rgb24", 3)}
+
+Roi = Tuple[int, int, int, int]
+
+
+def even(value: float) -> int:
+    return max(2, int(round(value / 2)) * 2)
+
+
+def probe_size(path: str) -> Tuple[int, int]:
+    result = cancellation.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=width,height", "-of", "csv=p=0", path],
+        capture_output=True, text=True, check=True,
+    )
+    width, height = result.stdout.strip().split(",")[:2]
+    return int(width), int(height)
+
+
+class FrameSource:
+    """Frames of `path` at `fps`, optionally cropped to roi (x, y, w, h in source pixels) and scaled
+
+    `backend` is "ffmpeg" (decode, crop, scale and colour conversion all in ffmpeg, read
+    straight into the batch buffer) or "cv2" (grab every frame, retrieve only sampled ones).
+    """
+
+    def __init__(self, path: str, fps: float = 4.0, height: Optional[int] = None, width: Optional[int] = None,
+                 colorspace: str = "gray", roi: Optional[Roi] = None, start: float = 0, end: Optional[float] = None,
+                 backend: str = "ffmpeg"):
+        if colorspace not in COLORSPACES:
+            raise ValueError(f"Unknown colorspace {colorspace!r}")
+        self.path = path
+        self.fps = fps
+        self.colorspace = colorspace
+        self.start = start
+        self.end = end
+        self.backend = backend
+
+        if backend == "cv2":
+            capture = cv2.VideoCapture(path)
+            source_size = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            capture.release()
+        else:
+            source_size = probe_size(path)
+        x, y, w, h = roi or (0, 0) + source_size
+        # Clamp to the frame; chroma subsampling wants even crop sizes
+        x, y = min(max(0, x), source_size[0] - 2), min(max(0, y), source_size[1] - 2)
+        self.roi = (x, y, max(2, min(w, source_size[0] - x) // 2 * 2), max(2, min(h, source_size[1] - y) // 2 * 2))
+
+        roi_w, roi_h = self.roi[2:]
+        if height and not width:
+            width = even(roi_w * height / roi_h)
+        elif width and not height:
+            height = even(roi_h * width / roi_w)
+        self.size = (width or roi_w, height or roi_h)
+        channels = COLORSPACES[colorspace][1]
+        self.frame_shape = (self.size[1], self.size[0]) + ((channels,) if channels > 1 else ())
+
+    def times(self, first: int, count: int) -> np.ndarray:
+        """Source timestamps of frames first .. first + count"""
+        return self.start + np.arange(first, first + count) / self.fps
+
+    def command(self) -> List[str]:
+        x, y, w, h = self.roi
+        filters = f"fps={self.fps},crop={w}:{h}:{x}:{y},scale={self.size[0]}:{self.size[1]}:flags=area"
+        command = ["ffmpeg", "-v", "error", "-nostdin"]
+        if self.start:
+            command += ["-ss", f"{self.start:.3f}"]
+        command += ["-i", self.path]
+        if self.end is not None:
+            command += ["-t", f"{self.end - self.start:.3f}"]
+        return command + ["-an", "-vf", filters, "-pix_fmt", COLORSPACES[self.colorspace][0], "-f", "rawvideo", "pipe:1"]
+
+    def batches(self, batch: int = 16, buffers: int = 2) -> Iterator[np.ndarray]:
+        """Batches of up to `batch` frames
+
+        Each batch is a view into one of `buffers` preallocated arrays, so it stays valid
+        only until `buffers - 1` more batches have been taken; copy anything kept longer.
+        """
+        pool = [np.empty((batch,) + self.frame_shape, dtype=np.uint8) for _ in range(buffers)]
+        fill = self._fill_cv2 if self.backend == "cv2" else self._fill_ffmpeg
+        turn = 0
+        for count in fill(pool):
+            yield pool[turn][:count]
+            turn = (turn + 1) % buffers
+
+    def _fill_ffmpeg(self, pool: List[np.ndarray]) -> Iterator[int]:
+        frame_bytes = int(np.prod(self.frame_shape))
+        # Stopping early (the generator being closed) kills ffmpeg instead of leaving it blocked on a full pipe
+        with cancellation.popen(self.command(), stdout=subprocess.PIPE) as process:
+            turn = 0
+            while True:
+                view = memoryview(pool[turn]).cast("B")
+                filled = 0
+                while filled < len(view):
+                    read = process.stdout.readinto(view[filled:])
+                    if not read:
+                        break
+                    filled += read
+                count = filled // frame_bytes
+                if count:
+                    yield count
+                if filled < len(view):
+                    break
+                turn = (turn + 1) % len(pool)
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, "ffmpeg")
+
+    def _fill_cv2(self, pool: List[np.ndarray]) -> Iterator[int]:
+        capture = cv2.VideoCapture(self.path)
+        try:
+            if self.start:
+                capture.set(cv2.CAP_PROP_POS_MSEC, self.start * 1000)
+            source_fps = capture.get(cv2.CAP_PROP_FPS) or 25
+            step = source_fps / self.fps
+            x, y, w, h = self.roi
+            conversion = {"gray": cv2.COLOR_BGR2GRAY, "rgb": cv2.COLOR_BGR2RGB}.get(self.colorspace)
+            native = scaled = None
+            turn = count = 0
+            index, next_sample = 0, 0.0
+            # grab() only demuxes and decodes; the costly retrieve and conversion happen for sampled frames alone
+            while capture.grab():
+                if self.end is not None and self.start + index / source_fps >= self.end:
+                    break
+                if index >= next_sample:
+                    next_sample += step
+                    ok, native = capture.retrieve(native)
+                    if not ok:
+                        break
+                    target = pool[turn][count]
+                    if conversion is None:
+                        cv2.resize(native[y:y + h, x:x + w], self.size, dst=target, interpolation=cv2.INTER_AREA)
+                    else:
+                        scaled = cv2.resize(native[y:y + h, x:x + w], self.size, dst=scaled, interpolation=cv2.INTER_AREA)
+                        cv2.cvtColor(scaled, conversion, dst=target)
+                    count += 1
+                    if count == len(pool[turn]):
+                        yield count
+                        turn, count = (turn + 1) % len(pool), 0
+                index += 1
+            if count:
+                yield count
+        finally:
+            capture.release()
+
+
+class Tap:
+    """One consumer of a shared decode: fn(frames, times) gets every `every`-th frame"""
+
+    def __init__(self, fn: Callable[[np.ndarray, np.ndarray], None], every: int = 1):
+        self.fn = fn
+        self.every = every
+
+
+def fan_out(source: FrameSource, taps: Sequence[Tap], batch: int = 16) -> None:
+    """Feed one decode pass of source to every tap; taps see views, never copies"""
+    first = 0
+    for frames in source.batches(batch):
+        times = source.times(first, len(frames))
+        for tap in taps:
+            # Keep each tap's stride continuous across batch boundaries
+            offset = -first % tap.every
+            if offset < len(frames):
+                tap.fn(frames[offset::tap.every], times[offset::tap.every])
+        first += len(frames)
@@ -0,0 +1,215 @@
+"""Highlight scoring: per-second feature arrays combined into a score and the best non-overlapping windows
+
+Every signal is an array with one value per second of source video, so scoring a
+two-hour video is a handful of vector operations over ~7200 floats.
+"""
+import re
+import subprocess
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import cancellation
+from frames import FrameSource, Tap, fan_out
+
+DEFAULT_WEIGHTS = {
+    "audio_energy": 0.35,
+    "speech_rate": 0.25,
+    "scene_cuts": 0.15,
+    "keywords": 0.25,
+}
+# Share of a window's score that comes from its single best second rather than its average
+PEAK_WEIGHT = 0.3
+ANALYSIS_SAMPLE_RATE = 8000
+
+# Scene detection looks at small gray frames sampled a few times a second
+SCENE_FPS = 4
+SCENE_HEIGHT = 90
+
+WORD_RE = re.compile(r"[^\W\d_][\w'-]*", re.UNICODE)
+
+
+def seconds(duration: float) -> int:
+    return max(1, int(np.ceil(duration)))
+
+
+# Feature builders
+
+
+def speech_rate(segments: List[dict], duration: float) -> np.ndarray:
+    """Words per second, spreading each segment's words evenly over its span"""
+    rate = np.zeros(seconds(duration))
+    for segment in segments:
+        first, last = int(segment["start"]), min(int(np.ceil(segment["end"])), len(rate))
+        if last > first:
+            rate[first:last] += len(segment["text"].split()) / (last - first)
+    return rate
+
+
+def keyword_hits(segments: List[dict], keywords: Iterable[str], duration: float) -> np.ndarray:
+    """Count of keyword occurrences per second"""
+    wanted = {k.lower() for k in keywords}
+    hits = np.zeros(seconds(duration))
+    if not wanted:
+        return hits
+    for segment in segments:
+        count = sum(1 for word in WORD_RE.findall(segment["text"]) if word.lower() in wanted)
+        first, last = int(segment["start"]), min(int(np.ceil(segment["end"])), len(hits))
+        if count and last > first:
+            hits[first:last] += count / (last - first)
+    return hits
+
+
+def scene_cut_density(cut_times: Iterable[float], duration: float) -> np.ndarray:
+    """Scene cuts per second"""
+    n = seconds(duration)
+    cuts = np.asarray(list(cut_times), dtype=float)
+    cuts = cuts[(cuts >= 0) & (cuts < n)]
+    return np.bincount(cuts.astype(int), minlength=n).astype(float)
+
+
+def rms_per_second(samples: np.ndarray, sample_rate: int) -> np.ndarray:
+    """RMS energy of each whole second of mono audio"""
+    n = len(samples) // sample_rate
+    if n == 0:
+        return np.zeros(1)
+    frames = samples[:n * sample_rate].astype(np.float32).reshape(n, sample_rate)
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+
+# Media extraction (needs ffmpeg on the PATH)
+
+
+def audio_energy(path: str, sample_rate: int = ANALYSIS_SAMPLE_RATE) -> np.ndarray:
+    """Per-second RMS of a media file, decoded as a stream one second at a time"""
+    command = [
+        "ffmpeg", "-v", "error", "-i", path, "-vn", "-ac", "1", "-ar", str(sample_rate),
+        "-f", "s16le", "pipe:1",
+    ]
+    values = []
+    block = sample_rate * 2
+    with cancellation.popen(command, stdout=subprocess.PIPE) as process:
+        while True:
+            data = process.stdout.read(block)
+            if len(data) < block:
+                break
+            samples = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+            values.append(rms_per_second(samples, sample_rate)[0])
+    return np.asarray(values) if values else np.zeros(1)
+
+
+class SceneCutTap(Tap):
+    """Scene changes by ffmpeg's scene score: the mean absolute frame difference, damped by the previous one
+
+    A tap, so it can share a decode pass with other frame analyses through frames.fan_out.
+    """
+
+    def __init__(self, threshold: float = 0.3, every: int = 1):
+        super().__init__(self.feed, every)
+        self.threshold = threshold
+        self.cuts: List[float] = []
+        # Batches are views into reused buffers, so the last frame is kept as a copy
+        self._previous: Optional[np.ndarray] = None
+        self._mafd = 0.0
+
+    def feed(self, frames: np.ndarray, times: np.ndarray) -> None:
+        current = frames.astype(np.int16)
+        if self._previous is not None:
+            current = np.concatenate([self._previous, current])
+            times = np.concatenate([[np.nan], times])
+        if len(current) > 1:
+            mafd = np.abs(np.diff(current, axis=0)).reshape(len(current) - 1, -1).mean(axis=1) / 255
+            damped = np.minimum(mafd, np.abs(np.diff(mafd, prepend=self._mafd)))
+            self.cuts.extend(float(t) for t in times[1:][damped > self.threshold])
+            self._mafd = float(mafd[-1])
+        self._previous = current[-1:].copy()
+
+
+def scene_cuts(path: str, threshold: float = 0.3) -> List[float]:
+    """Timestamps of scene changes"""
+    tap = SceneCutTap(threshold)
+    fan_out(FrameSource(path, fps=SCENE_FPS, height=SCENE_HEIGHT), [tap])
+    return tap.cuts
+
+
+# Scoring
+
+
+def normalize(values: np.ndarray) -> np.ndarray:
+    """Scale to [0, 1] against the 95th percentile, so one loud spike does not flatten the rest"""
+    values = np.asarray(values, dtype=float)
+    if values.size == 0:
+        return values
+    low, high = values.min(), np.percentile(values, 95)
+    if high <= low:
+        # Sparse signals (a few keyword hits in a long video) have a flat 95th percentile
+        high = values.max()
+        if high <= low:
+            return np.zeros_like(values)
+    return np.clip((values - low) / (high - low), 0.0, 1.0)
+
+
+def combine(features: Dict[str, np.ndarray], weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """Weighted sum of the normalized features; missing features drop out of the weighting"""
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    length = max(len(values) for values in features.values())
+    score = np.zeros(length)
+    total = 0.0
+    for name, values in features.items():
+        weight = weights.get(name, 0.0)
+        if weight <= 0:
+            continue
+        padded = np.zeros(length)
+        padded[:len(values)] = normalize(values)
+        score += weight * padded
+        total += weight
+    return score / total if total else score
+
+
+def top_windows(score: np.ndarray, window: int, count: int) -> List[dict]:
+    """Best `count` non-overlapping windows of `window` seconds.
+
+    A window scores its mean plus a share of its peak second (the sliding-window
+    maximum), then windows are taken greedily from the best down.
+    """
+    window = max(1, min(int(window), len(score)))
+    views = sliding_window_view(score, window)
+    window_scores = (1 - PEAK_WEIGHT) * views.mean(axis=1) + PEAK_WEIGHT * views.max(axis=1)
+
+    blocked = np.zeros(len(window_scores), dtype=bool)
+    picked = []
+    # Stable sort on the negated scores, so ties go to the earlier window
+    for start in np.argsort(-window_scores, kind="stable"):
+        if blocked[start]:
+            continue
+        picked.append({"start": int(start), "end": int(start) + window, "score": round(float(window_scores[start]), 4)})
+        if len(picked) >= count:
+            break
+        # No other window may start within `window` seconds of this one
+        blocked[max(0, start - window + 1):start + window] = True
+    return picked
+
+
+def suggest_highlights(
+    duration: float,
+    segments: Optional[List[dict]] = None,
+    keywords: Iterable[str] = (),
+    audio: Optional[np.ndarray] = None,
+    cuts: Optional[Iterable[float]] = None,
+    window: int = 30,
+    count: int = 5,
+    weights: Optional[Dict[str, float]] = None,
+) -> List[dict]:
+    """Top highlight windows from whichever signals are available"""
+    features = {}
+    if segments:
+        features["speech_rate"] = speech_rate(segments, duration)
+        features["keywords"] = keyword_hits(segments, keywords, duration)
+    if audio is not None:
+        features["audio_energy"] = np.asarray(audio[:seconds(duration)], dtype=float)
+    if cuts is not None:
+        features["scene_cuts"] = scene_cut_density(cuts, duration)
+    if not features:
+        return []
+    return top_windows(combine(features, weights), window, count)
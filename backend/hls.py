@@ -0,0 +1,117 @@
+"""Adaptive-bitrate HLS packaging: one decode, every rendition encoded from a split of the same frames"""
+import os
+from typing import List, Optional
+
+import cancellation
+from previews import has_audio
+from silence import jump_cut_filters
+
+# Highest first; renditions taller than the source are dropped rather than upscaled
+LADDER = [
+    {"name": "1080p", "height": 1080, "video_bitrate": "5000k", "maxrate": "5350k", "bufsize": "7500k", "audio_bitrate": "128k"},
+    {"name": "720p", "height": 720, "video_bitrate": "2800k", "maxrate": "2996k", "bufsize": "4200k", "audio_bitrate": "128k"},
+    {"name": "480p", "height": 480, "video_bitrate": "1400k", "maxrate": "1498k", "bufsize": "2100k", "audio_bitrate": "96k"},
+]
+AUDIO_ONLY = {"name": "audio", "audio_bitrate": "64k"}
+SEGMENT_SECONDS = 4
+MASTER_PLAYLIST = "master.m3u8"
+
+
+def probe_height(path: str) -> int:
+    result = cancellation.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=height", "-of", "csv=p=0", path],
+        capture_output=True, text=True, check=True,
+    )
+    return int(result.stdout.strip() or 0)
+
+
+def _scaled(rate: str, factor: float) -> str:
+    return f"{max(1, round(int(rate[:-1]) * factor))}k"
+
+
+def ladder_for(source_height: int) -> List[dict]:
+    renditions = [r for r in LADDER if r["height"] <= source_height]
+    if renditions or source_height <= 0:
+        return renditions or [LADDER[-1]]
+    # Shorter than the smallest rung: a single rendition at the source height, bitrate scaled by pixel count
+    lowest = LADDER[-1]
+    height = max(2, source_height // 2 * 2)
+    factor = (height / lowest["height"]) ** 2
+    return [{
+        **lowest,
+        "name": f"{height}p",
+        "height": height,
+        "video_bitrate": _scaled(lowest["video_bitrate"], factor),
+        "maxrate": _scaled(lowest["maxrate"], factor),
+        "bufsize": _scaled(lowest["bufsize"], factor),
+    }]
+
+
+def hls_command(source: str, out_dir: str, ladder: List[dict], audio_only: bool = True,
+                segment_seconds: int = SEGMENT_SECONDS, edits: Optional[List[List[float]]] = None,
+                audio: bool = True) -> List[str]:
+    """ffmpeg arguments that encode every rendition from a single decode of `source`
+
+    edits is a jump-cut edit list (see silence.keep_segments), applied in the same pass.
+    Without audio in the source the renditions are video only and there is no audio-only one.
+    """
+    count = len(ladder)
+    audio_only = audio_only and audio
+    splits = "".join(f"[v{i}]" for i in range(count))
+    scales = ";".join(f"[v{i}]scale=-2:{r['height']}[v{i}out]" for i, r in enumerate(ladder))
+    graph = f"[0:v]split={count}{splits};{scales}"
+    audio_maps = ["0:a:0?"] * (count + 1) if audio else []
+    if edits:
+        filters = jump_cut_filters(edits)
+        graph = f"[0:v]{filters['video']}[cut];[cut]split={count}{splits};{scales}"
+        if audio:
+            # A filtered stream can only be mapped once, so the cut audio is split per rendition
+            outputs = count + (1 if audio_only else 0)
+            graph += f";[0:a]{filters['audio']},asplit={outputs}" + "".join(f"[a{i}]" for i in range(outputs))
+            audio_maps = [f"[a{i}]" for i in range(outputs)]
+    command = [
+        "ffmpeg", "-v", "error", "-y", "-i", source,
+        "-filter_complex", graph,
+    ]
+
+    streams = []
+    for i, rendition in enumerate(ladder):
+        command += [
+            "-map", f"[v{i}out]",
+            f"-c:v:{i}", "libx264", f"-b:v:{i}", rendition["video_bitrate"],
+            f"-maxrate:v:{i}", rendition["maxrate"], f"-bufsize:v:{i}", rendition["bufsize"],
+        ]
+        if not audio:
+            streams.append(f"v:{i},name:{rendition['name']}")
+            continue
+        command += ["-map", audio_maps[i], f"-c:a:{i}", "aac", f"-b:a:{i}", rendition["audio_bitrate"]]
+        streams.append(f"v:{i},a:{i},name:{rendition['name']}")
+    if audio_only:
+        command += ["-map", audio_maps[count], f"-c:a:{count}", "aac", f"-b:a:{count}", AUDIO_ONLY["audio_bitrate"]]
+        streams.append(f"a:{count},name:{AUDIO_ONLY['name']}")
+
+    # Keyframes on segment boundaries in every rendition, so players can switch between them cleanly
+    command += [
+        "-preset", "veryfast", "-sc_threshold", "0",
+        "-force_key_frames", f"expr:gte(t,n_forced*{segment_seconds})",
+        "-f", "hls",
+        "-hls_time", str(segment_seconds),
+        "-hls_playlist_type", "vod",
+        "-hls_flags", "independent_segments",
+        "-hls_segment_filename", os.path.join(out_dir, "%v", "seg_%05d.ts"),
+        "-master_pl_name", MASTER_PLAYLIST,
+        "-var_stream_map", " ".join(streams),
+        os.path.join(out_dir, "%v", "index.m3u8"),
+    ]
+    return command
+
+
+def package(source: str, out_dir: str, source_height: Optional[int] = None, audio_only: bool = True,
+            edits: Optional[List[List[float]]] = None) -> dict:
+    """Encode and package `source` into out_dir; returns the renditions written"""
+    ladder = ladder_for(source_height if source_height is not None else probe_height(source))
+    audio = has_audio(source)
+    os.makedirs(out_dir, exist_ok=True)
+    cancellation.run(hls_command(source, out_dir, ladder, audio_only, edits=edits, audio=audio), check=True)
+    names = [r["name"] for r in ladder] + ([AUDIO_ONLY["name"]] if audio_only and audio else [])
+    return {"master": MASTER_PLAYLIST, "renditions": names}
@@ -0,0 +1,234 @@
+"""Hook title generation for many clips per model request, cached by transcript hash"""
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = set("""
+a about above after again against all am an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her here hers
+him his how i if in into is it its itself just let me more most my no nor not now of off on once only or other
+our ours out over own really same she should so some such than that the their theirs them then there these they
+this those through to too under until up very was we were what when where which while who whom why will with
+would you your yours yeah okay ok gonna like know think going get got one thing things also well right
+dhe në të një për me që nga është janë u do ka kjo ky ajo ai por si edhe më mund jo po
+""".split())
+
+WORD_RE = re.compile(r"[^\W\d_][\w'-]*", re.UNICODE)
+
+
+def transcript_hash(transcript: str, count: int, provider_name: str) -> str:
+    normalized = re.sub(r"\s+", " ", transcript).strip().lower()
+    return hashlib.sha256(f"{provider_name}|{count}|{normalized}".encode("utf-8")).hexdigest()
+
+
+def top_keywords(text: str, count: int = 3) -> List[str]:
+    """Most frequent non-stopword words, lowercased"""
+    words = (w.lower() for w in WORD_RE.findall(text))
+    return [w for w, _ in Counter(w for w in words if len(w) > 2 and w not in STOPWORDS).most_common(count)]
+
+
+def extractive_titles(transcript: str, count: int = 3) -> List[str]:
+    """Keyword-based titles used when no model provider is configured"""
+    keywords = top_keywords(transcript)
+    if not keywords:
+        return ["You won't believe this moment"][:count]
+
+    first_sentence = re.split(r"(?<=[.!?])\s+", transcript.strip())[0]
+    first_sentence = " ".join(first_sentence.split()[:10]).rstrip(",;:")
+    main = keywords[0].capitalize()
+    second = keywords[1] if len(keywords) > 1 else keywords[0]
+
+    candidates = [
+        f"The truth about {main} nobody tells you",
+        f"Why {main} changes everything about {second}",
+        f"{main}: what happens next will surprise you",
+    ]
+    if len(first_sentence.split()) >= 4:
+        candidates.insert(1, first_sentence[0].upper() + first_sentence[1:])
+    return candidates[:count]
+
+
+def build_messages(snippets: List[Tuple[str, str]], count: int) -> List[dict]:
+    clips = [{"id": ref, "transcript": text[:1500]} for ref, text in snippets]
+    return [
+        {
+            "role": "system",
+            "content": (
+                "You write scroll-stopping hook titles for short video clips. Titles are under 60 "
+                "characters, in the language of the transcript, with no hashtags or emojis. Reply with "
+                'JSON only: {"clips": [{"id": "<id>", "titles": ["..."]}]}'
+            ),
+        },
+        {
+            "role": "user",
+            "content": f"Write {count} title candidates for each clip.\n{json.dumps({'clips': clips}, ensure_ascii=False)}",
+        },
+    ]
+
+
+def parse_titles(text: str) -> Dict[str, List[str]]:
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end <= start:
+        return {}
+    try:
+        payload = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+    titles = {}
+    for item in payload.get("clips", []):
+        if isinstance(item, dict) and isinstance(item.get("titles"), list):
+            titles[str(item.get("id"))] = [str(t).strip() for t in item["titles"] if str(t).strip()]
+    return titles
+
+
+class HookTitleGenerator:
+    """Batches per-clip title requests into one model call per window.
+
+    Concurrent `titles()` calls are collected for up to `batch_window` seconds or
+    `batch_size` clips and sent together; model results are cached by transcript hash so
+    re-renders never hit the model again, and a transcript already waiting on the model
+    is not sent twice. Extractive fallbacks after a failed call are not cached, so the
+    next request for that transcript tries the model again.
+    """
+
+    def __init__(self, provider, db=None, count: int = 3, batch_size: int = 20, batch_window: float = 0.05,
+                 cache_size: int = 2048, cache_ttl_seconds: int = 30 * 24 * 3600):
+        self.provider = provider
+        self.cache_collection = db.hook_title_cache if db is not None else None
+        self.count = count
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.cache_size = cache_size
+        self.cache_ttl = timedelta(seconds=cache_ttl_seconds)
+        self._cache: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._pending: List[Tuple[str, str, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        # Flushes of full batches; referenced here so they are not collected mid-request
+        self._flushes: Set[asyncio.Task] = set()
+
+    @property
+    def uses_model(self) -> bool:
+        return getattr(self.provider, "name", "stub") != "stub"
+
+    async def ensure_indexes(self) -> None:
+        if self.cache_collection is not None:
+            await self.cache_collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def titles(self, transcript: str) -> List[str]:
+        """Title candidates for one clip; batched with any other clips requested at the same time"""
+        results = await self.generate_many([transcript])
+        return results[0]
+
+    async def generate_many(self, transcripts: List[str]) -> List[List[str]]:
+        """Title candidates for each transcript, in order"""
+        if not self.uses_model:
+            return [extractive_titles(t, self.count) for t in transcripts]
+
+        keys = [transcript_hash(t, self.count, self.provider.name) for t in transcripts]
+        cached = await self._cached(keys)
+        loop = asyncio.get_running_loop()
+        futures = {}
+        queued = False
+        for key, transcript in zip(keys, transcripts):
+            if key in cached or key in futures:
+                continue
+            if key in self._inflight:
+                futures[key] = self._inflight[key]
+                continue
+            futures[key] = self._inflight[key] = loop.create_future()
+            self._pending.append((key, transcript, futures[key]))
+            queued = True
+
+        if queued:
+            if len(self._pending) >= self.batch_size:
+                # Never on the caller's stack: a cancelled caller must not take the batch down with it
+                flush = asyncio.create_task(self._flush())
+                self._flushes.add(flush)
+                flush.add_done_callback(self._flushes.discard)
+            elif self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.create_task(self._flush_later())
+        for key, future in futures.items():
+            # shield: one caller giving up must not cancel the result others are waiting on
+            cached[key] = await asyncio.shield(future)
+        return [cached[key] for key in keys]
+
+    async def _cached(self, keys: List[str]) -> Dict[str, List[str]]:
+        found = {}
+        for key in keys:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                found[key] = self._cache[key]
+        missing = [key for key in keys if key not in found]
+        if missing and self.cache_collection is not None:
+            now = datetime.utcnow()
+            async for doc in self.cache_collection.find({"_id": {"$in": missing}, "expires_at": {"$gt": now}}):
+                found[doc["_id"]] = doc["titles"]
+                self._remember(doc["_id"], doc["titles"])
+        return found
+
+    def _remember(self, key: str, titles: List[str]) -> None:
+        self._cache[key] = titles
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.batch_window)
+        await self._flush()
+
+    async def _flush(self) -> None:
+        while self._pending:
+            batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+            await self._flush_batch(batch)
+
+    async def _flush_batch(self, batch: List[Tuple[str, str, asyncio.Future]]) -> None:
+        try:
+            try:
+                titles = await self._request(batch)
+            except Exception as e:
+                logger.warning("Hook title request failed, using extractive titles: %s", e)
+                titles = {}
+            now = datetime.utcnow()
+            for index, (key, transcript, future) in enumerate(batch):
+                generated = titles.get(f"c{index}")
+                if generated:
+                    self._remember(key, generated[:self.count])
+                    self._resolve(key, future, generated[:self.count])
+                    await self._persist(key, generated[:self.count], now)
+        finally:
+            # However the batch ended, nobody may be left waiting on it
+            for key, transcript, future in batch:
+                self._resolve(key, future, extractive_titles(transcript, self.count)[:self.count])
+
+    def _resolve(self, key: str, future: asyncio.Future, titles: List[str]) -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.done():
+            future.set_result(titles)
+
+    async def _persist(self, key: str, titles: List[str], now: datetime) -> None:
+        if self.cache_collection is None:
+            return
+        try:
+            await self.cache_collection.replace_one(
+                {"_id": key},
+                {"titles": titles, "created_at": now, "expires_at": now + self.cache_ttl},
+                upsert=True,
+            )
+        except Exception as e:
+            # Waiting clips still get their titles, only other nodes miss the cache
+            logger.warning("Could not cache hook titles: %s", e)
+
+    async def _request(self, batch: List[Tuple[str, str, asyncio.Future]]) -> Dict[str, List[str]]:
+        snippets = [(f"c{index}", transcript) for index, (_, transcript, _) in enumerate(batch)]
+        messages = build_messages(snippets, self.count)
+        chunks = [chunk async for chunk in self.provider.stream(messages, "hook titles", "", {})]
+        return parse_titles("".join(chunks))
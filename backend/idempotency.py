@@ -0,0 +1,93 @@
+"""Idempotency keys and request fingerprints that collapse duplicate clip requests onto one clip"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+
+class IdempotencyConflict(Exception):
+    """An Idempotency-Key was reused with a different request"""
+
+
+def clip_fingerprint(user_id: str, video_key: str, start_time: float, end_time: Optional[float],
+                     features: List[str]) -> str:
+    """Stable hash of everything that determines the work done for a clip request"""
+    parts = [
+        user_id,
+        video_key,
+        round(float(start_time or 0), 3),
+        None if end_time is None else round(float(end_time), 3),
+        sorted(set(features or [])),
+    ]
+    return hashlib.sha256(json.dumps(parts, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """Reservations are documents with a unique _id, so the first of several concurrent requests wins.
+
+    Each document carries its own expires_at and a TTL index removes it afterwards, which lets
+    explicit keys live longer than the short fingerprint window that absorbs double-clicks.
+    """
+
+    def __init__(self, db, collection: str = "idempotency_keys",
+                 key_window_seconds: int = 24 * 3600, fingerprint_window_seconds: int = 600):
+        self.records = db[collection]
+        self.key_window = timedelta(seconds=key_window_seconds)
+        self.fingerprint_window = timedelta(seconds=fingerprint_window_seconds)
+
+    async def ensure_indexes(self) -> None:
+        await self.records.create_index("expires_at", expireAfterSeconds=0)
+        await self.records.create_index("clip_id")
+
+    async def claim(self, user_id: str, fingerprint: str, clip_id: str, key: Optional[str] = None) -> Optional[dict]:
+        """Reserve this request for clip_id, or return the record of the earlier identical request"""
+        now = datetime.utcnow()
+        entries = []
+        if key:
+            entries.append((f"key:{user_id}:{key}", self.key_window))
+        entries.append((f"fp:{fingerprint}", self.fingerprint_window))
+
+        reserved = []
+        for record_id, window in entries:
+            record = {
+                "_id": record_id,
+                "clip_id": clip_id,
+                "user_id": user_id,
+                "fingerprint": fingerprint,
+                "created_at": now,
+                "expires_at": now + window,
+            }
+            existing = await self._insert(record, now)
+            if existing is None:
+                reserved.append(record_id)
+                continue
+
+            if record_id.startswith("key:") and existing["fingerprint"] != fingerprint:
+                raise IdempotencyConflict("Idempotency-Key was already used for a different clip request")
+            if reserved:
+                # The key is new but the request itself is a duplicate; point the key at the earlier clip
+                await self.records.update_many({"_id": {"$in": reserved}}, {"$set": {"clip_id": existing["clip_id"]}})
+            return existing
+        return None
+
+    async def _insert(self, record: dict, now: datetime) -> Optional[dict]:
+        """Insert the record, returning the conflicting live record if there is one"""
+        while True:
+            try:
+                await self.records.insert_one(record)
+                return None
+            except DuplicateKeyError:
+                pass
+            # The TTL monitor only runs once a minute, so take over records that are past their expiry
+            result = await self.records.replace_one({"_id": record["_id"], "expires_at": {"$lte": now}}, record)
+            if result.modified_count:
+                return None
+            existing = await self.records.find_one({"_id": record["_id"]})
+            if existing is not None:
+                return existing
+
+    async def release(self, clip_id: str) -> None:
+        """Forget reservations for a clip that failed, so the same request can be retried"""
+        await self.records.delete_many({"clip_id": clip_id})
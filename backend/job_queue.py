@@ -0,0 +1,394 @@
+"""Durable Mongo-backed job queue with leases, heartbeats, retries and a dead-letter collection"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from tenacity import wait_exponential, wait_random
+
+from cancellation import Cancelled, CancelToken, bound
+from scheduling import SYSTEM_USER, FairShareScheduler
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[dict], Awaitable[Optional[dict]]]
+
+
+class LeaseLost(Exception):
+    """Raised when a worker no longer holds the lease on the job it is running"""
+
+
+class JobQueue:
+    """Jobs are claimed with an atomic find-and-modify that grants a time-limited lease.
+
+    A worker keeps its lease alive with heartbeats; once a lease expires the job is
+    claimable again, so jobs held by dead workers are picked up automatically.
+    """
+
+    def __init__(
+        self,
+        db,
+        collection: str = "jobs",
+        dead_letter_collection: str = "jobs_dead_letter",
+        lease_seconds: float = 60,
+        max_attempts: int = 5,
+        backoff_base: float = 2,
+        backoff_max: float = 300,
+        scheduler: Optional[FairShareScheduler] = None,
+        retention_seconds: float = 7 * 24 * 3600,
+        dead_letter_retention_seconds: float = 30 * 24 * 3600,
+    ):
+        self.jobs = db[collection]
+        self.dead_letter = db[dead_letter_collection]
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff = wait_exponential(multiplier=backoff_base, max=backoff_max) + wait_random(0, 1)
+        # Without a scheduler, jobs are claimed first come, first served
+        self.scheduler = scheduler
+        # Finished jobs are kept this long for stats and debugging, then removed by TTL indexes
+        self.retention_seconds = int(retention_seconds)
+        self.dead_letter_retention = timedelta(seconds=dead_letter_retention_seconds)
+
+    async def ensure_indexes(self) -> None:
+        await self.jobs.create_index([("status", 1), ("available_at", 1)])
+        await self.jobs.create_index([("status", 1), ("lease_expires_at", 1)])
+        await self.jobs.create_index([("status", 1), ("user_id", 1), ("cost", 1)])
+        # Running jobs hold one of their user's numbered slots, which caps each user's running jobs atomically
+        await self.jobs.create_index(
+            [("user_id", 1), ("slot", 1)], unique=True,
+            partialFilterExpression={"status": "running", "slot": {"$exists": True}},
+        )
+        await self.jobs.create_index("completed_at", expireAfterSeconds=self.retention_seconds)
+        await self.jobs.create_index("cancelled_at", expireAfterSeconds=self.retention_seconds)
+        await self.dead_letter.create_index("failed_at")
+        await self.dead_letter.create_index("expires_at", expireAfterSeconds=0)
+
+    async def enqueue(self, kind: str, payload: dict, job_id: Optional[str] = None, user_id: Optional[str] = None,
+                      cost: Optional[float] = None) -> dict:
+        """Queue a job; cost is its estimated worker-seconds, used for scheduling and cost accounting"""
+        job = self._new_job(kind, payload, job_id, user_id, cost)
+        await self.jobs.insert_one(job)
+        return job
+
+    async def resubmit(self, kind: str, payload: dict, job_id: str, user_id: Optional[str] = None,
+                       cost: Optional[float] = None) -> dict:
+        """Queue job_id again once its last run has finished; DuplicateKeyError while it is still queued or running"""
+        job = self._new_job(kind, payload, job_id, user_id, cost)
+        await self.jobs.replace_one({"_id": job_id, "status": {"$in": ["completed", "cancelled"]}}, job, upsert=True)
+        return job
+
+    def _new_job(self, kind: str, payload: dict, job_id: Optional[str], user_id: Optional[str],
+                 cost: Optional[float]) -> dict:
+        now = datetime.utcnow()
+        return {
+            "_id": job_id or str(uuid.uuid4()),
+            "kind": kind,
+            "payload": payload,
+            "user_id": user_id,
+            "cost": cost,
+            "status": "queued",
+            "attempts": 0,
+            "available_at": now,
+            "created_at": now,
+            "worker_id": None,
+            "lease_expires_at": None,
+            "last_error": None,
+        }
+
+    def retry_delay(self, attempts: int) -> float:
+        """Exponential backoff with jitter for the given attempt number"""
+        return self.backoff(SimpleNamespace(attempt_number=attempts))
+
+    async def claim(self, worker_id: str) -> Optional[dict]:
+        """Lease the next runnable job, reclaiming jobs whose lease has expired"""
+        full = set()
+        while True:
+            now = datetime.utcnow()
+            # Jobs whose worker died go first; their users were charged for them already
+            job = await self._lease(
+                {"status": "running", "lease_expires_at": {"$lt": now}, "cancel_requested": {"$ne": True}},
+                worker_id, now,
+            )
+            if job is None and self.scheduler is None:
+                job = await self._lease({"status": "queued", "available_at": {"$lte": now}}, worker_id, now)
+            elif job is None:
+                choice = await self.scheduler.pick(self.jobs, now, exclude=full)
+                if choice is None:
+                    return None
+                job = await self._lease_slot(choice, worker_id, now)
+                if job is False:
+                    # Every slot was taken since the running counts were read
+                    full.add(choice["user"])
+                    continue
+                if job is None:
+                    # Another worker claimed it between the pick and the lease
+                    continue
+                self.scheduler.note_claimed(choice["user"])
+                await self.scheduler.charge(choice)
+            if job is None:
+                return None
+            if job["attempts"] <= self.max_attempts:
+                return job
+            # A job that keeps killing its workers never reaches fail(), catch it here
+            await self._bury(job, job.get("last_error") or "Lease expired too many times")
+
+    async def _lease_slot(self, choice: dict, worker_id: str, now: datetime):
+        """Lease the chosen job into a free slot of its user; None if it is gone, False if every slot is taken"""
+        query = {"_id": choice["job_id"], "status": "queued"}
+        if choice["user"] == SYSTEM_USER:
+            return await self._lease(query, worker_id, now)
+        for slot in range(self.scheduler.max_running_per_user):
+            try:
+                return await self._lease(query, worker_id, now, slot=slot)
+            except DuplicateKeyError:
+                continue
+        return False
+
+    async def _lease(self, query: dict, worker_id: str, now: datetime, slot: Optional[int] = None) -> Optional[dict]:
+        return await self.jobs.find_one_and_update(
+            query,
+            {
+                "$set": {
+                    "status": "running",
+                    "worker_id": worker_id,
+                    "claimed_at": now,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                    **({"slot": slot} if slot is not None else {}),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("available_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def heartbeat(self, job_id: str, worker_id: str) -> str:
+        """Extend the lease: "held", "lost" once another worker has taken the job over, or "cancel" if cancelled"""
+        job = await self.jobs.find_one_and_update(
+            {"_id": job_id, "worker_id": worker_id, "status": "running"},
+            {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}},
+            projection={"cancel_requested": 1},
+        )
+        if job is None:
+            return "lost"
+        return "cancel" if job.get("cancel_requested") else "held"
+
+    async def cancel(self, job_id: str) -> Optional[str]:
+        """"removed" for a job that had not started, "requested" for one its worker still has to stop, else None"""
+        removed = await self.jobs.delete_one({"_id": job_id, "status": "queued"})
+        if removed.deleted_count:
+            return "removed"
+        # A running job whose worker died has nobody left to stop it
+        abandoned = await self.jobs.update_one(
+            {"_id": job_id, "status": "running", "lease_expires_at": {"$lt": datetime.utcnow()}},
+            {"$set": {"status": "cancelled", "cancelled_at": datetime.utcnow(), "lease_expires_at": None}},
+        )
+        if abandoned.modified_count:
+            return "removed"
+        requested = await self.jobs.update_one(
+            {"_id": job_id, "status": "running"}, {"$set": {"cancel_requested": True}}
+        )
+        return "requested" if requested.modified_count else None
+
+    async def cancelled(self, job_id: str, worker_id: str) -> bool:
+        """Record that the worker holding job_id has stopped it"""
+        update = await self.jobs.update_one(
+            {"_id": job_id, "worker_id": worker_id, "status": "running"},
+            {"$set": {"status": "cancelled", "cancelled_at": datetime.utcnow(), "lease_expires_at": None}},
+        )
+        return update.modified_count == 1
+
+    async def complete(self, job_id: str, worker_id: str, result: Optional[dict] = None,
+                       metrics: Optional[dict] = None) -> bool:
+        update = await self.jobs.update_one(
+            {"_id": job_id, "worker_id": worker_id, "status": "running"},
+            {"$set": {
+                "status": "completed",
+                "result": result,
+                "completed_at": datetime.utcnow(),
+                "lease_expires_at": None,
+                **(metrics or {}),
+            }},
+        )
+        return update.modified_count == 1
+
+    async def fail(self, job: dict, worker_id: str, error: str) -> str:
+        """Schedule a retry with backoff, or dead-letter the job once attempts are exhausted"""
+        if job["attempts"] >= self.max_attempts:
+            await self._bury(job, error)
+            return "dead"
+        delay = self.retry_delay(job["attempts"])
+        await self.jobs.update_one(
+            {"_id": job["_id"], "worker_id": worker_id},
+            {"$set": {
+                "status": "queued",
+                "available_at": datetime.utcnow() + timedelta(seconds=delay),
+                "worker_id": None,
+                "lease_expires_at": None,
+                "last_error": error,
+            }},
+        )
+        return "retry"
+
+    async def _bury(self, job: dict, error: str) -> None:
+        now = datetime.utcnow()
+        job = dict(job, status="dead", last_error=error, failed_at=now, expires_at=now + self.dead_letter_retention)
+        await self.dead_letter.replace_one({"_id": job["_id"]}, job, upsert=True)
+        await self.jobs.delete_one({"_id": job["_id"]})
+        logger.error("Job %s moved to dead-letter queue after %s attempts: %s", job["_id"], job["attempts"], error)
+
+    async def requeue_dead(self, job_id: str) -> bool:
+        """Move a dead-lettered job back onto the queue with a fresh attempt budget"""
+        job = await self.dead_letter.find_one({"_id": job_id})
+        if not job:
+            return False
+        job.update(status="queued", attempts=0, available_at=datetime.utcnow(), worker_id=None, lease_expires_at=None)
+        job.pop("failed_at", None)
+        job.pop("expires_at", None)
+        await self.jobs.replace_one({"_id": job_id}, job, upsert=True)
+        await self.dead_letter.delete_one({"_id": job_id})
+        return True
+
+    async def stats(self) -> dict:
+        counts = {}
+        async for row in self.jobs.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        counts["dead"] = await self.dead_letter.count_documents({})
+        return counts
+
+
+class Worker:
+    """Claims jobs from a JobQueue and runs them, heartbeating while each job is in flight"""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Dict[str, JobHandler],
+        worker_id: Optional[str] = None,
+        concurrency: int = 1,
+        poll_interval: float = 1.0,
+        can_claim: Callable[[], bool] = lambda: True,
+        on_dead: Optional[Callable[[dict, str], Awaitable[None]]] = None,
+        deadlines: Optional[Dict[str, float]] = None,
+        on_cancel: Optional[Callable[[str], object]] = None,
+    ):
+        self.queue = queue
+        self.handlers = handlers
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.can_claim = can_claim
+        self.on_dead = on_dead
+        # Seconds a job of each kind may run before its subprocesses are killed and it fails
+        self.deadlines = deadlines or {}
+        # Told the id of every job stopped by a cancel, for work the cancel token cannot reach (e.g. process pools)
+        self.on_cancel = on_cancel
+        self._tasks = []
+        self._running: Dict[str, tuple] = {}
+
+    async def _slot(self) -> None:
+        while True:
+            try:
+                job = await self.queue.claim(self.worker_id) if self.can_claim() else None
+            except Exception:
+                logger.exception("Failed to claim job")
+                job = None
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            await self.execute(job)
+
+    async def execute(self, job: dict) -> None:
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            await self._failed(job, f"No handler for job kind {job['kind']}")
+            return
+
+        # Subprocesses started by the handler register with this token, so stopping the job kills them
+        token = CancelToken(self.deadlines.get(job["kind"]))
+        started = time.monotonic()
+        with bound(token):
+            task = asyncio.create_task(handler(job))
+        self._running[job["_id"]] = (task, token)
+        heartbeat = asyncio.create_task(self._heartbeat(job, task, token))
+        try:
+            result = await task
+        except (asyncio.CancelledError, Cancelled):
+            if token.reason == "lost":
+                logger.warning("Lost lease on job %s, abandoning it", job["_id"])
+                return
+            if token.reason == "cancelled":
+                logger.info("Job %s cancelled", job["_id"])
+                await self.queue.cancelled(job["_id"], self.worker_id)
+                return
+            # The worker itself is stopping; the job is picked up again once its lease runs out
+            token.cancel("stopping")
+            raise
+        except Exception as e:
+            logger.exception("Job %s failed", job["_id"])
+            await self._failed(job, str(e) or e.__class__.__name__)
+            return
+        finally:
+            heartbeat.cancel()
+            self._running.pop(job["_id"], None)
+        metrics = {"run_seconds": round(time.monotonic() - started, 2)}
+        if job["attempts"] == 1:
+            # Retries wait out their backoff on purpose, so only first attempts say anything about queueing
+            metrics["queue_wait_seconds"] = round((job["claimed_at"] - job["created_at"]).total_seconds(), 2)
+        await self.queue.complete(job["_id"], self.worker_id, result, metrics)
+
+    def cancel(self, job_id: str) -> bool:
+        """Stop a job running on this worker right away: its subprocess trees first, then the handler"""
+        running = self._running.get(job_id)
+        if running is None:
+            return False
+        task, token = running
+        self._stop(job_id, task, token, "cancelled")
+        return True
+
+    def _stop(self, job_id: str, task: asyncio.Task, token: CancelToken, reason: str) -> None:
+        token.cancel(reason)
+        if reason == "cancelled" and self.on_cancel:
+            try:
+                self.on_cancel(job_id)
+            except Exception:
+                logger.exception("Cancel hook failed for job %s", job_id)
+        task.cancel()
+
+    async def _heartbeat(self, job: dict, task: asyncio.Task, token: CancelToken) -> None:
+        interval = self.queue.lease_seconds / 3
+        while not task.done():
+            await asyncio.sleep(interval)
+            try:
+                state = await self.queue.heartbeat(job["_id"], self.worker_id)
+            except Exception:
+                logger.exception("Heartbeat failed for job %s", job["_id"])
+                continue
+            if state != "held":
+                self._stop(job["_id"], task, token, "lost" if state == "lost" else "cancelled")
+                return
+
+    async def _failed(self, job: dict, error: str) -> None:
+        outcome = await self.queue.fail(job, self.worker_id, error)
+        if outcome == "dead" and self.on_dead:
+            await self.on_dead(job, error)
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._slot()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def run_forever(self) -> None:
+        self.start()
+        await asyncio.gather(*self._tasks)
@@ -0,0 +1,214 @@
+"""Scratch media tracking, orphan cleanup and disk quota enforcement"""
+import asyncio
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# clip_<pid>_<job>_<rand><suffix> - the pid lets a sweep tell live owners from crashed ones
+SCRATCH_NAME_RE = re.compile(r"^clip_(?P<pid>\d+)_(?P<job>[A-Za-z0-9-]+)_[0-9a-f]{8}")
+
+
+@dataclass
+class ScratchFile:
+    path: str
+    job_id: str
+    created_at: float
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class MediaJanitor:
+    """Tracks pipeline scratch files per job and keeps the scratch disk under its high-water mark"""
+
+    def __init__(
+        self,
+        scratch_dir: str,
+        high_water: float = 0.90,
+        low_water: float = 0.80,
+        max_age: float = 6 * 3600,
+        orphan_grace: float = 600,
+        interval: float = 60,
+    ):
+        self.scratch_dir = scratch_dir
+        self.high_water = high_water
+        self.low_water = low_water
+        self.max_age = max_age
+        self.orphan_grace = orphan_grace
+        self.interval = interval
+        self._files: Dict[str, ScratchFile] = {}
+        self._paused = False
+        self._task: Optional[asyncio.Task] = None
+        self.files_reclaimed = 0
+        self.bytes_reclaimed = 0
+        self.last_sweep_at: Optional[float] = None
+        os.makedirs(scratch_dir, exist_ok=True)
+
+    # File tracking
+
+    def scratch_path(self, job_id: str, suffix: str = ".mp4") -> str:
+        """Allocate and track a new scratch file path owned by job_id"""
+        safe_job = re.sub(r"[^A-Za-z0-9-]", "", job_id)[:36] or "job"
+        name = f"clip_{os.getpid()}_{safe_job}_{uuid.uuid4().hex[:8]}{suffix}"
+        path = os.path.join(self.scratch_dir, name)
+        self.track(path, job_id)
+        return path
+
+    def track(self, path: str, job_id: str) -> None:
+        self._files[path] = ScratchFile(path=path, job_id=job_id, created_at=time.time())
+
+    def keep(self, path: str) -> None:
+        """Stop tracking a file that has been promoted to a deliverable"""
+        self._files.pop(path, None)
+
+    def discard(self, path: str) -> int:
+        """Delete a single tracked scratch file"""
+        self._files.pop(path, None)
+        return self._delete(path)
+
+    def job_files(self, job_id: str) -> List[ScratchFile]:
+        return [f for f in self._files.values() if f.job_id == job_id]
+
+    def release_job(self, job_id: str) -> int:
+        """Delete every scratch file owned by job_id, returning the bytes freed"""
+        freed = 0
+        for scratch in self.job_files(job_id):
+            freed += self._delete(scratch.path)
+            self._files.pop(scratch.path, None)
+        return freed
+
+    def _delete(self, path: str) -> int:
+        size = _file_size(path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            logger.warning("Could not remove scratch file %s: %s", path, e)
+            return 0
+        self.files_reclaimed += 1
+        self.bytes_reclaimed += size
+        return size
+
+    # Disk pressure
+
+    def disk_usage(self) -> dict:
+        usage = shutil.disk_usage(self.scratch_dir)
+        return {
+            "total": usage.total,
+            "used": usage.used,
+            "free": usage.free,
+            "ratio": usage.used / usage.total if usage.total else 0.0,
+        }
+
+    def admission_open(self) -> bool:
+        """Whether new jobs may start; pauses at the high-water mark and resumes below the low-water mark"""
+        ratio = self.disk_usage()["ratio"]
+        if not self._paused and ratio >= self.high_water:
+            self._paused = True
+            logger.warning("Scratch disk at %.0f%%, pausing new jobs", ratio * 100)
+        elif self._paused and ratio <= self.low_water:
+            self._paused = False
+            logger.info("Scratch disk at %.0f%%, resuming new jobs", ratio * 100)
+        return not self._paused
+
+    # Sweeping
+
+    def sweep(self) -> int:
+        """Remove stale tracked files and orphans left by finished or crashed owners"""
+        now = time.time()
+        freed = 0
+
+        for scratch in list(self._files.values()):
+            if not os.path.exists(scratch.path):
+                self._files.pop(scratch.path, None)
+            elif now - scratch.created_at > self.max_age:
+                logger.warning("Removing scratch file %s of job %s after max age", scratch.path, scratch.job_id)
+                freed += self._delete(scratch.path)
+                self._files.pop(scratch.path, None)
+
+        own_pid = os.getpid()
+        try:
+            entries = list(os.scandir(self.scratch_dir))
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            if not entry.is_file() or entry.path in self._files:
+                continue
+            match = SCRATCH_NAME_RE.match(entry.name)
+            if not match:
+                continue
+            pid = int(match.group("pid"))
+            if pid != own_pid and _pid_alive(pid):
+                continue
+            try:
+                age = now - entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if age > self.orphan_grace:
+                freed += self._delete(entry.path)
+
+        self.last_sweep_at = now
+        self.admission_open()
+        return freed
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.sweep)
+            except Exception:
+                logger.exception("Scratch sweep failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def metrics(self) -> dict:
+        disk = self.disk_usage()
+        return {
+            "scratch_dir": self.scratch_dir,
+            "disk_total_bytes": disk["total"],
+            "disk_used_bytes": disk["used"],
+            "disk_free_bytes": disk["free"],
+            "disk_usage_ratio": round(disk["ratio"], 4),
+            "high_water": self.high_water,
+            "low_water": self.low_water,
+            "admission_paused": self._paused,
+            "tracked_files": len(self._files),
+            "tracked_bytes": sum(_file_size(f.path) for f in self._files.values()),
+            "files_reclaimed": self.files_reclaimed,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "last_sweep_at": self.last_sweep_at,
+        }
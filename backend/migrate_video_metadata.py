@@ -0,0 +1,150 @@
+"""One-off migration: move embedded video_info into video_metadata and collapse video history
+
+Clips get a `video_id` reference and lose their embedded `video_info`. History rows in
+`videos` are merged into one row per (user, video) carrying a view count. Duplicates are
+merged away before the surviving row gets its `video_id`, so the migration can run while
+servers that already created the unique (user_id, video_id) index are up. Safe to re-run;
+documents that were already migrated are skipped.
+
+    python migrate_video_metadata.py [--dry-run]
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from video_ids import video_key
+from video_metadata import VideoMetadataStore
+
+# Same settings as the server; importing it would start its clients and background services
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "pjeseza_db")
+BATCH_SIZE = 500
+
+
+async def migrate_collection(db, collection: str, store: VideoMetadataStore, dry_run: bool) -> int:
+    """Copy embedded video_info into video_metadata and replace it with a video_id reference"""
+    migrated = 0
+    updates = []
+    cursor = db[collection].find(
+        {"video_info": {"$exists": True}},
+        {"youtube_url": 1, "video_info": 1, "created_at": 1},
+    ).sort("created_at", 1)
+
+    async for doc in cursor:
+        key = video_key(doc["youtube_url"])
+        if not dry_run:
+            # Oldest first, so the newest embedded copy ends up as the stored metadata
+            await store.upsert(key, doc["video_info"], doc["youtube_url"])
+        updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"video_id": key}, "$unset": {"video_info": ""}}))
+        if len(updates) >= BATCH_SIZE:
+            migrated += await flush(db[collection], updates, dry_run)
+            updates = []
+    migrated += await flush(db[collection], updates, dry_run)
+    return migrated
+
+
+async def flush(collection, updates, dry_run: bool) -> int:
+    if updates and not dry_run:
+        await collection.bulk_write(updates, ordered=False)
+    return len(updates)
+
+
+async def migrate_history(db, store: VideoMetadataStore, dry_run: bool) -> Tuple[int, int]:
+    """Give history rows a video_id, merging each user's rows for one video into a single row first"""
+    groups: Dict[Tuple[str, str], List[dict]] = {}
+    cursor = db.videos.find(
+        {"video_info": {"$exists": True}},
+        {"user_id": 1, "youtube_url": 1, "video_info": 1, "created_at": 1, "last_viewed_at": 1, "view_count": 1},
+    ).sort("created_at", 1)
+    migrated = 0
+    async for doc in cursor:
+        key = video_key(doc["youtube_url"])
+        if not dry_run:
+            await store.upsert(key, doc.pop("video_info"), doc["youtube_url"])
+        doc.pop("video_info", None)
+        groups.setdefault((doc["user_id"], key), []).append(doc)
+        migrated += 1
+
+    removed = 0
+    for (user_id, key), docs in groups.items():
+        # A row migrated earlier, or created by a server already on the new schema, is the one to keep
+        existing = await db.videos.find_one({"user_id": user_id, "video_id": key})
+        rows = ([existing] if existing else []) + docs
+        keep, duplicates = rows[0], rows[1:]
+        seen = [row.get("last_viewed_at") or row.get("created_at") or datetime.min for row in rows]
+        if not dry_run:
+            if duplicates:
+                await db.videos.delete_many({"_id": {"$in": [row["_id"] for row in duplicates]}})
+            await db.videos.update_one({"_id": keep["_id"]}, {
+                "$set": {
+                    "video_id": key,
+                    "view_count": sum(row.get("view_count") or 1 for row in rows),
+                    "created_at": min((row["created_at"] for row in rows if row.get("created_at")), default=datetime.utcnow()),
+                    "last_viewed_at": max(seen) if max(seen) > datetime.min else datetime.utcnow(),
+                    "youtube_url": rows[seen.index(max(seen))]["youtube_url"],
+                },
+                "$unset": {"video_info": ""},
+            })
+        removed += len(duplicates)
+    return migrated, removed
+
+
+async def collapse_history(db, dry_run: bool) -> int:
+    """Merge duplicate (user, video) history rows left by earlier runs into the oldest one"""
+    removed = 0
+    pipeline = [
+        {"$match": {"video_id": {"$exists": True}}},
+        {"$sort": {"created_at": 1}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "video_id": "$video_id"},
+            "ids": {"$push": "$_id"},
+            "views": {"$sum": {"$ifNull": ["$view_count", 1]}},
+            "first_seen": {"$min": "$created_at"},
+            "last_seen": {"$max": {"$ifNull": ["$last_viewed_at", "$created_at"]}},
+            "youtube_url": {"$last": "$youtube_url"},
+        }},
+    ]
+    async for group in db.videos.aggregate(pipeline, allowDiskUse=True):
+        keep, duplicates = group["ids"][0], group["ids"][1:]
+        if not dry_run:
+            # Drop duplicates first, so the unique (user_id, video_id) index can be built afterwards
+            if duplicates:
+                await db.videos.delete_many({"_id": {"$in": duplicates}})
+            await db.videos.update_one({"_id": keep}, {"$set": {
+                "view_count": group["views"],
+                "created_at": group["first_seen"] or datetime.utcnow(),
+                "last_viewed_at": group["last_seen"] or datetime.utcnow(),
+                "youtube_url": group["youtube_url"],
+            }})
+        removed += len(duplicates)
+    return removed
+
+
+async def main(dry_run: bool) -> int:
+    mongo_client = AsyncIOMotorClient(MONGO_URL)
+    db = mongo_client[DB_NAME]
+    store = VideoMetadataStore(db)
+    try:
+        clips = await migrate_collection(db, "clips", store, dry_run)
+        videos, removed = await migrate_history(db, store, dry_run)
+        removed += await collapse_history(db, dry_run)
+        if not dry_run:
+            await store.ensure_indexes()
+        prefix = "[dry run] " if dry_run else ""
+        print(f"{prefix}Migrated {clips} clips and {videos} history rows, merged away {removed} duplicate history rows")
+    finally:
+        mongo_client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.dry_run)))
@@ -0,0 +1,200 @@
+"""Editor preview assets: an all-intra proxy, thumbnail sprite sheets with a WebVTT index and waveform peaks
+
+All of them come out of one ffmpeg pass over the source and are kept once per video.
+"""
+import asyncio
+import hashlib
+import os
+import shutil
+import subprocess
+import uuid
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+import cancellation
+import waveform
+from media_janitor import MediaJanitor
+
+PREVIEW_PRESET = "preview-v2"
+PROXY_HEIGHT = 360
+THUMB_WIDTH, THUMB_HEIGHT = 160, 90
+THUMB_INTERVAL = 2
+SPRITE_COLUMNS, SPRITE_ROWS = 10, 10
+PROXY_FILE = "proxy.mp4"
+SPRITE_PATTERN = "sprite_%03d.jpg"
+VTT_FILE = "thumbnails.vtt"
+WAVEFORM_FILE = "waveform.bin"
+PCM_BLOCK_BYTES = 64 * 1024
+
+
+def preview_key(video_id: str) -> str:
+    return hashlib.sha256(f"{video_id}|{PREVIEW_PRESET}".encode("utf-8")).hexdigest()
+
+
+def preview_command(source: str, out_dir: str, audio: bool = True) -> List[str]:
+    """Decode once; one branch becomes the proxy, the other the tiled thumbnails, and the audio is piped out as PCM"""
+    thumbs = (
+        f"fps=1/{THUMB_INTERVAL},"
+        f"scale={THUMB_WIDTH}:{THUMB_HEIGHT}:force_original_aspect_ratio=decrease,"
+        f"pad={THUMB_WIDTH}:{THUMB_HEIGHT}:(ow-iw)/2:(oh-ih)/2,"
+        f"tile={SPRITE_COLUMNS}x{SPRITE_ROWS}"
+    )
+    return [
+        "ffmpeg", "-v", "error", "-y", "-i", source,
+        "-filter_complex", f"[0:v]split=2[p][s];[p]scale=-2:{PROXY_HEIGHT}[proxy];[s]{thumbs}[sprites]",
+        # Every frame a keyframe, so seeking anywhere in the editor decodes a single frame
+        "-map", "[proxy]", "-map", "0:a:0?",
+        "-c:v", "libx264", "-preset", "veryfast", "-g", "1", "-crf", "30", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-b:a", "64k", "-ac", "1", "-movflags", "+faststart",
+        os.path.join(out_dir, PROXY_FILE),
+        "-map", "[sprites]", "-q:v", "5", "-f", "image2",
+        os.path.join(out_dir, SPRITE_PATTERN),
+    ] + ([
+        "-map", "0:a:0", "-ac", "1", "-ar", str(waveform.SAMPLE_RATE), "-f", "s16le", "pipe:1",
+    ] if audio else [])
+
+
+def timestamp(seconds: float) -> str:
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{secs:06.3f}"
+
+
+def sprite_vtt(duration: float, url_prefix: str) -> str:
+    """WebVTT cues pointing each thumbnail interval at its tile (#xywh) in a sprite sheet"""
+    per_sheet = SPRITE_COLUMNS * SPRITE_ROWS
+    lines = ["WEBVTT", ""]
+    index = 0
+    start = 0.0
+    while start < duration:
+        end = min(start + THUMB_INTERVAL, duration)
+        sheet, position = divmod(index, per_sheet)
+        row, column = divmod(position, SPRITE_COLUMNS)
+        # ffmpeg numbers image2 output from 1
+        image = SPRITE_PATTERN % (sheet + 1)
+        lines += [
+            f"{timestamp(start)} --> {timestamp(end)}",
+            f"{url_prefix}{image}#xywh={column * THUMB_WIDTH},{row * THUMB_HEIGHT},{THUMB_WIDTH},{THUMB_HEIGHT}",
+            "",
+        ]
+        index += 1
+        start = end
+    return "\n".join(lines)
+
+
+def probe_duration(path: str) -> float:
+    result = cancellation.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path],
+        capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout.strip() or 0)
+
+
+def has_audio(path: str) -> bool:
+    result = cancellation.run(
+        ["ffprobe", "-v", "error", "-select_streams", "a", "-show_entries", "stream=index", "-of", "csv=p=0", path],
+        capture_output=True, text=True, check=True,
+    )
+    return bool(result.stdout.strip())
+
+
+def generate(source: str, out_dir: str, duration: float, url_prefix: str) -> None:
+    duration = duration or probe_duration(source)
+    audio = has_audio(source)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Peaks are computed from the PCM stream as ffmpeg produces it, a block at a time
+    peaks = waveform.PeakBuilder()
+    with cancellation.popen(preview_command(source, out_dir, audio), stdout=subprocess.PIPE) as process:
+        while audio:
+            data = process.stdout.read(PCM_BLOCK_BYTES)
+            if not data:
+                break
+            peaks.feed_bytes(data)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, "ffmpeg")
+    peaks.finish()
+    with open(os.path.join(out_dir, WAVEFORM_FILE), "wb") as f:
+        f.write(peaks.encode())
+
+    with open(os.path.join(out_dir, VTT_FILE), "w") as f:
+        f.write(sprite_vtt(duration, url_prefix))
+
+
+class PreviewBuilder:
+    """Builds preview assets per video as queue jobs; `video_previews` tracks their state"""
+
+    def __init__(self, db, root_dir: str, janitor: MediaJanitor, fetch_source: Callable[..., str],
+                 url_base: str = "/api/media/previews"):
+        self.previews = db.video_previews
+        self.metadata = db.video_metadata
+        self.root_dir = root_dir
+        self.janitor = janitor
+        self.fetch_source = fetch_source
+        self.url_base = url_base
+
+    def preview_dir(self, key: str) -> str:
+        return os.path.join(self.root_dir, "previews", key)
+
+    def urls(self, key: str) -> dict:
+        prefix = f"{self.url_base}/{key}/"
+        return {
+            "proxy_url": prefix + PROXY_FILE,
+            "thumbnails_vtt_url": prefix + VTT_FILE,
+            "waveform_url": prefix + WAVEFORM_FILE,
+        }
+
+    async def request(self, video_id: str, source_url: str) -> Tuple[dict, bool]:
+        """Current preview state of a video, and whether the caller should queue a build"""
+        key = preview_key(video_id)
+        fresh = {"status": "queued", "key": key, "source_url": source_url, "requested_at": datetime.utcnow()}
+        # Only a missing, failed or outdated preview is (re)claimed; current queued, building and ready ones are left alone
+        claimed = await self.previews.find_one_and_update(
+            {"_id": video_id, "$or": [{"status": "failed"}, {"key": {"$ne": key}}]},
+            {"$set": fresh, "$unset": {"error": "", "proxy_url": "", "thumbnails_vtt_url": "", "waveform_url": ""}},
+        )
+        if claimed is None:
+            try:
+                await self.previews.insert_one({"_id": video_id, **fresh})
+                claimed = fresh
+            except DuplicateKeyError:
+                pass
+        return await self.previews.find_one({"_id": video_id}), claimed is not None
+
+    async def build(self, job: dict) -> dict:
+        video_id = job["payload"]["video_id"]
+        state = await self.previews.find_one({"_id": video_id})
+        if not state:
+            return {"skipped": "preview request no longer exists"}
+        key = state["key"]
+        out_dir = self.preview_dir(key)
+
+        if not os.path.exists(os.path.join(out_dir, VTT_FILE)):
+            await self.previews.update_one({"_id": video_id}, {"$set": {"status": "processing"}})
+            metadata = await self.metadata.find_one({"_id": video_id}, {"video_info.duration": 1})
+            duration = ((metadata or {}).get("video_info") or {}).get("duration") or 0
+            job_id = f"preview-{key[:16]}"
+            staging = f"{out_dir}.{uuid.uuid4().hex[:8]}.tmp"
+            try:
+                source = await asyncio.to_thread(self.fetch_source, state["source_url"], 0, None, job_id, 720)
+                await asyncio.to_thread(generate, source, staging, duration, f"{self.url_base}/{key}/")
+                try:
+                    os.rename(staging, out_dir)
+                except OSError:
+                    if not os.path.exists(os.path.join(out_dir, VTT_FILE)):
+                        raise
+            finally:
+                self.janitor.release_job(job_id)
+                shutil.rmtree(staging, ignore_errors=True)
+
+        await self.previews.update_one({"_id": video_id}, {"$set": {
+            "status": "ready", **self.urls(key), "ready_at": datetime.utcnow(),
+        }})
+        return {"video_id": video_id, "preview_key": key}
+
+    async def mark_failed(self, job: dict, error: str) -> None:
+        await self.previews.update_one(
+            {"_id": job["payload"]["video_id"]}, {"$set": {"status": "failed", "error": error}}
+        )
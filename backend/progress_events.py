@@ -0,0 +1,108 @@
+"""Per-clip progress events published by the pipeline and streamed to clients as Server-Sent Events"""
+import asyncio
+import json
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+TERMINAL_STAGES = {"done", "failed", "cancelled"}
+
+
+def format_sse(event: dict) -> str:
+    payload = {k: v for k, v in event.items() if k not in ("_id", "created_at")}
+    payload["created_at"] = event["created_at"].isoformat()
+    return f"id: {event['seq']}\nevent: {event['stage']}\ndata: {json.dumps(payload)}\n\n"
+
+
+class ProgressEvents:
+    """Events are numbered per clip so a reconnecting client can resume from its last event id.
+
+    Publishers in this process wake local subscribers immediately; events published by
+    other worker nodes are picked up by polling the events collection.
+    """
+
+    def __init__(self, db, collection: str = "clip_events", poll_interval: float = 1.0,
+                 keepalive_interval: float = 15.0, retention_seconds: int = 7 * 24 * 3600):
+        self.db = db
+        self.events = db[collection]
+        self.poll_interval = poll_interval
+        self.keepalive_interval = keepalive_interval
+        self.retention_seconds = retention_seconds
+        self._waiters: Dict[str, asyncio.Event] = {}
+
+    async def ensure_indexes(self) -> None:
+        await self.events.create_index([("clip_id", 1), ("seq", 1)], unique=True)
+        await self.events.create_index("created_at", expireAfterSeconds=self.retention_seconds)
+
+    async def publish(self, clip_id: str, stage: str, progress: Optional[float] = None,
+                      message: Optional[str] = None, **data) -> Optional[dict]:
+        """Record an event and mirror it onto the clip as its latest progress"""
+        now = datetime.utcnow()
+        latest = {"stage": stage, "progress": progress, "message": message, "updated_at": now}
+        clip = await self.db.clips.find_one_and_update(
+            {"_id": clip_id},
+            {"$inc": {"event_seq": 1}, "$set": {"progress": latest}},
+            projection={"event_seq": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if clip is None:
+            return None
+
+        event = {
+            "clip_id": clip_id,
+            "seq": clip["event_seq"],
+            "stage": stage,
+            "progress": progress,
+            "message": message,
+            "created_at": now,
+            **data,
+        }
+        await self.events.insert_one(event)
+        self._notify(clip_id)
+        return event
+
+    def _notify(self, clip_id: str) -> None:
+        waiter = self._waiters.pop(clip_id, None)
+        if waiter:
+            waiter.set()
+
+    async def _wait(self, clip_id: str, timeout: float) -> None:
+        waiter = self._waiters.setdefault(clip_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(waiter.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def events_after(self, clip_id: str, seq: int) -> List[dict]:
+        cursor = self.events.find({"clip_id": clip_id, "seq": {"$gt": seq}}).sort("seq", 1)
+        return await cursor.to_list(None)
+
+    async def stream(self, clip_id: str, last_event_id: int = 0,
+                     is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None) -> AsyncIterator[str]:
+        """Yield SSE frames for events after last_event_id until the clip reaches a terminal stage"""
+        seq = last_event_id
+        idle = 0.0
+        yield f"retry: {int(self.poll_interval * 1000)}\n\n"
+
+        # A client resuming after the terminal event has nothing left to wait for
+        clip = await self.db.clips.find_one({"_id": clip_id}, {"event_seq": 1, "progress": 1})
+        if clip is None:
+            return
+        if (clip.get("progress") or {}).get("stage") in TERMINAL_STAGES and seq >= clip.get("event_seq", 0):
+            return
+
+        while True:
+            if is_disconnected and await is_disconnected():
+                return
+            for event in await self.events_after(clip_id, seq):
+                seq = event["seq"]
+                idle = 0.0
+                yield format_sse(event)
+                if event["stage"] in TERMINAL_STAGES:
+                    return
+            await self._wait(clip_id, self.poll_interval)
+            idle += self.poll_interval
+            if idle >= self.keepalive_interval:
+                idle = 0.0
+                yield ": keepalive\n\n"
@@ -0,0 +1,156 @@
+"""Token-bucket rate limiting shared across workers through Redis, with an in-memory fallback"""
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover - redis is optional for single-node runs
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Bucket:
+    """A token bucket refilling `rate` tokens per second up to `capacity`"""
+    key: str
+    rate: float
+    capacity: float
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    retry_after: float = 0.0
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+# Checks every bucket and only spends tokens when all of them can pay, so a request
+# rejected by the endpoint-wide bucket does not drain the caller's own bucket.
+# KEYS = bucket keys, ARGV = (rate, capacity) pairs followed by the cost.
+TOKEN_BUCKET_SCRIPT = """
+local cost = tonumber(ARGV[#ARGV])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local tokens = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2 - 1])
+    local capacity = tonumber(ARGV[i * 2])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    available = math.min(capacity, available + math.max(0, now - ts) * rate)
+    tokens[i] = available
+    if available < cost then
+        wait = math.max(wait, (cost - available) / rate)
+    end
+end
+local allowed = 0
+if wait == 0 then
+    allowed = 1
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2 - 1])
+    local capacity = tonumber(ARGV[i * 2])
+    local remaining = tokens[i]
+    if allowed == 1 then
+        remaining = remaining - cost
+    end
+    redis.call('HSET', key, 'tokens', tostring(remaining), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000) + 1000)
+end
+return {allowed, tostring(wait)}
+"""
+
+
+class MemoryBackend:
+    """Process-local buckets for single-node deployments and tests
+
+    Like the Redis keys, a bucket is forgotten once it has been idle long enough to be
+    full again, so per-user buckets of users who went away do not pile up.
+    """
+
+    def __init__(self, sweep_interval: float = 60):
+        # key -> (tokens, last update, time after which the bucket is full and can be dropped)
+        self._state: Dict[str, Tuple[float, float, float]] = {}
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def _sweep(self, now: float) -> None:
+        for key in [key for key, state in self._state.items() if state[2] <= now]:
+            del self._state[key]
+        self._next_sweep = now + self.sweep_interval
+
+    async def consume(self, buckets: List[Bucket], cost: float = 1) -> Decision:
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        levels = []
+        wait = 0.0
+        for bucket in buckets:
+            tokens, ts, _ = self._state.get(bucket.key, (bucket.capacity, now, now))
+            tokens = min(bucket.capacity, tokens + max(0.0, now - ts) * bucket.rate)
+            levels.append(tokens)
+            if tokens < cost:
+                wait = max(wait, (cost - tokens) / bucket.rate)
+        allowed = wait == 0
+        for bucket, tokens in zip(buckets, levels):
+            self._state[bucket.key] = (tokens - cost if allowed else tokens, now, now + bucket.capacity / bucket.rate + 1)
+        return Decision(allowed=allowed, retry_after=wait)
+
+
+class RedisBackend:
+    """Buckets stored in Redis and updated atomically by a Lua script using the server clock"""
+
+    def __init__(self, url: str, prefix: str = "pjeseza:ratelimit:"):
+        self.client = aioredis.from_url(url)
+        self.prefix = prefix
+        self._script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def consume(self, buckets: List[Bucket], cost: float = 1) -> Decision:
+        keys = [self.prefix + bucket.key for bucket in buckets]
+        args: List[float] = []
+        for bucket in buckets:
+            args.extend([bucket.rate, bucket.capacity])
+        args.append(cost)
+        allowed, wait = await self._script(keys=keys, args=args)
+        return Decision(allowed=bool(int(allowed)), retry_after=float(wait))
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+class RateLimiter:
+    """Admission control for expensive endpoints; falls back to local buckets if Redis is unavailable"""
+
+    def __init__(self, redis_url: Optional[str] = None):
+        self.memory = MemoryBackend()
+        self.redis: Optional[RedisBackend] = None
+        if redis_url:
+            if aioredis is None:
+                logger.warning("REDIS_URL is set but the redis package is not installed, using in-memory rate limits")
+            else:
+                self.redis = RedisBackend(redis_url)
+
+    async def consume(self, buckets: List[Bucket], cost: float = 1) -> Decision:
+        if self.redis is not None:
+            try:
+                return await self.redis.consume(buckets, cost)
+            except Exception as e:
+                logger.warning("Redis rate limiting failed, using in-memory buckets: %s", e)
+        return await self.memory.consume(buckets, cost)
+
+    async def close(self) -> None:
+        if self.redis is not None:
+            await self.redis.close()
+
+
+def per_minute(key: str, requests_per_minute: float, burst: float) -> Bucket:
+    return Bucket(key=key, rate=requests_per_minute / 60.0, capacity=burst)
@@ -0,0 +1,188 @@
+"""Fair-share job scheduling across users, with cheapest-first ordering within each user
+
+Jobs carry an estimated cost in worker-seconds. Users are served by start-time fair
+queuing: each user has a virtual "pass" that advances by cost / weight whenever one of
+their jobs is claimed, and the backlogged user with the lowest pass goes next. A user
+returning from idle starts at the current virtual time instead of cashing in the time
+they were away. Users already at their running-job cap are skipped; the cap itself is
+enforced by JobQueue, which leases a job into one of its user's numbered slots.
+"""
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+# Worker-seconds per second of clip, on top of cutting it
+FEATURE_COST = {
+    "auto_clipping": 0.1,
+    "face_tracking": 0.5,
+    "auto_captions": 0.3,
+    "translation": 0.1,
+    "hook_titles": 0.05,
+    "b_roll": 0.3,
+    "background_removal": 1.5,
+    "voice_enhancement": 0.4,
+}
+CUT_COST = 0.2
+JOB_OVERHEAD = 5.0
+DEFAULT_COST = 30.0
+SYSTEM_USER = "_system"
+
+
+def clip_seconds(duration: float, start: float, end: Optional[float]) -> float:
+    return max(1.0, (end or duration or start + 60) - start)
+
+
+def estimate_clip_cost(duration: float, start: float, end: Optional[float], features: Iterable[str]) -> float:
+    """Expected worker-seconds to render a clip"""
+    seconds = clip_seconds(duration, start, end)
+    per_second = CUT_COST + sum(FEATURE_COST.get(feature, 0.2) for feature in features)
+    return round(JOB_OVERHEAD + seconds * per_second, 1)
+
+
+def estimate_hls_cost(duration: float, start: float, end: Optional[float]) -> float:
+    # Every rendition is encoded from one decode, at roughly real time in total
+    return round(JOB_OVERHEAD + clip_seconds(duration, start, end) * 1.0, 1)
+
+
+def estimate_preview_cost(duration: float) -> float:
+    return round(JOB_OVERHEAD + (duration or 600) * 0.5, 1)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+
+
+class FairShareScheduler:
+    """Picks the next queued job for JobQueue.claim; `scheduler` holds per-user passes and the virtual clock"""
+
+    def __init__(self, db, max_running_per_user: int = 2, counts_ttl: float = 1.0):
+        self.state = db.scheduler
+        self.max_running_per_user = max_running_per_user
+        # Running counts are shared by every worker slot polling within this many seconds
+        self.counts_ttl = counts_ttl
+        self._counts = (float("-inf"), {})
+
+    async def pick(self, jobs, now: datetime, exclude: Iterable[str] = ()) -> Optional[dict]:
+        """The job to claim next as {"job_id", "user", "start", "cost"}, or None when nothing is runnable
+
+        Users in exclude are skipped, e.g. those found at their cap since the running counts were read.
+        """
+        heads = {}
+        # Cheapest runnable job of each user; ties go to the oldest
+        async for row in jobs.aggregate([
+            {"$match": {"status": "queued", "available_at": {"$lte": now}}},
+            {"$sort": {"cost": 1, "created_at": 1}},
+            {"$group": {"_id": "$user_id", "job_id": {"$first": "$_id"}, "cost": {"$first": "$cost"},
+                        "created_at": {"$first": "$created_at"}}},
+        ]):
+            heads[row["_id"] or SYSTEM_USER] = row
+        if not heads:
+            return None
+
+        cached_at = self._counts[0]
+        eligible = self.eligible(heads, await self.cached_running_counts(jobs, now), exclude)
+        if not eligible and self._counts[0] == cached_at:
+            # Jobs may have finished since the cached counts were read
+            eligible = self.eligible(heads, await self.cached_running_counts(jobs, now, refresh=True), exclude)
+        if not eligible:
+            return None
+
+        clock = await self.virtual_time()
+        passes = await self.passes(eligible)
+        user = min(eligible, key=lambda u: (max(passes.get(u, 0.0), clock), eligible[u]["created_at"]))
+        head = eligible[user]
+        return {
+            "job_id": head["job_id"],
+            "user": user,
+            "start": max(passes.get(user, 0.0), clock),
+            "cost": head.get("cost") or DEFAULT_COST,
+        }
+
+    def eligible(self, heads: Dict[str, dict], running: Dict[str, int], exclude: Iterable[str]) -> Dict[str, dict]:
+        return {
+            user: row for user, row in heads.items()
+            if user not in exclude and (user == SYSTEM_USER or running.get(user, 0) < self.max_running_per_user)
+        }
+
+    async def charge(self, choice: dict) -> None:
+        """Advance the chosen user's pass by the job's weighted cost, and the clock to its start"""
+        doc = await self.state.find_one({"_id": f"user:{choice['user']}"}, {"weight": 1}) or {}
+        weight = doc.get("weight") or 1.0
+        await self.state.update_one(
+            {"_id": f"user:{choice['user']}"},
+            {"$set": {"pass": choice["start"] + choice["cost"] / weight, "last_claim_at": datetime.utcnow()}},
+            upsert=True,
+        )
+        await self.state.update_one({"_id": "clock"}, {"$max": {"virtual_time": choice["start"]}}, upsert=True)
+
+    async def virtual_time(self) -> float:
+        doc = await self.state.find_one({"_id": "clock"})
+        return (doc or {}).get("virtual_time", 0.0)
+
+    async def passes(self, users: Iterable[str]) -> Dict[str, float]:
+        ids = [f"user:{user}" for user in users]
+        return {doc["_id"][5:]: doc.get("pass", 0.0) async for doc in self.state.find({"_id": {"$in": ids}})}
+
+    async def cached_running_counts(self, jobs, now: datetime, refresh: bool = False) -> Dict[str, int]:
+        """running_counts, at most counts_ttl seconds old; only a hint, the slots are what enforce the cap"""
+        fetched, counts = self._counts
+        if refresh or time.monotonic() - fetched > self.counts_ttl:
+            counts = await self.running_counts(jobs, now)
+            self._counts = (time.monotonic(), counts)
+        return counts
+
+    def note_claimed(self, user: str) -> None:
+        """Count a job this process just leased in the cached running counts"""
+        counts = self._counts[1]
+        counts[user] = counts.get(user, 0) + 1
+
+    async def running_counts(self, jobs, now: datetime) -> Dict[str, int]:
+        counts = {}
+        async for row in jobs.aggregate([
+            {"$match": {"status": "running", "lease_expires_at": {"$gte": now}}},
+            {"$group": {"_id": "$user_id", "count": {"$sum": 1}}},
+        ]):
+            counts[row["_id"] or SYSTEM_USER] = row["count"]
+        return counts
+
+    async def stats(self, jobs, now: datetime, sample: int = 500) -> dict:
+        """Backlog per user, queue wait percentiles and how estimated cost compares with actual run time"""
+        queued = {}
+        async for row in jobs.aggregate([
+            {"$match": {"status": "queued"}},
+            {"$group": {"_id": "$user_id", "count": {"$sum": 1}, "cost": {"$sum": "$cost"}}},
+        ]):
+            queued[row["_id"] or SYSTEM_USER] = {"queued": row["count"], "queued_cost": round(row["cost"] or 0, 1)}
+        running = await self.running_counts(jobs, now)
+        passes = await self.passes(set(queued) | set(running))
+        users = {
+            user: {**queued.get(user, {"queued": 0, "queued_cost": 0}), "running": running.get(user, 0),
+                   "pass": round(passes.get(user, 0.0), 1)}
+            for user in set(queued) | set(running)
+        }
+
+        waits, ratios = [], {}
+        recent = jobs.find(
+            {"status": "completed", "run_seconds": {"$ne": None}},
+            {"kind": 1, "cost": 1, "run_seconds": 1, "queue_wait_seconds": 1},
+        ).sort("completed_at", -1).limit(sample)
+        async for job in recent:
+            if job.get("queue_wait_seconds") is not None:
+                waits.append(job["queue_wait_seconds"])
+            if job.get("cost"):
+                ratios.setdefault(job["kind"], []).append(job["run_seconds"] / job["cost"])
+
+        return {
+            "virtual_time": round(await self.virtual_time(), 1),
+            "max_running_per_user": self.max_running_per_user,
+            "users": users,
+            "queue_wait_seconds": {"p50": percentile(waits, 0.5), "p95": percentile(waits, 0.95), "samples": len(waits)},
+            # Actual run seconds per estimated second; far from 1 means the cost model needs retuning
+            "actual_to_estimated_cost": {
+                kind: {"p50": percentile(values, 0.5), "p95": percentile(values, 0.95), "samples": len(values)}
+                for kind, values in ratios.items()
+            },
+        }
@@ -0,0 +1,267 @@
+"""Video script generation: pluggable model providers, a prompt cache and coalescing of identical prompts"""
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+LANGUAGE_NAMES = {
+    "en": "English",
+    "sq": "Albanian",
+    "es": "Spanish",
+    "fr": "French",
+    "de": "German",
+    "it": "Italian",
+}
+
+STUB_SCRIPTS = {
+    "en": "Here's an engaging script about {topic}: Start with a hook, provide valuable content, and end with a strong call to action.",
+    "sq": "Këtu është një skript tërheqës për {topic}: Filloni me një hok, ofroni përmbajtje të vlefshme dhe përfundoni me një thirrje të fortë për veprim."
+}
+
+
+def normalize_topic(topic: str) -> str:
+    return re.sub(r"\s+", " ", topic).strip().lower()
+
+
+def build_messages(topic: str, language: str, params: dict) -> List[dict]:
+    language_name = LANGUAGE_NAMES.get(language, language)
+    duration = params.get("duration_seconds", 45)
+    tone = params.get("tone", "energetic")
+    platform = params.get("platform", "short-form video")
+    return [
+        {
+            "role": "system",
+            "content": (
+                "You write scripts for short-form video creators. Open with a hook in the first "
+                "sentence, deliver one clear idea, and close with a call to action. Return only the "
+                "spoken script, no stage directions or headings."
+            ),
+        },
+        {
+            "role": "user",
+            "content": (
+                f"Write a {tone} {platform} script of about {duration} seconds in {language_name} "
+                f"about: {topic}"
+            ),
+        },
+    ]
+
+
+# Providers
+
+
+class StubProvider:
+    """Deterministic local provider for tests and deployments without a model key"""
+
+    name = "stub"
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    async def stream(self, messages: List[dict], topic: str, language: str, params: dict) -> AsyncIterator[str]:
+        template = STUB_SCRIPTS.get(language, STUB_SCRIPTS["en"])
+        words = template.format(topic=topic).split(" ")
+        for index, word in enumerate(words):
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield word if index == 0 else " " + word
+
+
+class OpenAIProvider:
+    name = "openai"
+
+    def __init__(self, api_key: str, model: str = "gpt-4o-mini", temperature: float = 0.7):
+        import openai
+
+        self.client = openai.AsyncOpenAI(api_key=api_key)
+        self.model = model
+        self.temperature = temperature
+        self.name = f"openai:{model}"
+
+    async def stream(self, messages: List[dict], topic: str, language: str, params: dict) -> AsyncIterator[str]:
+        response = await self.client.chat.completions.create(
+            model=self.model, messages=messages, temperature=self.temperature, stream=True
+        )
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class LiteLLMProvider:
+    """Any model litellm can route to, e.g. `anthropic/...` or `ollama/...`"""
+
+    def __init__(self, model: str, temperature: float = 0.7):
+        import litellm
+
+        self.litellm = litellm
+        self.model = model
+        self.temperature = temperature
+        self.name = f"litellm:{model}"
+
+    async def stream(self, messages: List[dict], topic: str, language: str, params: dict) -> AsyncIterator[str]:
+        response = await self.litellm.acompletion(
+            model=self.model, messages=messages, temperature=self.temperature, stream=True
+        )
+        async for chunk in response:
+            content = chunk.choices[0].delta.content if chunk.choices else None
+            if content:
+                yield content
+
+
+def build_provider(kind: str, openai_api_key: str = "", model: str = ""):
+    """Provider from configuration; falls back to the stub when the chosen backend is unusable"""
+    try:
+        if kind == "openai" and openai_api_key:
+            return OpenAIProvider(openai_api_key, model or "gpt-4o-mini")
+        if kind == "litellm" and model:
+            return LiteLLMProvider(model)
+    except ImportError as e:
+        logger.warning("Script provider %s unavailable (%s), using the stub provider", kind, e)
+    return StubProvider()
+
+
+# Generation
+
+
+class _Inflight:
+    """A running generation that any number of identical requests read from"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Condition()
+
+    async def append(self, chunk: str) -> None:
+        async with self.changed:
+            self.chunks.append(chunk)
+            self.changed.notify_all()
+
+    async def finish(self, error: Optional[BaseException] = None) -> None:
+        async with self.changed:
+            self.done = True
+            self.error = error
+            self.changed.notify_all()
+
+    async def follow(self) -> AsyncIterator[str]:
+        index = 0
+        while True:
+            async with self.changed:
+                while index >= len(self.chunks) and not self.done:
+                    await self.changed.wait()
+                pending = self.chunks[index:]
+                finished, error = self.done, self.error
+            for chunk in pending:
+                yield chunk
+            index += len(pending)
+            if finished and index >= len(self.chunks):
+                if error:
+                    raise error
+                return
+
+
+class ScriptGenerator:
+    """Streams scripts from a provider.
+
+    Completions are cached by a hash of the normalized topic, language, parameters and
+    provider, in a local LRU backed by the `script_cache` collection so other nodes share
+    hits. Identical prompts arriving while one is being generated follow that generation
+    instead of calling the model again.
+    """
+
+    def __init__(self, provider, db=None, cache_size: int = 512, cache_ttl_seconds: int = 7 * 24 * 3600):
+        self.provider = provider
+        self.cache_collection = db.script_cache if db is not None else None
+        self.cache_size = cache_size
+        self.cache_ttl = timedelta(seconds=cache_ttl_seconds)
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._inflight: Dict[str, _Inflight] = {}
+        self._tasks = set()
+
+    async def ensure_indexes(self) -> None:
+        if self.cache_collection is not None:
+            await self.cache_collection.create_index("expires_at", expireAfterSeconds=0)
+
+    def cache_key(self, topic: str, language: str, params: dict) -> str:
+        parts = [normalize_topic(topic), language.lower(), params, self.provider.name]
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+    async def _cached(self, key: str) -> Optional[str]:
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        if self.cache_collection is None:
+            return None
+        doc = await self.cache_collection.find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}})
+        if doc:
+            self._remember(key, doc["script"])
+            return doc["script"]
+        return None
+
+    def _remember(self, key: str, script: str) -> None:
+        self._cache[key] = script
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _store(self, key: str, script: str) -> None:
+        self._remember(key, script)
+        if self.cache_collection is not None:
+            now = datetime.utcnow()
+            await self.cache_collection.replace_one(
+                {"_id": key},
+                {"script": script, "provider": self.provider.name, "created_at": now, "expires_at": now + self.cache_ttl},
+                upsert=True,
+            )
+
+    async def _produce(self, key: str, inflight: _Inflight, topic: str, language: str, params: dict) -> None:
+        try:
+            messages = build_messages(topic, language, params)
+            async for chunk in self.provider.stream(messages, topic, language, params):
+                await inflight.append(chunk)
+            await self._store(key, "".join(inflight.chunks))
+            await inflight.finish()
+        except Exception as e:
+            logger.exception("Script generation failed")
+            await inflight.finish(e)
+        finally:
+            self._inflight.pop(key, None)
+
+    async def stream(self, topic: str, language: str, params: Optional[dict] = None) -> AsyncIterator[dict]:
+        """Yield {"text": chunk} items followed by a final {"script", "cached", "coalesced"} item"""
+        params = params or {}
+        key = self.cache_key(topic, language, params)
+
+        cached = await self._cached(key)
+        if cached is not None:
+            yield {"text": cached}
+            yield {"script": cached, "cached": True, "coalesced": False}
+            return
+
+        inflight = self._inflight.get(key)
+        coalesced = inflight is not None
+        if inflight is None:
+            inflight = self._inflight[key] = _Inflight()
+            # The generation runs on its own, so a client disconnecting does not cancel it for the others
+            task = asyncio.create_task(self._produce(key, inflight, topic, language, params))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        parts = []
+        async for chunk in inflight.follow():
+            parts.append(chunk)
+            yield {"text": chunk}
+        yield {"script": "".join(parts), "cached": False, "coalesced": coalesced}
+
+    async def generate(self, topic: str, language: str, params: Optional[dict] = None) -> dict:
+        result = {}
+        async for item in self.stream(topic, language, params):
+            if "script" in item:
+                result = item
+        return result
@@ -1,28 +1,63 @@
-from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 import os
+import hashlib
 import uuid
 import validators
 import bleach
-import yt_dlp
 import cv2
 import assemblyai as aai
 import openai
-from typing import Optional, List
+from typing import Dict, Optional, List
 import asyncio
 import subprocess
 import json
+import re
+import sys
 from slugify import slugify
+import numpy as np
+
+# Sibling modules resolve whether the app runs as `server:app` or `backend.server:app`
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from media_janitor import MediaJanitor
+from rate_limiter import RateLimiter, per_minute
+from job_queue import JobQueue, Worker
+from scheduling import FairShareScheduler, estimate_clip_cost, estimate_hls_cost, estimate_preview_cost
+from cancellation import Cancelled, CancelToken, DeadlineExceeded, bound, stage
+import cancellation
+from clip_pipeline import ClipRenderer
+from artifact_store import ArtifactStore
+from analysis_pool import AnalysisPool
+from progress_events import ProgressEvents
+from idempotency import IdempotencyConflict, IdempotencyStore, clip_fingerprint
+from video_ids import video_key
+from video_metadata import VideoMetadataStore
+from batch_info import BatchInfoExtractor, summarize
+from auth_tokens import RevocationFilter, TokenIssuer
+from script_generation import ScriptGenerator, build_provider
+from hook_titles import HookTitleGenerator, top_keywords
+from transcripts import TranscriptStore
+from highlights import DEFAULT_WEIGHTS, audio_energy, scene_cuts, suggest_highlights
+from uploads import UploadError, UploadStore
+from previews import PreviewBuilder
+from smart_cut import smart_cut
+from stream_urls import StreamResolver
+from silence import SilenceDetector, cuts_anything, jump_cut_filters, keep_segments, stream_silence, trim_bounds
 
 # Initialize FastAPI app
-app = FastAPI(title="Pjesëza API", description="AI-Powered Video Editing Platform")
+app = FastAPI(
+    title="Pjesëza API",
+    description="AI-Powered Video Editing Platform",
+    default_response_class=ORJSONResponse,
+)
 
 # CORS middleware
 app.add_middleware(
@@ -37,8 +72,12 @@ app.add_middleware(
 security = HTTPBearer()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 SECRET_KEY = "pjeseza-super-secret-key-2025"
+# Signs the names of media served without auth headers, such as HLS packages
+MEDIA_URL_SECRET = os.getenv("MEDIA_URL_SECRET", SECRET_KEY)
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "5"))
 
 # Database configuration
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
@@ -55,19 +94,230 @@ if ASSEMBLYAI_API_KEY:
 if OPENAI_API_KEY:
     openai.api_key = OPENAI_API_KEY
 
+# Script generation provider: "openai", "litellm" (with SCRIPT_MODEL) or "stub"
+SCRIPT_PROVIDER = os.getenv("SCRIPT_PROVIDER", "openai" if OPENAI_API_KEY else "stub")
+SCRIPT_MODEL = os.getenv("SCRIPT_MODEL", "")
+# Hook titles share the script provider; one model request covers up to HOOK_TITLE_BATCH_SIZE clips
+HOOK_TITLE_CANDIDATES = int(os.getenv("HOOK_TITLE_CANDIDATES", "3"))
+HOOK_TITLE_BATCH_SIZE = int(os.getenv("HOOK_TITLE_BATCH_SIZE", "20"))
+
+# Scratch media configuration
+SCRATCH_DIR = os.getenv("SCRATCH_DIR", "/tmp/pjeseza-scratch")
+DISK_HIGH_WATER = float(os.getenv("DISK_HIGH_WATER", "0.90"))
+DISK_LOW_WATER = float(os.getenv("DISK_LOW_WATER", "0.80"))
+SCRATCH_MAX_AGE_SECONDS = int(os.getenv("SCRATCH_MAX_AGE_SECONDS", str(6 * 3600)))
+SCRATCH_SWEEP_INTERVAL_SECONDS = int(os.getenv("SCRATCH_SWEEP_INTERVAL_SECONDS", "60"))
+
+janitor = MediaJanitor(
+    SCRATCH_DIR,
+    high_water=DISK_HIGH_WATER,
+    low_water=DISK_LOW_WATER,
+    max_age=SCRATCH_MAX_AGE_SECONDS,
+    interval=SCRATCH_SWEEP_INTERVAL_SECONDS,
+)
+
+# Frame analysis process pool; 0 workers keeps frame-based features on their mock results
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "0"))
+ANALYSIS_MAX_TASKS_PER_WORKER = int(os.getenv("ANALYSIS_MAX_TASKS_PER_WORKER", "200"))
+ANALYSIS_MEMORY_LIMIT_MB = int(os.getenv("ANALYSIS_MEMORY_LIMIT_MB", "2048"))
+
+# Workers are spawned on the first analysis, not at import
+analysis_pool = AnalysisPool(
+    ANALYSIS_WORKERS,
+    max_tasks_per_child=ANALYSIS_MAX_TASKS_PER_WORKER,
+    memory_limit_mb=ANALYSIS_MEMORY_LIMIT_MB,
+) if ANALYSIS_WORKERS else None
+
+# Rate limiting configuration (requests per minute, burst) per user and across all users
+REDIS_URL = os.getenv("REDIS_URL", "")
+RATE_LIMITS = {
+    "video_info": {
+        "user": (float(os.getenv("VIDEO_INFO_USER_PER_MINUTE", "30")), float(os.getenv("VIDEO_INFO_USER_BURST", "10"))),
+        "global": (float(os.getenv("VIDEO_INFO_GLOBAL_PER_MINUTE", "600")), float(os.getenv("VIDEO_INFO_GLOBAL_BURST", "100"))),
+    },
+    "video_info_batch": {
+        "user": (float(os.getenv("VIDEO_INFO_BATCH_USER_PER_MINUTE", "2")), float(os.getenv("VIDEO_INFO_BATCH_USER_BURST", "2"))),
+        "global": (float(os.getenv("VIDEO_INFO_BATCH_GLOBAL_PER_MINUTE", "30")), float(os.getenv("VIDEO_INFO_BATCH_GLOBAL_BURST", "10"))),
+    },
+    "video_clip": {
+        "user": (float(os.getenv("VIDEO_CLIP_USER_PER_MINUTE", "6")), float(os.getenv("VIDEO_CLIP_USER_BURST", "3"))),
+        "global": (float(os.getenv("VIDEO_CLIP_GLOBAL_PER_MINUTE", "120")), float(os.getenv("VIDEO_CLIP_GLOBAL_BURST", "30"))),
+    },
+    "silence_analysis": {
+        "user": (float(os.getenv("SILENCE_USER_PER_MINUTE", "6")), float(os.getenv("SILENCE_USER_BURST", "3"))),
+        "global": (float(os.getenv("SILENCE_GLOBAL_PER_MINUTE", "120")), float(os.getenv("SILENCE_GLOBAL_BURST", "30"))),
+    },
+    "highlights": {
+        "user": (float(os.getenv("HIGHLIGHTS_USER_PER_MINUTE", "4")), float(os.getenv("HIGHLIGHTS_USER_BURST", "2"))),
+        "global": (float(os.getenv("HIGHLIGHTS_GLOBAL_PER_MINUTE", "60")), float(os.getenv("HIGHLIGHTS_GLOBAL_BURST", "15"))),
+    },
+    "ai_script": {
+        "user": (float(os.getenv("AI_SCRIPT_USER_PER_MINUTE", "10")), float(os.getenv("AI_SCRIPT_USER_BURST", "5"))),
+        "global": (float(os.getenv("AI_SCRIPT_GLOBAL_PER_MINUTE", "300")), float(os.getenv("AI_SCRIPT_GLOBAL_BURST", "50"))),
+    },
+}
+
+rate_limiter = RateLimiter(REDIS_URL or None)
+
+# Job queue configuration; set EMBEDDED_WORKER=false on API nodes when dedicated render nodes run worker.py
+CLIP_OUTPUT_DIR = os.getenv("CLIP_OUTPUT_DIR", "/tmp/pjeseza-clips")
+# Keyframes probed around earlier cuts of remote sources, per video and format
+KEYFRAME_CACHE_DIR = os.getenv("KEYFRAME_CACHE_DIR", os.path.join(CLIP_OUTPUT_DIR, "keyframes"))
+EMBEDDED_WORKER = os.getenv("EMBEDDED_WORKER", "true").lower() == "true"
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "2"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+# Completed and cancelled jobs, and dead-lettered ones, are deleted after these many days
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+DEAD_JOB_RETENTION_DAYS = float(os.getenv("DEAD_JOB_RETENTION_DAYS", "30"))
+# Wall-clock limits; past them a job's ffmpeg and yt-dlp processes are killed and the attempt fails
+JOB_DEADLINES = {
+    "render_clip": float(os.getenv("RENDER_DEADLINE_SECONDS", "1800")),
+    "package_hls": float(os.getenv("HLS_DEADLINE_SECONDS", "3600")),
+    "generate_previews": float(os.getenv("PREVIEW_DEADLINE_SECONDS", "3600")),
+}
+# Fair share between users: at most this many of one user's jobs run at once, cheapest first
+USER_MAX_RUNNING_JOBS = int(os.getenv("USER_MAX_RUNNING_JOBS", "2"))
+DOWNLOAD_TIMEOUT_SECONDS = float(os.getenv("DOWNLOAD_TIMEOUT_SECONDS", "900"))
+# Media work done inside a request stops when the client goes away or this runs out
+REQUEST_MEDIA_TIMEOUT_SECONDS = float(os.getenv("REQUEST_MEDIA_TIMEOUT_SECONDS", "600"))
+
+# Resolved media URLs are reused until they would expire within one download timeout
+STREAM_URL_EXTRACTORS = int(os.getenv("STREAM_URL_EXTRACTORS", "2"))
+STREAM_URL_KEEP_WARM_SECONDS = float(os.getenv("STREAM_URL_KEEP_WARM_SECONDS", "3600"))
+STREAM_URL_REFRESH_INTERVAL_SECONDS = float(os.getenv("STREAM_URL_REFRESH_INTERVAL_SECONDS", "60"))
+
+stream_resolver = StreamResolver(
+    instances=STREAM_URL_EXTRACTORS,
+    min_validity=DOWNLOAD_TIMEOUT_SECONDS,
+    keep_warm=STREAM_URL_KEEP_WARM_SECONDS,
+    interval=STREAM_URL_REFRESH_INTERVAL_SECONDS,
+)
+
+# Batch info: extraction threads shared by all batches, and videos per batch
+BATCH_INFO_CONCURRENCY = int(os.getenv("BATCH_INFO_CONCURRENCY", "4"))
+BATCH_INFO_MAX_ENTRIES = int(os.getenv("BATCH_INFO_MAX_ENTRIES", "500"))
+
+# Resumable uploads of local video files
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "/tmp/pjeseza-uploads")
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 ** 3)))
+UPLOAD_CHUNK_MAX_BYTES = int(os.getenv("UPLOAD_CHUNK_MAX_BYTES", str(64 * 1024 ** 2)))
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+
+# Duplicate clip requests: explicit Idempotency-Key reuse window and the implicit fingerprint window
+IDEMPOTENCY_KEY_WINDOW_SECONDS = int(os.getenv("IDEMPOTENCY_KEY_WINDOW_SECONDS", str(24 * 3600)))
+DUPLICATE_WINDOW_SECONDS = int(os.getenv("DUPLICATE_WINDOW_SECONDS", "600"))
+# A reservation without a clip belongs to a request that may still be looking the video up, for up to its media deadline
+DUPLICATE_PENDING_SECONDS = REQUEST_MEDIA_TIMEOUT_SECONDS + 30
+
 # MongoDB client
 mongo_client = None
 db = None
+job_queue = None
+worker = None
+progress_events = None
+idempotency = None
+clip_renderer = None
+video_metadata = None
+batch_info = None
+token_issuer = None
+revocation_filter = None
+script_generator = None
+transcripts = None
+uploads = None
+preview_builder = None
+
+def build_renderer(database, events: ProgressEvents) -> ClipRenderer:
+    hook_titles = HookTitleGenerator(
+        build_provider(SCRIPT_PROVIDER, OPENAI_API_KEY, SCRIPT_MODEL),
+        database,
+        count=HOOK_TITLE_CANDIDATES,
+        batch_size=HOOK_TITLE_BATCH_SIZE,
+    )
+    return ClipRenderer(
+        database, janitor, events, ArtifactStore(database, CLIP_OUTPUT_DIR), hook_titles,
+        fetch_source=download_video_segment, analysis=analysis_pool, url_secret=MEDIA_URL_SECRET,
+    )
+
+def build_preview_builder(database) -> PreviewBuilder:
+    return PreviewBuilder(database, CLIP_OUTPUT_DIR, janitor, download_video_segment)
+
+def build_worker(queue: JobQueue, renderer: ClipRenderer) -> Worker:
+    """Wire the clip pipeline handlers to a queue worker"""
+    previews = build_preview_builder(renderer.db)
+    
+    async def on_dead(job: dict, error: str) -> None:
+        if job["kind"] == "generate_previews":
+            await previews.mark_failed(job, error)
+        else:
+            await renderer.mark_failed(job, error)
+    
+    return Worker(
+        queue,
+        {"render_clip": renderer.render, "package_hls": renderer.package_hls, "generate_previews": previews.build},
+        concurrency=WORKER_CONCURRENCY,
+        can_claim=janitor.admission_open,
+        on_dead=on_dead,
+        deadlines=JOB_DEADLINES,
+        # Face tracking batches queued on the analysis pool are dropped with the clip's job
+        on_cancel=analysis_pool.cancel if analysis_pool else None,
+    )
+
+def build_job_queue(database) -> JobQueue:
+    return JobQueue(
+        database,
+        lease_seconds=JOB_LEASE_SECONDS,
+        max_attempts=JOB_MAX_ATTEMPTS,
+        retention_seconds=JOB_RETENTION_DAYS * 86400,
+        dead_letter_retention_seconds=DEAD_JOB_RETENTION_DAYS * 86400,
+        scheduler=FairShareScheduler(database, max_running_per_user=USER_MAX_RUNNING_JOBS),
+    )
 
 @app.on_event("startup")
 async def startup_db_client():
-    global mongo_client, db
+    global mongo_client, db, job_queue, worker, progress_events, idempotency, clip_renderer, video_metadata
+    global token_issuer, revocation_filter, script_generator, transcripts, uploads
+    global preview_builder, batch_info
     mongo_client = AsyncIOMotorClient(MONGO_URL)
     db = mongo_client[DB_NAME]
     
     # Create indexes
     await db.users.create_index("email", unique=True)
     await db.users.create_index("username", unique=True)
+    await db.clips.create_index([("user_id", 1), ("created_at", -1)])
+    
+    token_issuer = TokenIssuer(
+        db,
+        SECRET_KEY,
+        ALGORITHM,
+        access_ttl=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+        refresh_ttl=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    )
+    await token_issuer.ensure_indexes()
+    revocation_filter = RevocationFilter(
+        db, ttl=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES), sync_interval=REVOCATION_SYNC_SECONDS
+    )
+    await revocation_filter.ensure_indexes()
+    await revocation_filter.start()
+    
+    script_generator = ScriptGenerator(build_provider(SCRIPT_PROVIDER, OPENAI_API_KEY, SCRIPT_MODEL), db)
+    await script_generator.ensure_indexes()
+    
+    video_metadata = VideoMetadataStore(db)
+    await video_metadata.ensure_indexes()
+    batch_info = BatchInfoExtractor(
+        video_metadata, get_video_info, concurrency=BATCH_INFO_CONCURRENCY, max_entries=BATCH_INFO_MAX_ENTRIES
+    )
+    transcripts = TranscriptStore(db)
+    await transcripts.ensure_indexes()
+    uploads = UploadStore(
+        db,
+        UPLOAD_DIR,
+        max_size=UPLOAD_MAX_BYTES,
+        max_chunk=UPLOAD_CHUNK_MAX_BYTES,
+        session_ttl=timedelta(hours=UPLOAD_SESSION_TTL_HOURS),
+    )
+    await uploads.ensure_indexes()
     
     # Create default admin user
     admin_exists = await db.users.find_one({"role": "admin"})
@@ -84,8 +334,40 @@ async def startup_db_client():
         }
         await db.users.insert_one(admin_user)
 
+    # Clean up scratch files left by crashed workers and keep watching disk usage
+    janitor.start()
+    stream_resolver.start()
+    
+    job_queue = build_job_queue(db)
+    await job_queue.ensure_indexes()
+    progress_events = ProgressEvents(db)
+    await progress_events.ensure_indexes()
+    idempotency = IdempotencyStore(
+        db,
+        key_window_seconds=IDEMPOTENCY_KEY_WINDOW_SECONDS,
+        # Never shorter than a lookup can take, or a slow first request would lose its reservation mid-flight
+        fingerprint_window_seconds=max(DUPLICATE_WINDOW_SECONDS, int(DUPLICATE_PENDING_SECONDS)),
+    )
+    await idempotency.ensure_indexes()
+    clip_renderer = build_renderer(db, progress_events)
+    await clip_renderer.artifacts.ensure_indexes()
+    await clip_renderer.hook_titles.ensure_indexes()
+    preview_builder = build_preview_builder(db)
+    if EMBEDDED_WORKER:
+        worker = build_worker(job_queue, clip_renderer)
+        worker.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    if worker:
+        await worker.stop()
+    if revocation_filter:
+        await revocation_filter.stop()
+    await janitor.stop()
+    await stream_resolver.stop()
+    if analysis_pool:
+        analysis_pool.close()
+    await rate_limiter.close()
     if mongo_client:
         mongo_client.close()
 
@@ -102,86 +384,24 @@ class UserLogin(BaseModel):
 
 class Token(BaseModel):
     access_token: str
+    refresh_token: Optional[str] = None
     token_type: str
+    expires_in: Optional[int] = None
     user: dict
 
-# AI Feature Processing Functions
-async def process_ai_feature(feature_id: str, youtube_url: str, user: dict) -> dict:
-    """Process AI feature application"""
-    feature_processors = {
-        'auto_clipping': {
-            'name': 'Auto Clipping',
-            'result': 'Applied viral moment detection algorithm',
-            'confidence': 0.85
-        },
-        'face_tracking': {
-            'name': 'Auto Face Tracking',
-            'result': 'Face detection and tracking applied',
-            'confidence': 0.92
-        },
-        'auto_captions': {
-            'name': 'Auto Captioning',
-            'result': 'Generated captions with 95% accuracy',
-            'confidence': 0.95
-        },
-        'translation': {
-            'name': 'Caption Translation',
-            'result': 'Translated to selected languages',
-            'confidence': 0.88
-        },
-        'hook_titles': {
-            'name': 'Auto Hook Titles',
-            'result': 'Generated compelling hook title',
-            'confidence': 0.78
-        },
-        'b_roll': {
-            'name': 'Auto B-roll',
-            'result': 'Added relevant background footage',
-            'confidence': 0.82
-        },
-        'background_removal': {
-            'name': 'Background Remover',
-            'result': 'Background removed successfully',
-            'confidence': 0.90
-        },
-        'voice_enhancement': {
-            'name': 'Voice Enhancement',
-            'result': 'Audio quality improved',
-            'confidence': 0.87
-        }
-    }
-    
-    processor = feature_processors.get(feature_id, {
-        'name': feature_id,
-        'result': 'Feature applied',
-        'confidence': 0.80
-    })
-    
-    return {
-        'feature_id': feature_id,
-        'name': processor['name'],
-        'result': processor['result'],
-        'confidence': processor['confidence'],
-        'processed_at': datetime.utcnow()
-    }
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
-def create_mock_video_file(clip_id: str, clip_data: dict) -> bytes:
-    """Create a mock video file for demonstration"""
-    # This creates a simple text file that represents a video file
-    # In production, this would create an actual video file
-    mock_content = f"""
-# Pjesëza Video Clip
-Clip ID: {clip_id}
-Name: {clip_data['clip_name']}
-Source: {clip_data['youtube_url']}
-Duration: {clip_data['start_time']}s - {clip_data['end_time']}s
-Applied Features: {', '.join(clip_data.get('selected_features', []))}
-Created: {clip_data['created_at']}
-
-This is a mock video file for demonstration purposes.
-In production, this would be the actual processed video clip.
-"""
-    return mock_content.encode('utf-8')
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
+class UserStatusUpdate(BaseModel):
+    is_active: bool
+
+class BatchInfoRequest(BaseModel):
+    urls: List[str] = Field(..., min_length=1, max_length=100)
+    details: bool = True
+    limit: Optional[int] = Field(None, ge=1)
 
 class VideoClipRequest(BaseModel):
     youtube_url: str
@@ -199,7 +419,80 @@ class User(BaseModel):
     created_at: datetime
     language_preference: str
 
+# Response models for hot endpoints; see typed_response
+class CurrentUser(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: str
+    username: str
+    email: str
+    role: str
+    language_preference: str
+    created_at: datetime
+
+class AdminUser(BaseModel):
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
+    
+    id: str = Field(alias="_id")
+    username: str
+    email: str
+    role: str
+    is_active: bool
+    created_at: datetime
+    language_preference: str = "en"
+
+class AdminUserList(BaseModel):
+    users: List[AdminUser]
+
+class VideoInfo(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    title: Optional[str] = ""
+    duration: Optional[float] = 0
+    thumbnail: Optional[str] = ""
+    description: Optional[str] = ""
+    view_count: Optional[int] = 0
+    uploader: Optional[str] = ""
+
+class AppliedFeature(BaseModel):
+    model_config = ConfigDict(from_attributes=True, extra="allow")
+    
+    feature_id: str
+    name: str
+    result: str
+    confidence: float
+    processed_at: datetime
+
+class ClipProgress(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    stage: str
+    progress: Optional[float] = None
+    message: Optional[str] = None
+    updated_at: Optional[datetime] = None
+
+class ClipSummary(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: str
+    name: str
+    youtube_url: str
+    start_time: Optional[float] = 0
+    end_time: Optional[float] = None
+    status: str
+    progress: Optional[ClipProgress] = None
+    created_at: datetime
+    applied_features: List[AppliedFeature] = []
+    video_info: Optional[VideoInfo] = None
+
+class ClipList(BaseModel):
+    clips: List[ClipSummary]
+
 # Utility functions
+def typed_response(model: BaseModel) -> ORJSONResponse:
+    """Serialize an already validated response model with orjson, skipping FastAPI's jsonable_encoder pass"""
+    return ORJSONResponse(model.model_dump(by_alias=True))
+
 def sanitize_input(text: str) -> str:
     """Sanitize user input to prevent XSS attacks"""
     return bleach.clean(text, tags=[], attributes={}, strip=True)
@@ -210,17 +503,10 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await get_user_from_token(credentials.credentials)
+
+async def get_user_from_token(token: str):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -228,13 +514,29 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     )
     
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
+    token_type = payload.get("type")
+    if token_type == "access":
+        # Everything authorization needs is in the claims; no database read on the hot path
+        if revocation_filter.is_revoked(payload):
+            raise credentials_exception
+        return {
+            "_id": user_id,
+            "role": payload["role"],
+            "is_active": payload["active"],
+            "jti": payload["jti"],
+            "exp": payload["exp"],
+        }
+    if token_type is not None:
+        raise credentials_exception
+    
+    # Tokens issued before claims were added only carry `sub`
     user = await db.users.find_one({"_id": user_id})
     if user is None:
         raise credentials_exception
@@ -246,6 +548,22 @@ async def get_current_active_user(current_user: dict = Depends(get_current_user)
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+stream_security = HTTPBearer(auto_error=False)
+
+async def get_stream_user(
+    access_token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(stream_security)
+):
+    """Like get_current_active_user, but also accepts ?access_token= since EventSource cannot send headers"""
+    token = credentials.credentials if credentials else access_token
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return await get_current_active_user(await get_user_from_token(token))
+
 async def get_admin_user(current_user: dict = Depends(get_current_active_user)):
     if current_user["role"] != "admin":
         raise HTTPException(
@@ -254,56 +572,142 @@ async def get_admin_user(current_user: dict = Depends(get_current_active_user)):
         )
     return current_user
 
+def rate_limited(endpoint: str):
+    """Dependency enforcing the per-user and endpoint-wide buckets configured for endpoint"""
+    limits = RATE_LIMITS[endpoint]
+
+    async def dependency(current_user: dict = Depends(get_current_active_user)):
+        buckets = [
+            per_minute(f"{endpoint}:user:{current_user['_id']}", *limits["user"]),
+            per_minute(f"{endpoint}:global", *limits["global"]),
+        ]
+        decision = await rate_limiter.consume(buckets)
+        if not decision.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please slow down",
+                headers={"Retry-After": decision.retry_after_header},
+            )
+        return current_user
+
+    return dependency
+
 # YouTube video processing functions
 def get_video_info(url: str) -> dict:
     """Get video information from YouTube URL"""
     try:
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-        }
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            return {
-                "title": info.get("title", ""),
-                "duration": info.get("duration", 0),
-                "thumbnail": info.get("thumbnail", ""),
-                "description": info.get("description", "")[:500],  # Limit description
-                "view_count": info.get("view_count", 0),
-                "uploader": info.get("uploader", "")
-            }
+        return summarize(stream_resolver.extract(url))
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error extracting video info: {str(e)}")
 
-def download_video_segment(url: str, start_time: float = 0, end_time: Optional[float] = None) -> str:
-    """Download a segment of YouTube video"""
+def video_stream_url(url: str, max_height: int = 720) -> tuple:
+    """Direct media URL and duration of a video, so ffmpeg can seek into it without a download"""
+    return stream_resolver.resolve(url, f"best[height<={max_height}]")
+
+def keyframe_cache_path(url: str, max_height: int) -> str:
+    """Keyframe cache of a video's stream at max_height; named after the video, not its expiring media URL"""
+    name = hashlib.sha256(f"{video_key(url)}|{max_height}".encode("utf-8")).hexdigest()
+    return os.path.join(KEYFRAME_CACHE_DIR, name[:2], f"{name}.json")
+
+def download_video_segment(url: str, start_time: float = 0, end_time: Optional[float] = None, job_id: Optional[str] = None,
+                           max_height: int = 720) -> str:
+    """Download a segment of YouTube video into a tracked scratch file"""
+    output_path = janitor.scratch_path(job_id or uuid.uuid4().hex)
     try:
-        output_path = f"/tmp/clip_{uuid.uuid4().hex[:8]}.mp4"
-        
-        ydl_opts = {
-            'format': 'best[height<=720]',  # Limit quality for free processing
-            'outtmpl': output_path,
-            'quiet': True,
-        }
-        
-        # Add time range if specified
-        if start_time > 0 or end_time:
-            if end_time:
-                duration = end_time - start_time
-                cmd = f'ffmpeg -ss {start_time} -i "$(yt-dlp -g {url})" -t {duration} -c copy {output_path}'
+        with stage(DOWNLOAD_TIMEOUT_SECONDS):
+            # Add time range if specified
+            if start_time > 0 or end_time:
+                source, duration = video_stream_url(url, max_height)
+                try:
+                    smart_cut(source, start_time, end_time or duration, output_path,
+                              cache_path=keyframe_cache_path(url, max_height))
+                except subprocess.CalledProcessError:
+                    # Possibly revoked before its expiry; the retry resolves it afresh
+                    stream_resolver.invalidate(url, f"best[height<={max_height}]")
+                    raise
             else:
-                cmd = f'ffmpeg -ss {start_time} -i "$(yt-dlp -g {url})" -c copy {output_path}'
-            
-            subprocess.run(cmd, shell=True, check=True)
-        else:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
+                # The yt-dlp CLI rather than the library, so a cancelled job can kill the download
+                cancellation.run(
+                    ["yt-dlp", "--quiet", "-f", f"best[height<={max_height}]", "-o", output_path, "--", url],
+                    check=True,
+                )
         
         return output_path
+    except (Cancelled, DeadlineExceeded):
+        janitor.discard(output_path)
+        raise
     except Exception as e:
+        janitor.discard(output_path)
         raise HTTPException(status_code=400, detail=f"Error downloading video: {str(e)}")
 
+async def run_for_request(request: Request, func, *args, timeout: float = REQUEST_MEDIA_TIMEOUT_SECONDS):
+    """Run blocking media work for a request; the client disconnecting or the timeout kills its subprocesses
+
+    In-process work such as a yt-dlp extraction has nothing to kill, so the request stops
+    waiting for it instead and the thread finishes in the background.
+    """
+    token = CancelToken(timeout)
+    with bound(token):
+        work = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    # Results or errors of work nobody waits for any more are dropped
+    work.add_done_callback(lambda done: done.cancelled() or done.exception())
+    try:
+        while not work.done():
+            await asyncio.wait({work}, timeout=1.0 if token.deadline is None else min(1.0, token.remaining()))
+            if work.done():
+                break
+            if await request.is_disconnected():
+                token.cancel("client disconnected")
+                raise Cancelled("client disconnected")
+            if token.remaining() == 0:
+                token.cancel("deadline")
+                raise DeadlineExceeded("Deadline exceeded")
+        result = work.result()
+        if token.reason == "client disconnected" or await request.is_disconnected():
+            raise Cancelled("client disconnected")
+        return result
+    except Cancelled:
+        # Nobody is left to read this response
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Media processing took too long")
+    finally:
+        token.cancel("finished")
+
+async def find_duplicate_clip(user_id: str, fingerprint: str, clip_id: str, key: Optional[str]) -> Optional[dict]:
+    """Reserve the request for clip_id, or return the clip created by an identical earlier request"""
+    while True:
+        try:
+            record = await idempotency.claim(user_id, fingerprint, clip_id, key)
+        except IdempotencyConflict as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        if record is None:
+            return None
+        
+        clip = await db.clips.find_one({"_id": record["clip_id"]})
+        if clip is None:
+            # The earlier request may still be fetching video info before storing its clip
+            if (datetime.utcnow() - record["created_at"]).total_seconds() < DUPLICATE_PENDING_SECONDS:
+                raise HTTPException(
+                    status_code=409,
+                    detail="An identical clip request is still being processed",
+                    headers={"Retry-After": "2"},
+                )
+        elif clip["status"] != "failed":
+            return clip
+        
+        # The earlier clip failed or never materialised, so this request gets to do the work
+        await idempotency.release(record["clip_id"])
+
+async def abandon_clip_request(clip_id: str, inserted: bool, error: str) -> None:
+    """Undo a clip request that failed part way; once its clip exists, duplicates learn of the failure from it"""
+    if inserted:
+        await db.clips.update_one(
+            {"_id": clip_id}, {"$set": {"status": "failed", "error": error, "failed_at": datetime.utcnow()}}
+        )
+    else:
+        await idempotency.release(clip_id)
+
 # API Routes
 
 @app.get("/")
@@ -346,11 +750,8 @@ async def register(user: UserCreate):
     
     await db.users.insert_one(new_user)
     
-    # Create access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user_id}, expires_delta=access_token_expires
-    )
+    # Create access and refresh tokens
+    tokens = await token_issuer.issue(new_user)
     
     user_response = {
         "id": user_id,
@@ -360,11 +761,7 @@ async def register(user: UserCreate):
         "language_preference": user.language_preference
     }
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user": user_response
-    }
+    return {**tokens, "user": user_response}
 
 @app.post("/api/auth/login", response_model=Token)
 async def login(user_credentials: UserLogin):
@@ -381,11 +778,8 @@ async def login(user_credentials: UserLogin):
     if not user["is_active"]:
         raise HTTPException(status_code=400, detail="Inactive user")
     
-    # Create access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user["_id"]}, expires_delta=access_token_expires
-    )
+    # Create access and refresh tokens
+    tokens = await token_issuer.issue(user)
     
     user_response = {
         "id": user["_id"],
@@ -395,27 +789,75 @@ async def login(user_credentials: UserLogin):
         "language_preference": user["language_preference"]
     }
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user": user_response
+    return {**tokens, "user": user_response}
+
+@app.post("/api/auth/refresh", response_model=Token)
+async def refresh_tokens(refresh_request: RefreshRequest):
+    invalid_refresh = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    
+    try:
+        user_id = await token_issuer.redeem_refresh_token(refresh_request.refresh_token)
+    except JWTError:
+        raise invalid_refresh
+    if user_id is None:
+        raise invalid_refresh
+    
+    # Refreshing is where role and active changes are picked up
+    user = await db.users.find_one({"_id": user_id})
+    if not user:
+        raise invalid_refresh
+    if not user["is_active"]:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    
+    tokens = await token_issuer.issue(user)
+    user_response = {
+        "id": user["_id"],
+        "username": user["username"],
+        "email": user["email"],
+        "role": user["role"],
+        "language_preference": user["language_preference"]
     }
+    
+    return {**tokens, "user": user_response}
 
-@app.get("/api/auth/me")
+@app.post("/api/auth/logout")
+async def logout(
+    logout_request: Optional[LogoutRequest] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    if "jti" in current_user:
+        await revocation_filter.revoke_token(current_user["jti"], datetime.utcfromtimestamp(current_user["exp"]))
+    if logout_request and logout_request.refresh_token:
+        try:
+            await token_issuer.redeem_refresh_token(logout_request.refresh_token)
+        except JWTError:
+            pass
+    return {"success": True, "message": "Logged out"}
+
+@app.get("/api/auth/me", response_model=CurrentUser)
 async def get_current_user_info(current_user: dict = Depends(get_current_active_user)):
-    return {
-        "id": current_user["_id"],
-        "username": current_user["username"],
-        "email": current_user["email"],
-        "role": current_user["role"],
-        "language_preference": current_user["language_preference"],
-        "created_at": current_user["created_at"]
-    }
+    # Claims only carry authorization data, the profile itself lives in the database
+    if "username" not in current_user:
+        current_user = await db.users.find_one({"_id": current_user["_id"]})
+        if current_user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+    return typed_response(CurrentUser(
+        id=current_user["_id"],
+        username=current_user["username"],
+        email=current_user["email"],
+        role=current_user["role"],
+        language_preference=current_user["language_preference"],
+        created_at=current_user["created_at"]
+    ))
 
 @app.post("/api/video/info")
 async def get_youtube_video_info(
     video_url: dict,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(rate_limited("video_info"))
 ):
     url = video_url.get("url", "")
     
@@ -426,16 +868,10 @@ async def get_youtube_video_info(
     try:
         video_info = get_video_info(url)
         
-        # Store video info in database
-        video_record = {
-            "_id": str(uuid.uuid4()),
-            "user_id": current_user["_id"],
-            "youtube_url": url,
-            "video_info": video_info,
-            "created_at": datetime.utcnow()
-        }
-        
-        await db.videos.insert_one(video_record)
+        # Store video info once per video and keep a single history entry per user and video
+        key = video_key(url)
+        await video_metadata.upsert(key, video_info, url)
+        video_record = await video_metadata.record_view(current_user["_id"], key, url)
         
         return {
             "success": True,
@@ -446,18 +882,87 @@ async def get_youtube_video_info(
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/api/video/info/batch")
+async def get_youtube_video_info_batch(
+    batch_request: BatchInfoRequest,
+    request: Request,
+    current_user: dict = Depends(rate_limited("video_info_batch"))
+):
+    """NDJSON stream of video info for videos, playlists and channels, one line per video as it resolves
+
+    With `details` false, videos found through a playlist or channel are reported from
+    the listing alone, which carries title and duration but not the description.
+    """
+    for url in batch_request.urls:
+        if not validators.url(url) or "youtube.com" not in url and "youtu.be" not in url:
+            raise HTTPException(status_code=400, detail=f"Invalid YouTube URL: {url}")
+    
+    async def lines():
+        results = batch_info.stream(batch_request.urls, batch_request.details, batch_request.limit)
+        try:
+            async for result in results:
+                if await request.is_disconnected():
+                    return
+                yield json.dumps(result) + "\n"
+        finally:
+            await results.aclose()
+    
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/api/video/clip")
 async def create_video_clip(
     clip_request: VideoClipRequest,
-    current_user: dict = Depends(get_current_active_user)
+    request: Request,
+    current_user: dict = Depends(rate_limited("video_clip")),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255)
 ):
     # Validate YouTube URL
     if not validators.url(clip_request.youtube_url):
         raise HTTPException(status_code=400, detail="Invalid YouTube URL")
     
+    # Refuse new work while the scratch disk is above its high-water mark
+    if not janitor.admission_open():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Clip processing is paused while disk usage is high, please retry shortly",
+            headers={"Retry-After": str(SCRATCH_SWEEP_INTERVAL_SECONDS)},
+        )
+    
+    # Double-clicks and client retries get the clip that is already on its way
+    clip_id = str(uuid.uuid4())
+    fingerprint = clip_fingerprint(
+        current_user["_id"],
+        video_key(clip_request.youtube_url),
+        clip_request.start_time,
+        clip_request.end_time,
+        clip_request.features,
+    )
+    existing_clip = await find_duplicate_clip(current_user["_id"], fingerprint, clip_id, idempotency_key)
+    if existing_clip:
+        return {
+            "success": True,
+            "clip_id": existing_clip["_id"],
+            "message": "Clip already requested",
+            "duplicate": True,
+            "clip": {
+                "id": existing_clip["_id"],
+                "name": existing_clip["clip_name"],
+                "start_time": existing_clip["start_time"],
+                "end_time": existing_clip["end_time"],
+                "status": existing_clip["status"],
+                "download_url": f"/api/video/download/{existing_clip['_id']}",
+                "applied_features": existing_clip.get("applied_features", [])
+            }
+        }
+    
+    inserted = False
     try:
-        # Get video info first
-        video_info = get_video_info(clip_request.youtube_url)
+        # Get video info first; a client that gives up while it loads gets a 499 and no clip queued behind its back
+        video_info = await run_for_request(request, get_video_info, clip_request.youtube_url)
         
         # Validate time parameters
         if clip_request.start_time < 0:
@@ -469,16 +974,12 @@ async def create_video_clip(
         if clip_request.end_time and clip_request.end_time > video_info["duration"]:
             raise HTTPException(status_code=400, detail="End time exceeds video duration")
         
+        source_video_id = video_key(clip_request.youtube_url)
+        await video_metadata.upsert(source_video_id, video_info, clip_request.youtube_url)
+        
         # Create clip record in database
-        clip_id = str(uuid.uuid4())
         clip_name = sanitize_input(clip_request.clip_name) if clip_request.clip_name else f"Clip {clip_id[:8]}"
         
-        # Process selected features
-        applied_features = []
-        for feature in clip_request.features or []:
-            feature_result = await process_ai_feature(feature, clip_request.youtube_url, current_user)
-            applied_features.append(feature_result)
-        
         clip_record = {
             "_id": clip_id,
             "user_id": current_user["_id"],
@@ -486,56 +987,44 @@ async def create_video_clip(
             "clip_name": clip_name,
             "start_time": clip_request.start_time,
             "end_time": clip_request.end_time,
-            "video_info": video_info,
+            "video_id": source_video_id,
             "selected_features": clip_request.features or [],
-            "applied_features": applied_features,
-            "status": "processing",
+            "applied_features": [],
+            "status": "queued",
             "created_at": datetime.utcnow()
         }
         
         await db.clips.insert_one(clip_record)
+        inserted = True
         
-        # Simulate processing and create download URL
-        # In production, this would download the actual video segment
-        clip_record["status"] = "completed"
-        clip_record["download_url"] = f"/api/video/download/{clip_id}"
-        clip_record["file_path"] = f"/tmp/clip_{clip_id}.mp4"
-        
-        # Create a mock video file for download
-        mock_video_content = create_mock_video_file(clip_id, clip_record)
-        
-        # Store the mock file
-        import os
-        os.makedirs("/tmp", exist_ok=True)
-        with open(f"/tmp/clip_{clip_id}.txt", "wb") as f:
-            f.write(mock_video_content)
-        
-        await db.clips.update_one(
-            {"_id": clip_id},
-            {"$set": {
-                "status": "completed", 
-                "download_url": clip_record["download_url"],
-                "file_path": f"/tmp/clip_{clip_id}.txt",
-                "file_size": len(mock_video_content)
-            }}
+        # Rendering happens on whichever worker claims the job
+        cost = estimate_clip_cost(
+            video_info["duration"], clip_request.start_time, clip_request.end_time, clip_record["selected_features"]
         )
+        # Published first, so a worker's "processing" can never land before it
+        await progress_events.publish(clip_id, "queued", 0.0)
+        await job_queue.enqueue("render_clip", {"clip_id": clip_id}, job_id=clip_id, user_id=current_user["_id"], cost=cost)
         
         return {
             "success": True,
             "clip_id": clip_id,
-            "message": "Clip created successfully",
+            "message": "Clip queued for processing",
             "clip": {
                 "id": clip_id,
                 "name": clip_name,
                 "start_time": clip_request.start_time,
                 "end_time": clip_request.end_time,
-                "status": "completed",
-                "download_url": clip_record["download_url"],
-                "applied_features": applied_features
+                "status": "queued",
+                "download_url": f"/api/video/download/{clip_id}",
+                "applied_features": []
             }
         }
         
+    except HTTPException as e:
+        await abandon_clip_request(clip_id, inserted, str(e.detail))
+        raise
     except Exception as e:
+        await abandon_clip_request(clip_id, inserted, str(e))
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/api/video/download/{clip_id}")
@@ -553,22 +1042,25 @@ async def download_clip(
     if clip["user_id"] != current_user["_id"] and current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Access denied")
     
+    if clip["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Clip is {clip['status']}")
+    
     # Check if file exists
     file_path = clip.get("file_path")
     if not file_path or not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="Clip file not found")
     
     # Return file for download
-    from fastapi.responses import FileResponse
     return FileResponse(
         path=file_path,
         filename=f"{clip['clip_name']}.txt",
         media_type="application/octet-stream"
     )
 
-@app.get("/api/video/clips")
+@app.get("/api/video/clips", response_model=ClipList)
 async def get_user_clips(current_user: dict = Depends(get_current_active_user)):
     clips = await db.clips.find({"user_id": current_user["_id"]}).sort("created_at", -1).to_list(100)
+    video_infos = await video_metadata.get_many(clip["video_id"] for clip in clips if clip.get("video_id"))
     
     clips_response = []
     for clip in clips:
@@ -579,17 +1071,411 @@ async def get_user_clips(current_user: dict = Depends(get_current_active_user)):
             "start_time": clip["start_time"],
             "end_time": clip["end_time"],
             "status": clip["status"],
+            "progress": clip.get("progress"),
             "created_at": clip["created_at"],
-            "video_info": clip["video_info"]
+            "applied_features": clip.get("applied_features", []),
+            # Clips stored before metadata was normalised still embed their own copy
+            "video_info": video_infos.get(clip.get("video_id")) or clip.get("video_info")
         })
     
-    return {"clips": clips_response}
+    return typed_response(ClipList(clips=clips_response))
+
+@app.get("/api/video/clips/{clip_id}/events")
+async def stream_clip_events(
+    clip_id: str,
+    request: Request,
+    last_event_id: Optional[int] = None,
+    current_user: dict = Depends(get_stream_user)
+):
+    clip = await db.clips.find_one({"_id": clip_id}, {"user_id": 1})
+    
+    if not clip:
+        raise HTTPException(status_code=404, detail="Clip not found")
+    
+    if clip["user_id"] != current_user["_id"] and current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    # EventSource sends Last-Event-ID on reconnect; the query parameter covers manual resumes
+    header_id = request.headers.get("last-event-id", "")
+    resume_from = int(header_id) if header_id.isdigit() else (last_event_id or 0)
+    
+    return StreamingResponse(
+        progress_events.stream(clip_id, resume_from, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.delete("/api/video/clips/{clip_id}")
+async def delete_clip(
+    clip_id: str,
+    current_user: dict = Depends(get_current_active_user)
+):
+    clip = await db.clips.find_one({"_id": clip_id})
+    
+    if not clip:
+        raise HTTPException(status_code=404, detail="Clip not found")
+    
+    if clip["user_id"] != current_user["_id"] and current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    await db.clips.delete_one({"_id": clip_id})
+    # A job that has not started yet has nothing left to do, and a running one is stopped
+    await cancel_job(clip_id)
+    await idempotency.release(clip_id)
+    await clip_renderer.release(clip)
+    
+    return {"success": True, "message": "Clip deleted"}
+
+async def cancel_job(job_id: str) -> None:
+    """Cancel a queued or running job, stopping it at once when it runs on this node's worker"""
+    if await job_queue.cancel(job_id) == "requested" and worker:
+        # Workers on other nodes notice on their next heartbeat
+        worker.cancel(job_id)
+
+@app.post("/api/video/clips/{clip_id}/cancel")
+async def cancel_clip(
+    clip_id: str,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Stop a queued or rendering clip; its subprocesses are killed and its scratch files released"""
+    clip = await db.clips.find_one({"_id": clip_id})
+    
+    if not clip:
+        raise HTTPException(status_code=404, detail="Clip not found")
+    
+    if clip["user_id"] != current_user["_id"] and current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    cancelled = await db.clips.update_one(
+        {"_id": clip_id, "status": {"$in": ["queued", "processing"]}},
+        {"$set": {"status": "cancelled", "cancelled_at": datetime.utcnow()}}
+    )
+    if not cancelled.modified_count:
+        raise HTTPException(status_code=409, detail=f"Clip is {clip['status']}")
+    
+    await cancel_job(clip_id)
+    # The same clip can be requested again
+    await idempotency.release(clip_id)
+    await progress_events.publish(clip_id, "cancelled", message="Cancelled by user")
+    
+    return {"success": True, "message": "Clip cancelled"}
+
+# Adaptive streaming
+HLS_CONTENT_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".ts": "video/mp2t"}
+
+@app.post("/api/video/clips/{clip_id}/hls")
+async def request_clip_hls(
+    clip_id: str,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Queue HLS packaging of a clip; poll this endpoint or the clip for the master playlist URL"""
+    clip = await db.clips.find_one({"_id": clip_id, "user_id": current_user["_id"]})
+    if not clip:
+        raise HTTPException(status_code=404, detail="Clip not found")
+    if clip["status"] == "failed":
+        raise HTTPException(status_code=409, detail="Clip failed to render")
+    
+    # Only one packaging job per clip, however often this is called; a ready package is redone once the edit changed
+    claimed = await db.clips.update_one(
+        {"_id": clip_id, "$or": [
+            {"hls.status": {"$nin": ["queued", "processing", "ready"]}},
+            {"hls.status": "ready", "hls.key": {"$ne": clip_renderer.hls_key(clip)}},
+        ]},
+        {"$set": {"hls": {"status": "queued"}}}
+    )
+    if claimed.modified_count:
+        video_info = (await video_metadata.get_many([clip.get("video_id")])).get(clip.get("video_id")) or {}
+        cost = estimate_hls_cost(video_info.get("duration") or 0, clip["start_time"] or 0, clip.get("end_time"))
+        await job_queue.enqueue("package_hls", {"clip_id": clip_id}, user_id=current_user["_id"], cost=cost)
+        clip = await db.clips.find_one({"_id": clip_id})
+    
+    return {"success": True, "hls": clip.get("hls") or {"status": "queued"}}
+
+@app.get("/api/media/hls/{key}/{file_path:path}")
+async def get_hls_file(key: str, file_path: str):
+    """Playlists and segments; players cannot send auth headers, so the signed key in the URL is the capability"""
+    if not re.fullmatch(r"[0-9a-f]{64}", key) or ".." in file_path.split("/"):
+        raise HTTPException(status_code=404, detail="Not found")
+    
+    path = os.path.join(clip_renderer.hls_dir(key), file_path)
+    media_type = HLS_CONTENT_TYPES.get(os.path.splitext(path)[1])
+    if media_type is None or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Not found")
+    
+    # Packages are complete VOD ladders that never change once published
+    return FileResponse(path, media_type=media_type, headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+# Editor previews
+PREVIEW_CONTENT_TYPES = {".mp4": "video/mp4", ".jpg": "image/jpeg", ".vtt": "text/vtt", ".bin": "application/octet-stream"}
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+def ranged_file_response(request: Request, path: str, media_type: str, headers: dict):
+    """FileResponse that also answers single byte-range requests, which video scrubbing depends on"""
+    size = os.path.getsize(path)
+    match = RANGE_RE.match(request.headers.get("range", ""))
+    if not match or match.groups() == ("", ""):
+        return FileResponse(path, media_type=media_type, headers={**headers, "Accept-Ranges": "bytes"})
+    
+    first, last = match.groups()
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(0, size - int(last)), size - 1
+    if start > end or start >= size:
+        return JSONResponse(status_code=416, content={"detail": "Range not satisfiable"},
+                            headers={"Content-Range": f"bytes */{size}"})
+    
+    def chunks(block: int = 256 * 1024):
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = f.read(min(block, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+    
+    return StreamingResponse(chunks(), status_code=206, media_type=media_type, headers={
+        **headers,
+        "Accept-Ranges": "bytes",
+        "Content-Range": f"bytes {start}-{end}/{size}",
+        "Content-Length": str(end - start + 1),
+    })
+
+class PreviewRequest(BaseModel):
+    youtube_url: str
+
+@app.post("/api/video/previews")
+async def request_video_previews(
+    preview_request: PreviewRequest,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Proxy, thumbnail sprites and waveform peaks for the editor; built once per video, poll until status is ready"""
+    if not validators.url(preview_request.youtube_url):
+        raise HTTPException(status_code=400, detail="Invalid YouTube URL")
+    
+    video_id = video_key(preview_request.youtube_url)
+    video_info = (await video_metadata.get_many([video_id])).get(video_id)
+    if not video_info:
+        # The builder reads the duration from stored metadata
+        video_info = await asyncio.to_thread(get_video_info, preview_request.youtube_url)
+        await video_metadata.upsert(video_id, video_info, preview_request.youtube_url)
+    
+    state, queue = await preview_builder.request(video_id, preview_request.youtube_url)
+    if queue:
+        await job_queue.enqueue(
+            "generate_previews", {"video_id": video_id}, user_id=current_user["_id"],
+            cost=estimate_preview_cost(video_info.get("duration") or 0),
+        )
+    
+    return {
+        "video_id": video_id,
+        **{k: v for k, v in state.items() if k in ("status", "proxy_url", "thumbnails_vtt_url", "waveform_url", "error")}
+    }
+
+@app.get("/api/media/previews/{key}/{file_name}")
+async def get_preview_file(key: str, file_name: str, request: Request):
+    if not re.fullmatch(r"[0-9a-f]{64}", key) or "/" in file_name or file_name.startswith("."):
+        raise HTTPException(status_code=404, detail="Not found")
+    
+    path = os.path.join(preview_builder.preview_dir(key), file_name)
+    media_type = PREVIEW_CONTENT_TYPES.get(os.path.splitext(file_name)[1])
+    if media_type is None or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Not found")
+    
+    return ranged_file_response(request, path, media_type, {"Cache-Control": "public, max-age=31536000, immutable"})
+
+class SilenceRequest(BaseModel):
+    threshold_db: float = Field(-40.0, ge=-90, le=-10)
+    min_silence: float = Field(0.5, ge=0.1, le=10)
+    padding: float = Field(0.1, ge=0, le=1)
+
+def audio_stream_url(url: str) -> str:
+    """Direct media URL of a video's best audio, so ffmpeg can read it without a download"""
+    return stream_resolver.resolve(url, "bestaudio/best")[0]
+
+def detect_clip_silence(url: str, start: float, end: Optional[float], detector: SilenceDetector) -> list:
+    return list(stream_silence(audio_stream_url(url), detector, start, end))
+
+@app.post("/api/video/clips/{clip_id}/silence")
+async def analyze_clip_silence(
+    clip_id: str,
+    silence_request: SilenceRequest,
+    request: Request,
+    current_user: dict = Depends(rate_limited("silence_analysis"))
+):
+    """Find dead air in a clip and store its jump-cut edit list; a finished clip is re-rendered with the new cuts"""
+    clip = await db.clips.find_one({"_id": clip_id, "user_id": current_user["_id"]})
+    if not clip:
+        raise HTTPException(status_code=404, detail="Clip not found")
+    if clip.get("status") == "processing":
+        raise HTTPException(status_code=409, detail="Clip is rendering; analyze it again once the render has finished")
+    
+    detector = SilenceDetector(threshold_db=silence_request.threshold_db, min_silence=silence_request.min_silence)
+    try:
+        silences = await run_for_request(
+            request, detect_clip_silence, clip["youtube_url"], clip["start_time"] or 0, clip.get("end_time"), detector
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Silence detection failed: {str(e)}")
+    
+    keeps = keep_segments(silences, detector.duration, padding=silence_request.padding)
+    # Nothing to cut is stored as no edit list, so the clip keeps its artifact and is not rendered again
+    edits = keeps if cuts_anything(keeps, detector.duration) else []
+    analysis = {
+        "silences": [list(interval) for interval in silences],
+        "trim": list(trim_bounds(silences, detector.duration)),
+        "keep_segments": [list(interval) for interval in edits],
+        "filters": jump_cut_filters(edits) if edits else None,
+        "removed_seconds": round(detector.duration - sum(end - start for start, end in keeps), 3),
+        "analyzed_at": datetime.utcnow(),
+    }
+    # A render that has already started would finish with the old cuts
+    stored = await db.clips.update_one({"_id": clip_id, "status": {"$ne": "processing"}}, {"$set": {"silence": analysis}})
+    if stored.matched_count == 0:
+        raise HTTPException(status_code=409, detail="Clip is rendering; analyze it again once the render has finished")
+    
+    # Queued clips pick the edit list up when they start; finished ones render again with it
+    rerender = False
+    if analysis["keep_segments"] != ((clip.get("silence") or {}).get("keep_segments") or []):
+        requeued = await db.clips.update_one(
+            {"_id": clip_id, "status": "completed"},
+            {"$set": {"status": "queued", "applied_features": []}, "$unset": {"completed_at": ""}}
+        )
+        rerender = requeued.modified_count == 1
+    if rerender:
+        await clip_renderer.release(clip)
+        video_info = (await video_metadata.get_many([clip.get("video_id")])).get(clip.get("video_id")) or {}
+        cost = estimate_clip_cost(
+            video_info.get("duration") or 0, clip["start_time"] or 0, clip.get("end_time"), clip.get("selected_features") or []
+        )
+        await progress_events.publish(clip_id, "queued", 0.0)
+        await job_queue.resubmit("render_clip", {"clip_id": clip_id}, clip_id, user_id=current_user["_id"], cost=cost)
+    
+    return {"success": True, "clip_id": clip_id, "rerender": rerender, **analysis}
+
+# Resumable uploads
+class UploadCreate(BaseModel):
+    filename: str
+    size: int
+    content_type: str = "application/octet-stream"
+
+class UploadComplete(BaseModel):
+    sha256: Optional[str] = None
+
+def upload_error(e: UploadError) -> HTTPException:
+    headers = {"Upload-Offset": str(e.offset)} if e.offset is not None else None
+    return HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
+
+def upload_state(session: dict) -> dict:
+    return {
+        "upload_id": session["_id"],
+        "filename": session["filename"],
+        "size": session["size"],
+        "offset": session["received"],
+        "status": session["status"],
+        "chunk_size": UPLOAD_CHUNK_MAX_BYTES,
+        "expires_at": session["expires_at"],
+    }
+
+@app.post("/api/uploads")
+async def create_upload(
+    upload: UploadCreate,
+    current_user: dict = Depends(get_current_active_user)
+):
+    if not janitor.admission_open():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Uploads are paused while disk usage is high, please retry shortly",
+            headers={"Retry-After": str(SCRATCH_SWEEP_INTERVAL_SECONDS)},
+        )
+    try:
+        session = await uploads.create(
+            current_user["_id"], sanitize_input(upload.filename)[:255], upload.size, upload.content_type
+        )
+    except UploadError as e:
+        raise upload_error(e)
+    return upload_state(session)
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload(
+    upload_id: str,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Where to resume an interrupted upload"""
+    try:
+        return upload_state(await uploads.get(current_user["_id"], upload_id))
+    except UploadError as e:
+        raise upload_error(e)
+
+@app.put("/api/uploads/{upload_id}")
+async def put_upload_chunk(
+    upload_id: str,
+    offset: int,
+    request: Request,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Write the raw request body at `offset`, which must be the current upload offset"""
+    try:
+        session = await uploads.write_chunk(current_user["_id"], upload_id, offset, request.stream())
+    except UploadError as e:
+        raise upload_error(e)
+    return upload_state(session)
+
+@app.post("/api/uploads/{upload_id}/complete")
+async def complete_upload(
+    upload_id: str,
+    completion: UploadComplete,
+    current_user: dict = Depends(get_current_active_user)
+):
+    try:
+        media = await uploads.finalize(current_user["_id"], upload_id, completion.sha256)
+    except UploadError as e:
+        raise upload_error(e)
+    return {
+        "success": True,
+        "media_id": media["_id"],
+        "filename": media["filename"],
+        "size": media["size"],
+        "deduplicated": media.get("deduplicated", False)
+    }
+
+@app.delete("/api/uploads/{upload_id}")
+async def abort_upload(
+    upload_id: str,
+    current_user: dict = Depends(get_current_active_user)
+):
+    try:
+        await uploads.abort(current_user["_id"], upload_id)
+    except UploadError as e:
+        raise upload_error(e)
+    return {"success": True}
 
 # Admin routes
-@app.get("/api/admin/users")
+@app.get("/api/admin/users", response_model=AdminUserList)
 async def get_all_users(admin_user: dict = Depends(get_admin_user)):
     users = await db.users.find({}, {"password": 0}).sort("created_at", -1).to_list(1000)
-    return {"users": users}
+    return typed_response(AdminUserList(users=users))
+
+@app.patch("/api/admin/users/{user_id}/status")
+async def update_user_status(
+    user_id: str,
+    status_update: UserStatusUpdate,
+    admin_user: dict = Depends(get_admin_user)
+):
+    result = await db.users.update_one({"_id": user_id}, {"$set": {"is_active": status_update.is_active}})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    if not status_update.is_active:
+        # Outstanding access tokens still say active=true, so cut them off and stop refreshes
+        await revocation_filter.revoke_user(user_id)
+        await token_issuer.revoke_refresh_tokens(user_id)
+    
+    return {"success": True, "user_id": user_id, "is_active": status_update.is_active}
 
 @app.get("/api/admin/stats")
 async def get_admin_stats(admin_user: dict = Depends(get_admin_user)):
@@ -604,6 +1490,34 @@ async def get_admin_stats(admin_user: dict = Depends(get_admin_user)):
         "active_users": await db.users.count_documents({"is_active": True})
     }
 
+@app.get("/api/admin/jobs")
+async def get_job_stats(admin_user: dict = Depends(get_admin_user)):
+    return {"jobs": await job_queue.stats()}
+
+@app.get("/api/admin/scheduler")
+async def get_scheduler_stats(admin_user: dict = Depends(get_admin_user)):
+    """Per-user backlog and fair-share position, queue wait percentiles and cost estimate accuracy"""
+    return await job_queue.scheduler.stats(job_queue.jobs, datetime.utcnow())
+
+@app.post("/api/admin/jobs/{job_id}/requeue")
+async def requeue_dead_job(job_id: str, admin_user: dict = Depends(get_admin_user)):
+    if not await job_queue.requeue_dead(job_id):
+        raise HTTPException(status_code=404, detail="Dead-lettered job not found")
+    await db.clips.update_one({"_id": job_id}, {"$set": {"status": "queued"}, "$unset": {"error": ""}})
+    return {"success": True}
+
+@app.get("/api/admin/artifacts")
+async def get_artifact_stats(admin_user: dict = Depends(get_admin_user)):
+    return {"artifacts": await clip_renderer.artifacts.stats()}
+
+@app.get("/api/admin/disk")
+async def get_disk_metrics(admin_user: dict = Depends(get_admin_user)):
+    return janitor.metrics()
+
+@app.get("/api/admin/stream-urls")
+async def get_stream_url_metrics(admin_user: dict = Depends(get_admin_user)):
+    return stream_resolver.metrics()
+
 # AI Features (Mock implementations using free tiers)
 @app.post("/api/ai/auto-caption")
 async def auto_caption_video(
@@ -611,35 +1525,272 @@ async def auto_caption_video(
     current_user: dict = Depends(get_current_active_user)
 ):
     # Mock implementation - in production this would use AssemblyAI
+    captions = [
+        {"start": 0, "end": 3, "text": "Welcome to this amazing video"},
+        {"start": 3, "end": 6, "text": "Let me show you something incredible"},
+        {"start": 6, "end": 10, "text": "This is auto-generated content"}
+    ]
+    
+    # Keep the captions as a searchable transcript when they belong to a video
+    youtube_url = video_data.get("youtube_url")
+    video_id = None
+    if youtube_url:
+        if not validators.url(youtube_url):
+            raise HTTPException(status_code=400, detail="Invalid YouTube URL")
+        video_id = video_key(youtube_url)
+        language = str(video_data.get("language", "en"))
+        await transcripts.replace(current_user["_id"], video_id, youtube_url, captions, language)
+    
     return {
         "success": True,
-        "captions": [
-            {"start": 0, "end": 3, "text": "Welcome to this amazing video"},
-            {"start": 3, "end": 6, "text": "Let me show you something incredible"},
-            {"start": 6, "end": 10, "text": "This is auto-generated content"}
-        ],
+        "video_id": video_id,
+        "captions": captions,
         "languages_available": ["en", "sq", "es", "fr", "de", "it"]
     }
 
+class HighlightRequest(BaseModel):
+    youtube_url: str
+    clip_length: int = Field(30, ge=5, le=600)
+    count: int = Field(5, ge=1, le=50)
+    keywords: Optional[List[str]] = None
+    weights: Optional[Dict[str, float]] = None
+    analyze_media: bool = False
+
+    @field_validator("weights")
+    @classmethod
+    def known_non_negative_weights(cls, weights: Optional[Dict[str, float]]) -> Optional[Dict[str, float]]:
+        for name, weight in (weights or {}).items():
+            if name not in DEFAULT_WEIGHTS:
+                raise ValueError(f"unknown feature {name!r}; expected one of {', '.join(DEFAULT_WEIGHTS)}")
+            if weight < 0:
+                raise ValueError(f"weight of {name!r} must not be negative")
+        return weights
+
+def extract_media_features(url: str, job_id: str) -> tuple:
+    """Per-second audio energy and scene cut times of a downloaded video"""
+    path = download_video_segment(url, job_id=job_id)
+    try:
+        return audio_energy(path), scene_cuts(path)
+    finally:
+        janitor.release_job(job_id)
+
+async def media_features(request: Request, video_id: str, url: str) -> tuple:
+    """Audio and scene features for a video, extracted once and then read from highlight_features"""
+    cached = await db.highlight_features.find_one({"_id": video_id})
+    if cached:
+        return np.frombuffer(cached["audio_energy"], dtype=np.float32), cached["scene_cuts"]
+    
+    audio, cuts = await run_for_request(request, extract_media_features, url, f"highlights-{uuid.uuid4().hex}")
+    await db.highlight_features.replace_one(
+        {"_id": video_id},
+        {"audio_energy": audio.astype(np.float32).tobytes(), "scene_cuts": cuts, "created_at": datetime.utcnow()},
+        upsert=True
+    )
+    return audio, cuts
+
+@app.post("/api/ai/highlights")
+async def find_highlights(
+    highlight_request: HighlightRequest,
+    request: Request,
+    current_user: dict = Depends(rate_limited("highlights"))
+):
+    """Top non-overlapping highlight windows of a video"""
+    if not validators.url(highlight_request.youtube_url):
+        raise HTTPException(status_code=400, detail="Invalid YouTube URL")
+    
+    video_id = video_key(highlight_request.youtube_url)
+    video_info = (await video_metadata.get_many([video_id])).get(video_id)
+    if not video_info:
+        video_info = await run_for_request(request, get_video_info, highlight_request.youtube_url)
+        await video_metadata.upsert(video_id, video_info, highlight_request.youtube_url)
+    
+    segments = await transcripts.segments_between(current_user["_id"], video_id)
+    duration = video_info.get("duration") or (segments[-1]["end"] if segments else 0)
+    if not duration:
+        raise HTTPException(status_code=400, detail="Video duration is unknown")
+    
+    keywords = highlight_request.keywords or top_keywords(" ".join(s["text"] for s in segments), 5)
+    audio, cuts = None, None
+    if highlight_request.analyze_media:
+        try:
+            audio, cuts = await media_features(request, video_id, highlight_request.youtube_url)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Media analysis failed: {str(e)}")
+    if not segments and audio is None:
+        raise HTTPException(status_code=400, detail="Caption the video or set analyze_media to score highlights")
+    
+    highlights = suggest_highlights(
+        duration,
+        segments,
+        keywords,
+        audio=audio,
+        cuts=cuts,
+        window=highlight_request.clip_length,
+        count=highlight_request.count,
+        weights=highlight_request.weights,
+    )
+    return {"video_id": video_id, "keywords": keywords, "highlights": highlights}
+
+@app.get("/api/transcripts/search")
+async def search_transcripts(
+    q: str,
+    video_id: Optional[str] = None,
+    limit: int = 20,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Find the moments across the user's videos where something was said"""
+    query = " ".join(q.split())
+    if not query:
+        raise HTTPException(status_code=400, detail="Search query is required")
+    
+    hits = await transcripts.search(current_user["_id"], query, min(max(limit, 1), 100), video_id)
+    titles = await video_metadata.get_many(hit["video_id"] for hit in hits)
+    
+    return {
+        "query": query,
+        "hits": [
+            {
+                "segment_id": hit["_id"],
+                "video_id": hit["video_id"],
+                "video_title": titles.get(hit["video_id"], {}).get("title", ""),
+                "youtube_url": hit["youtube_url"],
+                "start": hit["start"],
+                "end": hit["end"],
+                "text": hit["text"],
+                "score": round(hit["score"], 3)
+            }
+            for hit in hits
+        ]
+    }
+
+class ClipFromHitRequest(BaseModel):
+    padding_before: float = Field(2.0, ge=0, le=60)
+    padding_after: float = Field(2.0, ge=0, le=60)
+    clip_name: Optional[str] = None
+    features: Optional[List[str]] = []
+
+@app.post("/api/transcripts/segments/{segment_id}/clip")
+async def create_clip_from_hit(
+    segment_id: str,
+    hit_request: ClipFromHitRequest,
+    request: Request,
+    current_user: dict = Depends(rate_limited("video_clip")),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255)
+):
+    """Cut a clip around a search hit"""
+    segment = await transcripts.get(current_user["_id"], segment_id)
+    if not segment:
+        raise HTTPException(status_code=404, detail="Transcript segment not found")
+    
+    end_time = segment["end"] + hit_request.padding_after
+    video_info = (await video_metadata.get_many([segment["video_id"]])).get(segment["video_id"], {})
+    if video_info.get("duration"):
+        end_time = min(end_time, video_info["duration"])
+    
+    clip_request = VideoClipRequest(
+        youtube_url=segment["youtube_url"],
+        start_time=round(max(0.0, segment["start"] - hit_request.padding_before), 3),
+        end_time=round(end_time, 3),
+        clip_name=hit_request.clip_name,
+        features=hit_request.features,
+    )
+    return await create_video_clip(clip_request, request, current_user, idempotency_key)
+
+def script_request(prompt_data: dict) -> tuple:
+    """Topic, language and generation parameters from a generate-script request body"""
+    topic = " ".join(sanitize_input(str(prompt_data.get("topic", ""))).split())
+    language = str(prompt_data.get("language", "en"))
+    params = {
+        key: sanitize_input(str(prompt_data[key]))
+        for key in ("tone", "platform", "duration_seconds")
+        if prompt_data.get(key) not in (None, "")
+    }
+    return topic, language, params
+
+def script_summary(script: str) -> dict:
+    words = len(script.split())
+    # Spoken delivery runs at roughly 150 words per minute
+    return {"word_count": words, "estimated_duration": f"{max(1, round(words / 2.5))} seconds"}
+
 @app.post("/api/ai/generate-script")
 async def generate_video_script(
     prompt_data: dict,
-    current_user: dict = Depends(get_current_active_user)
+    current_user: dict = Depends(rate_limited("ai_script"))
 ):
-    # Mock implementation - in production this would use OpenAI
-    topic = sanitize_input(prompt_data.get("topic", ""))
-    language = prompt_data.get("language", "en")
+    topic, language, params = script_request(prompt_data)
     
-    scripts = {
-        "en": f"Here's an engaging script about {topic}: Start with a hook, provide valuable content, and end with a strong call to action.",
-        "sq": f"Këtu është një skript tërheqës për {topic}: Filloni me një hok, ofroni përmbajtje të vlefshme dhe përfundoni me një thirrje të fortë për veprim."
+    try:
+        result = await script_generator.generate(topic, language, params)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Script generation failed: {str(e)}")
+    
+    return {
+        "success": True,
+        "script": result["script"],
+        "cached": result["cached"],
+        **script_summary(result["script"])
     }
+
+@app.post("/api/ai/generate-script/stream")
+async def stream_video_script(
+    prompt_data: dict,
+    request: Request,
+    current_user: dict = Depends(rate_limited("ai_script"))
+):
+    topic, language, params = script_request(prompt_data)
+    
+    async def events():
+        try:
+            async for item in script_generator.stream(topic, language, params):
+                if await request.is_disconnected():
+                    return
+                if "text" in item:
+                    yield f"event: token\ndata: {json.dumps({'text': item['text']})}\n\n"
+                else:
+                    done = {**item, **script_summary(item["script"])}
+                    yield f"event: done\ndata: {json.dumps(done)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/ai/hook-titles")
+async def generate_hook_titles(
+    request_data: dict,
+    current_user: dict = Depends(rate_limited("ai_script"))
+):
+    """Title candidates for many clips in one call; pass `transcripts` or `clip_ids`"""
+    transcripts = [sanitize_input(str(t)) for t in request_data.get("transcripts", [])]
+    clip_ids = [str(c) for c in request_data.get("clip_ids", [])]
+    if clip_ids:
+        clips = {
+            clip["_id"]: clip
+            async for clip in db.clips.find({"_id": {"$in": clip_ids}, "user_id": current_user["_id"]})
+        }
+        missing = [c for c in clip_ids if c not in clips]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Clips not found: {', '.join(missing)}")
+        transcripts += [await clip_renderer.clip_transcript(clips[c]) for c in clip_ids]
+    if not transcripts:
+        raise HTTPException(status_code=400, detail="Provide transcripts or clip_ids")
+    if len(transcripts) > 100:
+        raise HTTPException(status_code=400, detail="At most 100 clips per request")
+    
+    try:
+        titles = await clip_renderer.hook_titles.generate_many(transcripts)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Hook title generation failed: {str(e)}")
     
     return {
         "success": True,
-        "script": scripts.get(language, scripts["en"]),
-        "word_count": len(scripts.get(language, scripts["en"]).split()),
-        "estimated_duration": "30-60 seconds"
+        "titles": titles,
+        "model": clip_renderer.hook_titles.uses_model
     }
 
 if __name__ == "__main__":
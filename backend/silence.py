@@ -0,0 +1,145 @@
+"""Streaming silence detection and jump-cut edit lists
+
+Audio is decoded by ffmpeg to 16-bit mono PCM and read in fixed-size blocks, so
+memory stays constant however long the source is; only the silence intervals
+found so far are kept.
+"""
+import subprocess
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import cancellation
+
+SAMPLE_RATE = 16000
+BLOCK_SECONDS = 2.0
+
+Interval = Tuple[float, float]
+
+
+class SilenceDetector:
+    """Frame-level energy gate fed one block of samples at a time.
+
+    A run of frames below `threshold_db` (relative to full scale) lasting at least
+    `min_silence` seconds is reported as a silence interval. Samples that do not fill
+    a whole frame are carried over to the next block.
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, frame_ms: int = 20, threshold_db: float = -40.0,
+                 min_silence: float = 0.5):
+        self.sample_rate = sample_rate
+        self.frame = max(1, sample_rate * frame_ms // 1000)
+        self.threshold = 10 ** (threshold_db / 20)
+        self.min_silence = min_silence
+        self._carry = np.zeros(0, dtype=np.float32)
+        self._frames_seen = 0
+        self._silent_since: Optional[int] = None
+
+    def _interval(self, start_frame: int, end_frame: int) -> Optional[Interval]:
+        start, end = start_frame * self.frame / self.sample_rate, end_frame * self.frame / self.sample_rate
+        return (round(start, 3), round(end, 3)) if end - start >= self.min_silence else None
+
+    def feed(self, samples: np.ndarray) -> List[Interval]:
+        """Silence intervals that ended within this block"""
+        samples = np.concatenate([self._carry, samples.astype(np.float32)])
+        whole = len(samples) // self.frame * self.frame
+        self._carry = samples[whole:]
+        frames = samples[:whole].reshape(-1, self.frame)
+        if not len(frames):
+            return []
+
+        silent = np.sqrt(np.mean(frames * frames, axis=1)) < self.threshold
+        # Indices where the silent/loud state flips, relative to the state before this block
+        before = self._silent_since is not None
+        edges = np.flatnonzero(np.diff(np.concatenate([[before], silent]).astype(np.int8)))
+
+        intervals = []
+        for edge in edges:
+            frame_index = self._frames_seen + int(edge)
+            if silent[edge]:
+                self._silent_since = frame_index
+            else:
+                interval = self._interval(self._silent_since, frame_index)
+                if interval:
+                    intervals.append(interval)
+                self._silent_since = None
+        self._frames_seen += len(frames)
+        return intervals
+
+    def finish(self) -> List[Interval]:
+        """Close a silence still running at the end of the stream"""
+        if self._silent_since is None:
+            return []
+        interval = self._interval(self._silent_since, self._frames_seen)
+        self._silent_since = None
+        return [interval] if interval else []
+
+    @property
+    def duration(self) -> float:
+        return self._frames_seen * self.frame / self.sample_rate
+
+
+def pcm_command(source: str, start: float = 0, end: Optional[float] = None, sample_rate: int = SAMPLE_RATE) -> List[str]:
+    command = ["ffmpeg", "-v", "error"]
+    if start:
+        command += ["-ss", str(start)]
+    if end is not None:
+        command += ["-to", str(end)]
+    return command + ["-i", source, "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "pipe:1"]
+
+
+def stream_silence(source: str, detector: SilenceDetector, start: float = 0, end: Optional[float] = None) -> Iterator[Interval]:
+    """Yield silence intervals of a file or URL as decoding reaches them, relative to `start`"""
+    block = int(detector.sample_rate * BLOCK_SECONDS) * 2
+    with cancellation.popen(pcm_command(source, start, end, detector.sample_rate), stdout=subprocess.PIPE) as process:
+        while True:
+            data = process.stdout.read(block)
+            if not data:
+                break
+            # A final odd byte cannot form a sample
+            data = data[:len(data) // 2 * 2]
+            samples = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+            yield from detector.feed(samples)
+        yield from detector.finish()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with status {process.returncode}")
+
+
+def keep_segments(silences: List[Interval], duration: float, padding: float = 0.1, min_keep: float = 0.2) -> List[Interval]:
+    """Edit list of the parts to keep: everything but the silences, each cut softened by `padding`"""
+    keeps = []
+    cursor = 0.0
+    for start, end in silences:
+        cut_start, cut_end = start + padding, end - padding
+        if cut_end <= cut_start:
+            continue
+        if cut_start - cursor >= min_keep:
+            keeps.append((round(cursor, 3), round(cut_start, 3)))
+        cursor = max(cursor, cut_end)
+    if duration - cursor >= min_keep:
+        keeps.append((round(cursor, 3), round(duration, 3)))
+    return keeps
+
+
+def cuts_anything(keeps: List[Interval], duration: float) -> bool:
+    """Whether an edit list removes anything; a single keep spanning the whole clip is no edit at all"""
+    return not (len(keeps) == 1 and keeps[0][0] <= 0.0 and keeps[0][1] >= round(duration, 3))
+
+
+def trim_bounds(silences: List[Interval], duration: float) -> Interval:
+    """Start and end of the clip with only leading and trailing silence removed"""
+    start, end = 0.0, duration
+    if silences and silences[0][0] <= 0.0:
+        start = silences[0][1]
+    if silences and silences[-1][1] >= duration - 0.001:
+        end = silences[-1][0]
+    return (start, max(start, end))
+
+
+def jump_cut_filters(keeps: List[Interval]) -> dict:
+    """ffmpeg video and audio filters that apply an edit list in a single render pass"""
+    ranges = "+".join(f"between(t,{start},{end})" for start, end in keeps)
+    return {
+        "video": f"select='{ranges}',setpts=N/FRAME_RATE/TB",
+        "audio": f"aselect='{ranges}',asetpts=N/SR/TB",
+    }
@@ -0,0 +1,198 @@
+"""Frame-accurate cuts at near stream-copy speed
+
+Only the partial GOPs at the clip edges are re-encoded; everything between the first
+and last keyframe inside the range is stream-copied, and the parts are concatenated.
+"""
+import bisect
+import json
+import logging
+import os
+import tempfile
+from typing import List, Optional, Tuple
+
+import cancellation
+
+logger = logging.getLogger(__name__)
+
+# How far around a cut point to look for keyframes in remote sources; longer than any sane GOP
+PROBE_SPAN_SECONDS = 12
+ENCODERS = {"h264": "libx264", "hevc": "libx265"}
+# ffprobe profile names to encoder profiles; edge GOPs have to decode with the copied middle's parameters
+PROFILES = {
+    "h264": {"constrained baseline": "baseline", "baseline": "baseline", "main": "main", "high": "high",
+             "high 10": "high10", "high 4:2:2": "high422", "high 4:4:4 predictive": "high444"},
+    "hevc": {"main": "main", "main 10": "main10", "main still picture": "mainstillpicture"},
+}
+# ffprobe reports levels as level_idc: 10x the level for H.264, 30x for HEVC
+LEVEL_SCALE = {"h264": 10, "hevc": 30}
+
+Part = Tuple[str, float, float]
+
+
+def probe_keyframes(source: str, read_intervals: Optional[str] = None) -> List[float]:
+    """Keyframe timestamps from packet flags, which needs no decoding"""
+    command = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0"]
+    if read_intervals:
+        command += ["-read_intervals", read_intervals]
+    result = cancellation.run(command + [source], capture_output=True, text=True, check=True)
+    times = set()
+    for line in result.stdout.splitlines():
+        pts, _, flags = line.partition(",")
+        if "K" in flags and pts not in ("", "N/A"):
+            times.add(round(float(pts), 6))
+    return sorted(times)
+
+
+def keyframe_index(path: str) -> List[float]:
+    """Whole-file keyframe index of a local source, cached in a sidecar file next to it"""
+    sidecar = f"{path}.keyframes.json"
+    try:
+        if os.path.getmtime(sidecar) >= os.path.getmtime(path):
+            with open(sidecar) as f:
+                return json.load(f)
+    except (OSError, ValueError):
+        pass
+    times = probe_keyframes(path)
+    with open(sidecar, "w") as f:
+        json.dump(times, f)
+    return times
+
+
+def _covered(intervals: List[List[float]], start: float, end: float) -> bool:
+    return any(lo <= start and end <= hi for lo, hi in intervals)
+
+
+def keyframes_near(source: str, start: float, end: float, cache_path: Optional[str] = None) -> List[float]:
+    """Keyframes around the two cut points of a remote source, without reading the middle
+
+    Remote URLs expire, so the cache file is named by the caller after the video and
+    format rather than the URL. It keeps every probed interval, and later cuts only
+    probe the windows it does not cover yet.
+    """
+    windows = [(max(0.0, start - 1), max(0.0, start - 1) + PROBE_SPAN_SECONDS),
+               (max(0.0, end - PROBE_SPAN_SECONDS), end + 1)]
+    cached = {"intervals": [], "keyframes": []}
+    if cache_path:
+        try:
+            with open(cache_path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            pass
+    missing = [(lo, hi) for lo, hi in windows if not _covered(cached["intervals"], lo, hi)]
+    if not missing:
+        return cached["keyframes"]
+
+    probed = probe_keyframes(source, ",".join(f"{lo}%{hi}" for lo, hi in missing))
+    cached = {
+        "intervals": cached["intervals"] + [list(window) for window in missing],
+        "keyframes": sorted(set(cached["keyframes"]) | set(probed)),
+    }
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        staging = f"{cache_path}.{os.getpid()}.tmp"
+        with open(staging, "w") as f:
+            json.dump(cached, f)
+        os.replace(staging, cache_path)
+    return cached["keyframes"]
+
+
+def plan(keyframes: List[float], start: float, end: float) -> List[Part]:
+    """("encode" | "copy", from, to) parts covering [start, end]"""
+    first = bisect.bisect_left(keyframes, start - 1e-3)
+    last = bisect.bisect_right(keyframes, end + 1e-3) - 1
+    if first >= len(keyframes) or last < 0 or keyframes[first] >= keyframes[last]:
+        # No whole GOP inside the range, so there is nothing to copy
+        return [("encode", start, end)]
+
+    copy_from, copy_to = keyframes[first], keyframes[last]
+    parts = []
+    if copy_from - start > 1e-3:
+        parts.append(("encode", start, copy_from))
+    parts.append(("copy", copy_from, copy_to))
+    if end - copy_to > 1e-3:
+        parts.append(("encode", copy_to, end))
+    return parts
+
+
+def probe_video_stream(source: str) -> dict:
+    result = cancellation.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0",
+         "-show_entries", "stream=codec_name,pix_fmt,width,height,r_frame_rate,profile,level", "-of", "json", source],
+        capture_output=True, text=True, check=True,
+    )
+    streams = json.loads(result.stdout).get("streams") or [{}]
+    return streams[0]
+
+
+def encoder_options(stream: dict) -> List[str]:
+    """Encoder settings for an edge GOP that matches the copied middle: codec, profile, level and pix_fmt"""
+    codec = stream.get("codec_name")
+    if codec not in ENCODERS:
+        # Nothing gets copied from these sources (see smart_cut), so the whole range is plain H.264
+        return ["-c:v", "libx264", "-preset", "veryfast", "-crf", "18", "-pix_fmt", "yuv420p"]
+
+    options = ["-c:v", ENCODERS[codec], "-preset", "veryfast", "-crf", "18"]
+    profile = PROFILES[codec].get((stream.get("profile") or "").lower())
+    if profile:
+        options += ["-profile:v", profile]
+    level = stream.get("level") or 0
+    if level > 0:
+        if codec == "h264":
+            options += ["-level:v", f"{level / LEVEL_SCALE[codec]:g}"]
+        else:
+            options += ["-x265-params", f"level-idc={level / LEVEL_SCALE[codec]:g}"]
+    if stream.get("pix_fmt"):
+        options += ["-pix_fmt", stream["pix_fmt"]]
+    if stream.get("r_frame_rate") and stream["r_frame_rate"] != "0/0":
+        options += ["-r", stream["r_frame_rate"]]
+    return options
+
+
+def part_command(source: str, part: Part, output: str, stream: dict) -> List[str]:
+    kind, start, end = part
+    command = ["ffmpeg", "-v", "error", "-y", "-ss", f"{start:.6f}", "-i", source, "-t", f"{end - start:.6f}",
+               "-map", "0:v:0", "-an"]
+    if kind == "copy":
+        command += ["-c:v", "copy"]
+    else:
+        command += encoder_options(stream)
+    return command + ["-f", "mpegts", output]
+
+
+def smart_cut(source: str, start: float, end: float, output: str, keyframes: Optional[List[float]] = None,
+              cache_path: Optional[str] = None) -> List[Part]:
+    """Cut [start, end] of source into output (mp4); returns the plan that was used
+
+    cache_path names the keyframe cache of a remote source, see keyframes_near.
+    """
+    stream = probe_video_stream(source)
+    if stream.get("codec_name") not in ENCODERS:
+        # VP9, AV1 and the like cannot be joined to H.264 edges, so the range is re-encoded whole
+        parts = [("encode", start, end)]
+    else:
+        if keyframes is None:
+            keyframes = keyframe_index(source) if os.path.exists(source) else keyframes_near(source, start, end, cache_path)
+        parts = plan(keyframes, start, end)
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(output) or None) as work_dir:
+        files = []
+        for index, part in enumerate(parts):
+            path = os.path.join(work_dir, f"part_{index}.ts")
+            cancellation.run(part_command(source, part, path, stream), check=True)
+            files.append(path)
+        concat_list = os.path.join(work_dir, "parts.txt")
+        with open(concat_list, "w") as f:
+            f.writelines(f"file '{path}'\n" for path in files)
+
+        # Audio is cheap to encode, so it is cut accurately in one piece alongside the concatenated video
+        cancellation.run([
+            "ffmpeg", "-v", "error", "-y",
+            "-f", "concat", "-safe", "0", "-i", concat_list,
+            "-ss", f"{start:.6f}", "-i", source, "-t", f"{end - start:.6f}",
+            "-map", "0:v:0", "-map", "1:a:0?", "-c:v", "copy", "-c:a", "aac", "-b:a", "160k",
+            "-movflags", "+faststart", "-f", "mp4", output,
+        ], check=True)
+
+    copied = sum(to - frm for kind, frm, to in parts if kind == "copy")
+    logger.info("Smart cut %.2fs of %s: %.2fs stream-copied in %d parts", end - start, source[:80], copied, len(parts))
+    return parts
@@ -0,0 +1,217 @@
+"""Direct media URL resolution with warm extractors and an expiry-aware cache
+
+Building a YoutubeDL object loads every extractor, and resolving a video costs a few
+round trips to YouTube, so both are paid once rather than per clip: extractor instances
+are kept per format spec, and resolved URLs are cached per (video, format) until shortly
+before the `expire` time googlevideo embeds in them. URLs still in use are re-resolved
+ahead of that time by a background refresh, so renders of a popular video never wait on
+resolution. googlevideo URLs are also bound to the resolving IP, which is why the cache
+lives in each process instead of the database.
+"""
+import asyncio
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import yt_dlp
+
+from video_ids import video_key
+
+logger = logging.getLogger(__name__)
+
+EXPIRE_PATH_RE = re.compile(r"/expire/(\d+)")
+BASE_OPTIONS = {"quiet": True, "no_warnings": True}
+
+
+def url_expiry(url: str) -> Optional[float]:
+    """Unix time a signed media URL stops working, from its `expire` query or path parameter"""
+    parsed = urlparse(url)
+    value = (parse_qs(parsed.query).get("expire") or [""])[0]
+    if not value:
+        match = EXPIRE_PATH_RE.search(parsed.path)
+        value = match.group(1) if match else ""
+    return float(value) if value.isdigit() else None
+
+
+@dataclass
+class ResolvedStream:
+    url: str
+    duration: float
+    expires_at: float
+    source_url: str
+    last_used: float
+
+
+class StreamResolver:
+    """Resolves page URLs to direct media URLs; blocking, so call it from a worker thread"""
+
+    def __init__(self, instances: int = 2, min_validity: float = 900, refresh_ahead: Optional[float] = None,
+                 default_ttl: float = 1800, keep_warm: float = 3600, interval: float = 60, max_entries: int = 2000):
+        self.instances = instances
+        # A URL is only handed out if it outlives a whole download of the stage that asked for it
+        self.min_validity = min_validity
+        self.refresh_ahead = refresh_ahead if refresh_ahead is not None else 2 * min_validity
+        self.default_ttl = default_ttl
+        self.keep_warm = keep_warm
+        self.interval = interval
+        self.max_entries = max_entries
+        self._idle: Dict[Optional[str], List[yt_dlp.YoutubeDL]] = {}
+        self._cache: Dict[Tuple[str, str], ResolvedStream] = {}
+        self._resolving: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    # Extractor instances
+
+    def _checkout(self, fmt: Optional[str]) -> yt_dlp.YoutubeDL:
+        with self._lock:
+            idle = self._idle.get(fmt)
+            if idle:
+                return idle.pop()
+        options = dict(BASE_OPTIONS, format=fmt) if fmt else dict(BASE_OPTIONS)
+        return yt_dlp.YoutubeDL(options)
+
+    def _checkin(self, fmt: Optional[str], ydl: yt_dlp.YoutubeDL) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(fmt, [])
+            if len(idle) < self.instances:
+                idle.append(ydl)
+                return
+        ydl.close()
+
+    def extract(self, url: str, fmt: Optional[str] = None) -> dict:
+        """Full extraction output for url on a warm instance; nothing is cached"""
+        ydl = self._checkout(fmt)
+        try:
+            return ydl.extract_info(url, download=False)
+        finally:
+            self._checkin(fmt, ydl)
+
+    # Resolution
+
+    def _fetch(self, url: str, fmt: str) -> ResolvedStream:
+        info = self.extract(url, fmt)
+        if not info.get("url"):
+            raise ValueError(f"Format {fmt!r} did not resolve to a single media URL")
+        now = time.time()
+        return ResolvedStream(
+            url=info["url"],
+            duration=info.get("duration") or 0,
+            expires_at=url_expiry(info["url"]) or now + self.default_ttl,
+            source_url=url,
+            last_used=now,
+        )
+
+    def _fresh(self, entry: Optional[ResolvedStream], now: float) -> bool:
+        return entry is not None and entry.expires_at - now > self.min_validity
+
+    def resolve(self, url: str, fmt: str) -> Tuple[str, float]:
+        """Direct media URL and duration of url in format fmt, from the cache when still valid"""
+        key = (video_key(url), fmt)
+        entry = self._cache.get(key)
+        if self._fresh(entry, time.time()):
+            entry.last_used = time.time()
+            self.hits += 1
+            return entry.url, entry.duration
+
+        # One resolution per key at a time; renders of the same video queued behind it get its result
+        with self._lock:
+            pending = self._resolving.setdefault(key, threading.Lock())
+        try:
+            with pending:
+                entry = self._cache.get(key)
+                if self._fresh(entry, time.time()):
+                    entry.last_used = time.time()
+                    self.hits += 1
+                    return entry.url, entry.duration
+                self.misses += 1
+                entry = self._fetch(url, fmt)
+                self._store(key, entry)
+                return entry.url, entry.duration
+        finally:
+            with self._lock:
+                self._resolving.pop(key, None)
+
+    def _store(self, key: Tuple[str, str], entry: ResolvedStream) -> None:
+        with self._lock:
+            self._cache[key] = entry
+            if len(self._cache) > self.max_entries:
+                for stale in sorted(self._cache, key=lambda k: self._cache[k].last_used)[:len(self._cache) - self.max_entries]:
+                    del self._cache[stale]
+
+    def invalidate(self, url: str, fmt: Optional[str] = None) -> None:
+        """Forget a URL that failed before its expiry, e.g. because YouTube revoked it"""
+        vid = video_key(url)
+        with self._lock:
+            for key in [k for k in self._cache if k[0] == vid and (fmt is None or k[1] == fmt)]:
+                del self._cache[key]
+
+    # Background refresh
+
+    def refresh_due(self) -> int:
+        """Re-resolve recently used URLs nearing expiry and drop the rest once expired; returns the refresh count"""
+        now = time.time()
+        with self._lock:
+            entries = list(self._cache.items())
+        refreshed = 0
+        for key, entry in entries:
+            if entry.expires_at - now > self.refresh_ahead:
+                continue
+            if now - entry.last_used > self.keep_warm:
+                if entry.expires_at <= now + self.min_validity:
+                    with self._lock:
+                        if self._cache.get(key) is entry:
+                            del self._cache[key]
+                continue
+            try:
+                fresh = self._fetch(entry.source_url, key[1])
+            except Exception as e:
+                logger.warning("Refreshing stream URL for %s failed: %s", key[0], e)
+                continue
+            fresh.last_used = entry.last_used
+            self._store(key, fresh)
+            refreshed += 1
+        self.refreshes += refreshed
+        return refreshed
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh_due)
+            except Exception:
+                logger.exception("Stream URL refresh failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def metrics(self) -> dict:
+        now = time.time()
+        with self._lock:
+            entries = list(self._cache.values())
+            instances = {fmt or "default": len(idle) for fmt, idle in self._idle.items()}
+        return {
+            "cached_urls": len(entries),
+            "valid_urls": sum(1 for entry in entries if self._fresh(entry, now)),
+            "idle_extractors": instances,
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+        }
@@ -0,0 +1,75 @@
+"""Segment-level transcripts with a per-user full-text index"""
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+
+class TranscriptStore:
+    """One document per caption segment in `transcript_segments`.
+
+    The text index is prefixed by user_id, so a search only walks the caller's own
+    index keys instead of everyone's; queries must therefore always pin user_id.
+    """
+
+    def __init__(self, db):
+        self.segments = db.transcript_segments
+
+    async def ensure_indexes(self) -> None:
+        # language "none" skips stemming and stop words, which would only fit English;
+        # the override field name keeps our `language` field from being read as the index language
+        await self.segments.create_index(
+            [("user_id", 1), ("text", "text")],
+            name="user_text",
+            default_language="none",
+            language_override="text_language",
+        )
+        await self.segments.create_index([("user_id", 1), ("video_id", 1), ("start", 1)])
+
+    async def replace(self, user_id: str, video_id: str, youtube_url: str, segments: List[dict], language: str) -> int:
+        """Store a video's transcript for a user, replacing any earlier one"""
+        now = datetime.utcnow()
+        docs = [
+            {
+                "_id": str(uuid.uuid4()),
+                "user_id": user_id,
+                "video_id": video_id,
+                "youtube_url": youtube_url,
+                "start": float(segment["start"]),
+                "end": float(segment["end"]),
+                "text": segment["text"],
+                "language": language,
+                "created_at": now,
+            }
+            for segment in segments
+            if str(segment.get("text", "")).strip()
+        ]
+        await self.segments.delete_many({"user_id": user_id, "video_id": video_id})
+        if docs:
+            await self.segments.insert_many(docs, ordered=False)
+        return len(docs)
+
+    async def search(self, user_id: str, query: str, limit: int = 20, video_id: Optional[str] = None) -> List[dict]:
+        """Best-matching segments across the user's videos"""
+        criteria = {"user_id": user_id, "$text": {"$search": query}}
+        if video_id:
+            criteria["video_id"] = video_id
+        cursor = self.segments.find(
+            criteria,
+            {"video_id": 1, "youtube_url": 1, "start": 1, "end": 1, "text": 1, "score": {"$meta": "textScore"}},
+        ).sort([("score", {"$meta": "textScore"})]).limit(limit)
+        return [doc async for doc in cursor]
+
+    async def get(self, user_id: str, segment_id: str) -> Optional[dict]:
+        return await self.segments.find_one({"_id": segment_id, "user_id": user_id})
+
+    async def segments_between(self, user_id: str, video_id: str, start: float = 0, end: Optional[float] = None) -> List[dict]:
+        """Segments overlapping [start, end], in time order"""
+        criteria = {"user_id": user_id, "video_id": video_id, "end": {"$gt": start}}
+        if end is not None:
+            criteria["start"] = {"$lt": end}
+        cursor = self.segments.find(criteria, {"start": 1, "end": 1, "text": 1}).sort("start", 1)
+        return [doc async for doc in cursor]
+
+    async def text_between(self, user_id: str, video_id: str, start: float, end: Optional[float]) -> str:
+        """Transcript text of the segments overlapping [start, end]"""
+        return " ".join(doc["text"] for doc in await self.segments_between(user_id, video_id, start, end))
@@ -0,0 +1,281 @@
+"""Resumable chunked uploads of local video files, deduplicated by content hash"""
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK = 1024 * 1024
+
+
+class UploadError(Exception):
+    """A request the upload protocol cannot accept; `status_code` says why"""
+
+    def __init__(self, status_code: int, message: str, offset: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.offset = offset
+
+
+class UploadStore:
+    """Upload sessions in `upload_sessions`, finished files in `media_files` keyed by SHA-256.
+
+    Chunks must arrive in order: each PUT names the offset it starts at, which has to
+    equal the bytes received so far, so a client that lost its connection asks for the
+    current offset and carries on from there. Bytes go straight from the request stream
+    to the partial file while a running SHA-256 is updated, so nothing holds a whole
+    chunk, let alone a whole file, in memory. A session lock in the document keeps two
+    API nodes from writing the same upload at once.
+    """
+
+    def __init__(self, db, root_dir: str, max_size: int, max_chunk: int, session_ttl: timedelta,
+                 lock_seconds: float = 300):
+        self.sessions = db.upload_sessions
+        self.media = db.media_files
+        self.root_dir = root_dir
+        self.max_size = max_size
+        self.max_chunk = max_chunk
+        self.session_ttl = session_ttl
+        self.lock = timedelta(seconds=lock_seconds)
+        # Running hashes of sessions this process has written to, with the offset they cover
+        self._hashers: Dict[str, Tuple[int, "hashlib._Hash"]] = {}
+        os.makedirs(os.path.join(root_dir, "partial"), exist_ok=True)
+
+    async def ensure_indexes(self) -> None:
+        await self.sessions.create_index([("user_id", 1), ("created_at", -1)])
+        await self.sessions.create_index("expires_at")
+
+    def partial_path(self, session_id: str) -> str:
+        return os.path.join(self.root_dir, "partial", session_id)
+
+    def media_path(self, sha256: str) -> str:
+        return os.path.join(self.root_dir, sha256[:2], sha256[2:4], sha256)
+
+    async def create(self, user_id: str, filename: str, size: int, content_type: str) -> dict:
+        if size <= 0 or size > self.max_size:
+            raise UploadError(413, f"Uploads must be between 1 byte and {self.max_size} bytes")
+        await self.expire_stale()
+
+        now = datetime.utcnow()
+        session = {
+            "_id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "filename": filename,
+            "content_type": content_type,
+            "size": size,
+            "received": 0,
+            "status": "uploading",
+            "created_at": now,
+            "expires_at": now + self.session_ttl,
+        }
+        open(self.partial_path(session["_id"]), "wb").close()
+        await self.sessions.insert_one(session)
+        return session
+
+    async def get(self, user_id: str, session_id: str) -> dict:
+        session = await self.sessions.find_one({"_id": session_id, "user_id": user_id})
+        if not session:
+            raise UploadError(404, "Upload session not found")
+        return session
+
+    async def write_chunk(self, user_id: str, session_id: str, offset: int, chunks: AsyncIterator[bytes]) -> dict:
+        """Append a request body at `offset`; returns the updated session"""
+        session = await self.get(user_id, session_id)
+        if session["status"] != "uploading":
+            raise UploadError(409, f"Upload is {session['status']}", session["received"])
+        if offset != session["received"]:
+            raise UploadError(409, "Chunk does not start at the current offset", session["received"])
+
+        now = datetime.utcnow()
+        locked = await self.sessions.find_one_and_update(
+            {"_id": session_id, "received": offset, "status": "uploading",
+             "$or": [{"locked_until": None}, {"locked_until": {"$lt": now}}]},
+            {"$set": {"locked_until": now + self.lock}},
+        )
+        if locked is None:
+            raise UploadError(409, "Another chunk of this upload is being written", session["received"])
+
+        written = 0
+        try:
+            hasher = await self._hasher(session_id, offset)
+            # File I/O runs on a thread, so a slow disk never stalls the event loop
+            f = await asyncio.to_thread(self._open_at, self.partial_path(session_id), offset)
+            try:
+                async for data in chunks:
+                    written += len(data)
+                    if written > self.max_chunk or offset + written > session["size"]:
+                        raise UploadError(413, "Chunk exceeds the chunk size limit or the declared upload size", offset)
+                    await asyncio.to_thread(self._append, f, hasher, data)
+            finally:
+                await asyncio.to_thread(f.close)
+        except BaseException:
+            # The partial file was cut back to `offset`; the running hash no longer matches it
+            self._hashers.pop(session_id, None)
+            await self.sessions.update_one({"_id": session_id}, {"$unset": {"locked_until": ""}})
+            raise
+
+        self._hashers[session_id] = (offset + written, hasher)
+        return await self.sessions.find_one_and_update(
+            {"_id": session_id},
+            {"$set": {"received": offset + written, "expires_at": datetime.utcnow() + self.session_ttl},
+             "$unset": {"locked_until": ""}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    @staticmethod
+    def _open_at(path: str, offset: int):
+        f = open(path, "r+b")
+        f.seek(offset)
+        f.truncate()
+        return f
+
+    @staticmethod
+    def _append(f, hasher, data: bytes) -> None:
+        f.write(data)
+        hasher.update(data)
+
+    async def _hasher(self, session_id: str, offset: int):
+        """Running hash covering the first `offset` bytes, rebuilt from disk if this process lost it"""
+        cached = self._hashers.pop(session_id, None)
+        if cached and cached[0] == offset:
+            return cached[1]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._hash_prefix, self.partial_path(session_id), offset)
+
+    @staticmethod
+    def _hash_prefix(path: str, length: int):
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            remaining = length
+            while remaining > 0:
+                block = f.read(min(HASH_BLOCK, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+        return hasher
+
+    async def finalize(self, user_id: str, session_id: str, expected_sha256: Optional[str] = None) -> dict:
+        """Verify and store a complete upload; identical content is stored once"""
+        session = await self.get(user_id, session_id)
+        if session["status"] == "completed":
+            return await self.media.find_one({"_id": session["sha256"]})
+        if session["received"] != session["size"]:
+            raise UploadError(409, "Upload is incomplete", session["received"])
+
+        # Only one caller moves the file; the lease lets another take over if this node dies mid-way
+        now = datetime.utcnow()
+        claimed = await self.sessions.find_one_and_update(
+            {"_id": session_id, "received": session["size"], "$or": [
+                {"status": "uploading", "$or": [{"locked_until": None}, {"locked_until": {"$lt": now}}]},
+                {"status": "finalizing", "locked_until": {"$lt": now}},
+            ]},
+            {"$set": {"status": "finalizing", "locked_until": now + self.lock}},
+        )
+        if claimed is None:
+            session = await self.get(user_id, session_id)
+            if session["status"] == "completed":
+                return await self.media.find_one({"_id": session["sha256"]})
+            raise UploadError(409, "Upload is already being finalized", session["received"])
+
+        try:
+            sha256 = (await self._hasher(session_id, session["received"])).hexdigest()
+            self._hashers.pop(session_id, None)
+            if expected_sha256 and expected_sha256.lower() != sha256:
+                await self.abort(user_id, session_id)
+                raise UploadError(422, "Checksum mismatch, the upload was discarded")
+
+            now = datetime.utcnow()
+            existing = await self.media.find_one_and_update(
+                {"_id": sha256}, {"$addToSet": {"owners": user_id}, "$set": {"last_uploaded_at": now}},
+                return_document=ReturnDocument.AFTER,
+            )
+            if existing:
+                await asyncio.to_thread(os.remove, self.partial_path(session_id))
+                media = existing
+            else:
+                path = self.media_path(sha256)
+                await asyncio.to_thread(self._move, self.partial_path(session_id), path)
+                media = await self._record_media(sha256, path, session, user_id, now)
+        except UploadError:
+            raise
+        except BaseException:
+            await self.sessions.update_one(
+                {"_id": session_id, "status": "finalizing"},
+                {"$set": {"status": "uploading"}, "$unset": {"locked_until": ""}},
+            )
+            raise
+
+        await self.sessions.update_one(
+            {"_id": session_id},
+            {"$set": {"status": "completed", "sha256": sha256, "deduplicated": existing is not None,
+                      "completed_at": now}, "$unset": {"locked_until": ""}},
+        )
+        return {**media, "deduplicated": existing is not None}
+
+    @staticmethod
+    def _move(source: str, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.move(source, path)
+
+    async def _record_media(self, sha256: str, path: str, session: dict, user_id: str, now: datetime) -> dict:
+        update = {
+            "$addToSet": {"owners": user_id},
+            "$set": {"last_uploaded_at": now},
+            "$setOnInsert": {
+                "path": path,
+                "size": session["size"],
+                "filename": session["filename"],
+                "content_type": session["content_type"],
+                "created_at": now,
+            },
+        }
+        try:
+            return await self.media.find_one_and_update(
+                {"_id": sha256}, update, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # An identical upload finished at the same moment; both moved the same bytes into place
+            return await self.media.find_one_and_update(
+                {"_id": sha256}, update, return_document=ReturnDocument.AFTER
+            )
+
+    async def abort(self, user_id: str, session_id: str) -> None:
+        await self.get(user_id, session_id)
+        self._hashers.pop(session_id, None)
+        await self.sessions.delete_one({"_id": session_id})
+        try:
+            os.remove(self.partial_path(session_id))
+        except FileNotFoundError:
+            pass
+
+    async def expire_stale(self) -> int:
+        """Drop unfinished sessions nobody has written to within the session TTL, including those whose finalizer died"""
+        expired = 0
+        now = datetime.utcnow()
+        stale = {"expires_at": {"$lt": now}, "$or": [
+            {"status": "uploading"},
+            {"status": "finalizing", "locked_until": {"$lt": now}},
+        ]}
+        async for session in self.sessions.find(stale, {"_id": 1}):
+            # Matched again, so a finalizer that took the session over in between keeps it
+            deleted = await self.sessions.delete_one({"_id": session["_id"], **stale})
+            if deleted.deleted_count == 0:
+                continue
+            self._hashers.pop(session["_id"], None)
+            try:
+                os.remove(self.partial_path(session["_id"]))
+            except FileNotFoundError:
+                pass
+            expired += 1
+        if expired:
+            logger.info("Expired %d stale upload sessions", expired)
+        return expired
@@ -0,0 +1,37 @@
+"""Canonical YouTube video IDs so different URL spellings of one video compare equal"""
+import re
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+PATH_PREFIXES = ("/shorts/", "/embed/", "/live/", "/v/")
+
+
+def extract_video_id(url: str) -> Optional[str]:
+    """Return the 11-character video ID of a YouTube URL, or None if there is none"""
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or "").lower()
+    for prefix in ("www.", "m.", "music."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+
+    candidate = None
+    if host == "youtu.be":
+        candidate = parsed.path.lstrip("/").split("/")[0]
+    elif host in ("youtube.com", "youtube-nocookie.com"):
+        if parsed.path == "/watch":
+            candidate = (parse_qs(parsed.query).get("v") or [""])[0]
+        else:
+            for prefix in PATH_PREFIXES:
+                if parsed.path.startswith(prefix):
+                    candidate = parsed.path[len(prefix):].split("/")[0]
+                    break
+
+    if candidate and VIDEO_ID_RE.match(candidate):
+        return candidate
+    return None
+
+
+def video_key(url: str) -> str:
+    """Video ID when the URL has one, otherwise the trimmed URL itself"""
+    return extract_video_id(url) or url.strip()
@@ -0,0 +1,66 @@
+"""Video metadata stored once per video and per-user video history"""
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+class VideoMetadataStore:
+    """`video_metadata` holds one document per canonical video key (see video_ids.video_key).
+
+    Clips and history entries reference it by `video_id` instead of embedding a copy.
+    """
+
+    def __init__(self, db, collection: str = "video_metadata"):
+        self.metadata = db[collection]
+        self.history = db.videos
+
+    async def ensure_indexes(self) -> None:
+        # Partial, so un-migrated history rows without video_id do not collide
+        await self.history.create_index(
+            [("user_id", 1), ("video_id", 1)],
+            unique=True,
+            partialFilterExpression={"video_id": {"$exists": True}},
+        )
+        await self.history.create_index([("user_id", 1), ("last_viewed_at", -1)])
+
+    async def upsert(self, video_id: str, video_info: dict, source_url: str) -> None:
+        now = datetime.utcnow()
+        await self.metadata.update_one(
+            {"_id": video_id},
+            {
+                "$set": {"video_info": video_info, "source_url": source_url, "updated_at": now},
+                "$setOnInsert": {"created_at": now},
+            },
+            upsert=True,
+        )
+
+    async def get_many(self, video_ids: Iterable[str]) -> Dict[str, dict]:
+        """Batch fetch video_info for a set of video IDs in one query"""
+        ids = list(set(video_ids))
+        if not ids:
+            return {}
+        cursor = self.metadata.find({"_id": {"$in": ids}}, {"video_info": 1})
+        return {doc["_id"]: doc["video_info"] async for doc in cursor}
+
+    async def record_view(self, user_id: str, video_id: str, source_url: str) -> dict:
+        """Upsert the user's history entry for a video rather than appending a new row"""
+        now = datetime.utcnow()
+        update = {
+            "$set": {"youtube_url": source_url, "last_viewed_at": now},
+            "$setOnInsert": {"_id": str(uuid.uuid4()), "created_at": now},
+            "$inc": {"view_count": 1},
+        }
+        try:
+            return await self.history.find_one_and_update(
+                {"user_id": user_id, "video_id": video_id}, update,
+                upsert=True, return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # A concurrent first view inserted the row; this one becomes a plain update
+            return await self.history.find_one_and_update(
+                {"user_id": user_id, "video_id": video_id}, update,
+                return_document=ReturnDocument.AFTER,
+            )
@@ -0,0 +1,98 @@
+"""Multi-resolution waveform peaks in a compact binary layout
+
+Layout (little-endian):
+
+    magic      4s   b"PJWF"
+    version    u8   1
+    levels     u8   number of zoom levels, finest first
+    reserved   u16
+    rate       u32  sample rate the peaks were computed at
+    then per level:  samples_per_peak u32, peak count u32, byte offset u32
+    then per level:  count (min, max) pairs of int8
+
+At 8 kHz and 512 samples per peak the finest level has ~16 peaks a second, so two
+hours of audio takes ~225 KB, plus a third of that for the coarser levels.
+"""
+import struct
+from typing import List, Tuple
+
+import numpy as np
+
+MAGIC = b"PJWF"
+VERSION = 1
+SAMPLE_RATE = 8000
+SAMPLES_PER_PEAK = 512
+LEVEL_FACTOR = 4
+MIN_LEVEL_PEAKS = 256
+
+HEADER = struct.Struct("<4sBBHI")
+LEVEL = struct.Struct("<III")
+
+
+class PeakBuilder:
+    """Min/max peaks of a 16-bit mono stream, fed one block at a time"""
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, samples_per_peak: int = SAMPLES_PER_PEAK):
+        self.sample_rate = sample_rate
+        self.samples_per_peak = samples_per_peak
+        self._carry = np.zeros(0, dtype=np.int16)
+        self._mins: List[np.ndarray] = []
+        self._maxs: List[np.ndarray] = []
+
+    def feed(self, samples: np.ndarray) -> None:
+        samples = np.concatenate([self._carry, samples])
+        whole = len(samples) // self.samples_per_peak * self.samples_per_peak
+        self._carry = samples[whole:]
+        if whole:
+            frames = samples[:whole].reshape(-1, self.samples_per_peak)
+            # 16-bit to 8-bit by dropping the low byte keeps the sign and the shape of the envelope
+            self._mins.append((frames.min(axis=1) >> 8).astype(np.int8))
+            self._maxs.append((frames.max(axis=1) >> 8).astype(np.int8))
+
+    def feed_bytes(self, data: bytes) -> None:
+        # Buffered pipe reads return whole blocks, so only the final read can end mid-sample
+        self.feed(np.frombuffer(data[:len(data) // 2 * 2], dtype=np.int16))
+
+    def finish(self) -> None:
+        if len(self._carry):
+            self._mins.append(np.array([self._carry.min() >> 8], dtype=np.int8))
+            self._maxs.append(np.array([self._carry.max() >> 8], dtype=np.int8))
+            self._carry = np.zeros(0, dtype=np.int16)
+
+    def levels(self) -> List[Tuple[int, np.ndarray, np.ndarray]]:
+        """(samples_per_peak, mins, maxs) per zoom level, each LEVEL_FACTOR times coarser than the last"""
+        mins = np.concatenate(self._mins) if self._mins else np.zeros(0, dtype=np.int8)
+        maxs = np.concatenate(self._maxs) if self._maxs else np.zeros(0, dtype=np.int8)
+        levels = [(self.samples_per_peak, mins, maxs)]
+        while len(mins) >= MIN_LEVEL_PEAKS * LEVEL_FACTOR:
+            # Pad with the last value so the tail folds in without a reshape remainder
+            pad = -len(mins) % LEVEL_FACTOR
+            mins = np.pad(mins, (0, pad), mode="edge").reshape(-1, LEVEL_FACTOR).min(axis=1)
+            maxs = np.pad(maxs, (0, pad), mode="edge").reshape(-1, LEVEL_FACTOR).max(axis=1)
+            levels.append((levels[-1][0] * LEVEL_FACTOR, mins, maxs))
+        return levels
+
+    def encode(self) -> bytes:
+        levels = self.levels()
+        offset = HEADER.size + LEVEL.size * len(levels)
+        table, data = [], []
+        for samples_per_peak, mins, maxs in levels:
+            pairs = np.empty(len(mins) * 2, dtype=np.int8)
+            pairs[0::2], pairs[1::2] = mins, maxs
+            table.append(LEVEL.pack(samples_per_peak, len(mins), offset))
+            data.append(pairs.tobytes())
+            offset += len(pairs)
+        return HEADER.pack(MAGIC, VERSION, len(levels), 0, self.sample_rate) + b"".join(table) + b"".join(data)
+
+
+def decode(blob: bytes) -> dict:
+    """Inverse of PeakBuilder.encode, for tests and tooling"""
+    magic, version, count, _, rate = HEADER.unpack_from(blob, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a version 1 waveform blob")
+    levels = []
+    for index in range(count):
+        samples_per_peak, peaks, offset = LEVEL.unpack_from(blob, HEADER.size + index * LEVEL.size)
+        pairs = np.frombuffer(blob, dtype=np.int8, count=peaks * 2, offset=offset)
+        levels.append({"samples_per_peak": samples_per_peak, "mins": pairs[0::2], "maxs": pairs[1::2]})
+    return {"sample_rate": rate, "levels": levels}
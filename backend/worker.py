@@ -0,0 +1,40 @@
+"""Standalone render node: claims clip jobs from the shared queue
+
+Run `python worker.py` on as many nodes as needed, with the same MONGO_URL and
+DB_NAME as the API. API nodes can then set EMBEDDED_WORKER=false.
+"""
+import asyncio
+import logging
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import server
+from progress_events import ProgressEvents
+
+
+async def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    mongo_client = AsyncIOMotorClient(server.MONGO_URL)
+    db = mongo_client[server.DB_NAME]
+
+    queue = server.build_job_queue(db)
+    await queue.ensure_indexes()
+    renderer = server.build_renderer(db, ProgressEvents(db))
+    await renderer.artifacts.ensure_indexes()
+    worker = server.build_worker(queue, renderer)
+
+    server.janitor.start()
+    server.stream_resolver.start()
+    try:
+        await worker.run_forever()
+    finally:
+        await worker.stop()
+        await server.janitor.stop()
+        await server.stream_resolver.stop()
+        if server.analysis_pool:
+            server.analysis_pool.close()
+        mongo_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
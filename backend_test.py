@@ -5,6 +5,7 @@ import time
 import random
 import string
 import os
+import hashlib
 from datetime import datetime
 
 # Get the backend URL from the frontend .env file
@@ -125,6 +126,7 @@ def test_user_login():
     if response.status_code == 200:
         data = response.json()
         test_data["user_token"] = data.get("access_token")
+        test_data["refresh_token"] = data.get("refresh_token")
         return {
             "success": True,
             "status_code": response.status_code,
@@ -474,6 +476,331 @@ def test_error_invalid_clip_times():
             "response": response.json() if response.text else None
         }
 
+# Test 16: Admin - Disk Metrics
+def test_admin_disk_metrics():
+    if not test_data.get("admin_token"):
+        return {"success": False, "message": "No admin token available for disk metrics test"}
+    
+    headers = {"Authorization": f"Bearer {test_data['admin_token']}"}
+    response = requests.get(f"{API_URL}/admin/disk", headers=headers)
+    
+    if response.status_code == 200 and "disk_usage_ratio" in response.json():
+        data = response.json()
+        return {
+            "success": True,
+            "status_code": response.status_code,
+            "message": "Got disk metrics successfully",
+            "metrics": data
+        }
+    else:
+        return {
+            "success": False,
+            "status_code": response.status_code,
+            "message": "Failed to get disk metrics",
+            "response": response.json() if response.text else None
+        }
+
+# Test 17: Clip Progress Stream
+def test_clip_progress_stream():
+    if not test_data.get("user_token") or not test_data.get("clip_id"):
+        return {"success": False, "message": "No user token or clip ID available for progress stream test"}
+    
+    headers = {"Authorization": f"Bearer {test_data['user_token']}"}
+    response = requests.get(f"{API_URL}/video/clips/{test_data['clip_id']}/events", headers=headers, stream=True, timeout=60)
+    
+    if response.status_code != 200:
+        return {
+            "success": False,
+            "status_code": response.status_code,
+            "message": "Failed to open clip progress stream",
+            "response": response.text
+        }
+    
+    stages = []
+    for line in response.iter_lines(decode_unicode=True):
+        if line and line.startswith("event: "):
+            stages.append(line[len("event: "):])
+            if stages[-1] in ("done", "failed"):
+                break
+    response.close()
+    
+    return {
+        "success": bool(stages) and stages[-1] == "done",
+        "status_code": response.status_code,
+        "message": "Streamed clip progress until completion",
+        "stages": stages
+    }
+
+# Test 18: Token Refresh
+def test_token_refresh():
+    if not test_data.get("refresh_token"):
+        return {"success": False, "message": "No refresh token available for token refresh test"}
+    
+    response = requests.post(f"{API_URL}/auth/refresh", json={"refresh_token": test_data["refresh_token"]})
+    
+    if response.status_code != 200:
+        return {
+            "success": False,
+            "status_code": response.status_code,
+            "message": "Failed to refresh tokens",
+            "response": response.json() if response.text else None
+        }
+    
+    data = response.json()
+    # Refresh tokens rotate, so the old one must no longer work
+    reuse = requests.post(f"{API_URL}/auth/refresh", json={"refresh_token": test_data["refresh_token"]})
+    test_data["user_token"] = data.get("access_token")
+    test_data["refresh_token"] = data.get("refresh_token")
+    
+    return {
+        "success": reuse.status_code == 401,
+        "status_code": response.status_code,
+        "message": "Refreshed tokens and rejected reuse of the old refresh token",
+        "reuse_status_code": reuse.status_code
+    }
+
+# Test 19: Hook Titles
+def test_ai_hook_titles():
+    if not test_data.get("user_token"):
+        return {"success": False, "message": "No user token available for hook titles test"}
+    
+    headers = {"Authorization": f"Bearer {test_data['user_token']}"}
+    payload = {
+        "transcripts": [
+            "Today we test three budget microphones for podcasting and compare the sound quality.",
+            "This simple stretching routine fixes lower back pain in five minutes a day."
+        ]
+    }
+    
+    response = requests.post(f"{API_URL}/ai/hook-titles", json=payload, headers=headers)
+    
+    if response.status_code != 200:
+        return {
+            "success": False,
+            "status_code": response.status_code,
+            "message": "Failed to generate hook titles",
+            "response": response.json() if response.text else None
+        }
+    
+    titles = response.json().get("titles", [])
+    return {
+        "success": len(titles) == 2 and all(titles),
+        "status_code": response.status_code,
+        "message": "Generated hook title candidates for every clip in one request",
+        "response": response.json()
+    }
+
+# Test 20: Transcript Search
+def test_transcript_search():
+    if not test_data.get("user_token"):
+        return {"success": False, "message": "No user token available for transcript search test"}
+    
+    headers = {"Authorization": f"Bearer {test_data['user_token']}"}
+    caption = requests.post(f"{API_URL}/ai/auto-caption", json={"youtube_url": test_data["youtube_url"]}, headers=headers)
+    if caption.status_code != 200:
+        return {
+            "success": False,
+            "status_code": caption.status_code,
+            "message": "Failed to caption video for transcript search",
+            "response": caption.json() if caption.text else None
+        }
+    
+    response = requests.get(f"{API_URL}/transcripts/search", params={"q": "amazing"}, headers=headers)
+    
+    if response.status_code != 200:
+        return {
+            "success": False,
+            "status_code": response.status_code,
+            "message": "Failed to search transcripts",
+            "response": response.json() if response.text else None
+        }
+    
+    hits = response.json().get("hits", [])
+    return {
+        "success": any(hit["video_id"] == caption.json()["video_id"] for hit in hits),
+        "status_code": response.status_code,
+        "message": f"Found {len(hits)} transcript hits",
+        "response": response.json()
+    }
+
+# Test 21: Highlight Scoring
+def test_ai_highlights():
+    if not test_data.get("user_token"):
+        return {"success": False, "message": "No user token available for highlights test"}
+    
+    headers = {"Authorization": f"Bearer {test_data['user_token']}"}
+    payload = {"youtube_url": test_data["youtube_url"], "clip_length": 5, "count": 2}
+    
+    response = requests.post(f"{API_URL}/ai/highlights", json=payload, headers=headers)
+    
+    if response.status_code != 200:
+        return {
+            "success": False,
+            "status_code": response.status_code,
+            "message": "Failed to score highlights",
+            "response": response.json() if response.text else None
+        }
+    
+    highlights = response.json().get("highlights", [])
+    # Windows must not overlap
+    ordered = sorted(highlights, key=lambda h: h["start"])
+    disjoint = all(a["end"] <= b["start"] for a, b in zip(ordered, ordered[1:]))
+    return {
+        "success": bool(highlights) and disjoint,
+        "status_code": response.status_code,
+        "message": f"Scored {len(highlights)} non-overlapping highlight windows",
+        "response": response.json()
+    }
+
+# Test 22: Resumable Upload
+def test_resumable_upload():
+    if not test_data.get("user_token"):
+        return {"success": False, "message": "No user token available for upload test"}
+    
+    headers = {"Authorization": f"Bearer {test_data['user_token']}"}
+    content = os.urandom(300 * 1024)
+    session = requests.post(
+        f"{API_URL}/uploads", json={"filename": "test.mp4", "size": len(content)}, headers=headers
+    )
+    if session.status_code != 200:
+        return {
+            "success": False,
+            "status_code": session.status_code,
+            "message": "Failed to create upload session",
+            "response": session.json() if session.text else None
+        }
+    
+    upload_id = session.json()["upload_id"]
+    half = len(content) // 2
+    requests.put(f"{API_URL}/uploads/{upload_id}", params={"offset": 0}, data=content[:half], headers=headers)
+    # Resume from the offset the server reports
+    offset = requests.get(f"{API_URL}/uploads/{upload_id}", headers=headers).json()["offset"]
+    requests.put(f"{API_URL}/uploads/{upload_id}", params={"offset": offset}, data=content[offset:], headers=headers)
+    
+    response = requests.post(
+        f"{API_URL}/uploads/{upload_id}/complete",
+        json={"sha256": hashlib.sha256(content).hexdigest()},
+        headers=headers
+    )
+    
+    return {
+        "success": response.status_code == 200 and offset == half,
+        "status_code": response.status_code,
+        "message": "Uploaded a file in two chunks and verified its checksum",
+        "response": response.json() if response.text else None
+    }
+
+# Test 23: Cancel Clip
+def test_cancel_clip():
+    if not test_data.get("user_token"):
+        return {"success": False, "message": "No user token available for cancel clip test"}
+    
+    headers = {"Authorization": f"Bearer {test_data['user_token']}"}
+    clip_data = {
+        "youtube_url": test_data["youtube_url"],
+        "start_time": 50,
+        "end_time": 60,
+        "clip_name": f"Cancelled Clip {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+    }
+    created = requests.post(f"{API_URL}/video/clip", json=clip_data, headers=headers)
+    if created.status_code != 200:
+        return {
+            "success": False,
+            "status_code": created.status_code,
+            "message": "Failed to create clip to cancel",
+            "response": created.json() if created.text else None
+        }
+    
+    clip_id = created.json()["clip_id"]
+    response = requests.post(f"{API_URL}/video/clips/{clip_id}/cancel", headers=headers)
+    # A clip that finished rendering first can no longer be cancelled
+    status_after = requests.get(f"{API_URL}/video/clips", headers=headers).json()["clips"]
+    status_after = next((clip["status"] for clip in status_after if clip["id"] == clip_id), None)
+    
+    return {
+        "success": (response.status_code == 200 and status_after == "cancelled") or response.status_code == 409,
+        "status_code": response.status_code,
+        "message": "Cancelled a queued clip",
+        "clip_status": status_after
+    }
+
+# Test 24: Admin - Scheduler Stats
+def test_admin_scheduler_stats():
+    if not test_data.get("admin_token"):
+        return {"success": False, "message": "No admin token available for scheduler stats test"}
+    
+    headers = {"Authorization": f"Bearer {test_data['admin_token']}"}
+    response = requests.get(f"{API_URL}/admin/scheduler", headers=headers)
+    
+    if response.status_code == 200 and "queue_wait_seconds" in response.json():
+        data = response.json()
+        return {
+            "success": True,
+            "status_code": response.status_code,
+            "message": "Got scheduler stats successfully",
+            "queue_wait_seconds": data["queue_wait_seconds"],
+            "actual_to_estimated_cost": data["actual_to_estimated_cost"]
+        }
+    else:
+        return {
+            "success": False,
+            "status_code": response.status_code,
+            "message": "Failed to get scheduler stats",
+            "response": response.json() if response.text else None
+        }
+
+# Test 25: Batch Video Info
+def test_batch_video_info():
+    if not test_data.get("user_token"):
+        return {"success": False, "message": "No user token available for batch video info test"}
+    
+    headers = {"Authorization": f"Bearer {test_data['user_token']}"}
+    batch_data = {"urls": [test_data["youtube_url"]], "details": False}
+    
+    response = requests.post(f"{API_URL}/video/info/batch", json=batch_data, headers=headers, stream=True)
+    
+    if response.status_code == 200:
+        results = [json.loads(line) for line in response.iter_lines() if line]
+        videos = [r for r in results if r.get("type") == "video"]
+        return {
+            "success": bool(results) and results[-1].get("type") == "done" and len(videos) == 1,
+            "status_code": response.status_code,
+            "message": "Got batch video info successfully",
+            "results": results
+        }
+    else:
+        return {
+            "success": False,
+            "status_code": response.status_code,
+            "message": "Failed to get batch video info",
+            "response": response.json() if response.text else None
+        }
+
+# Test 26: Admin - Stream URL Metrics
+def test_admin_stream_url_metrics():
+    if not test_data.get("admin_token"):
+        return {"success": False, "message": "No admin token available for stream URL metrics test"}
+    
+    headers = {"Authorization": f"Bearer {test_data['admin_token']}"}
+    response = requests.get(f"{API_URL}/admin/stream-urls", headers=headers)
+    
+    if response.status_code == 200 and "cached_urls" in response.json():
+        data = response.json()
+        return {
+            "success": True,
+            "status_code": response.status_code,
+            "message": "Got stream URL metrics successfully",
+            "hits": data["hits"],
+            "misses": data["misses"]
+        }
+    else:
+        return {
+            "success": False,
+            "status_code": response.status_code,
+            "message": "Failed to get stream URL metrics",
+            "response": response.json() if response.text else None
+        }
+
 # Run all tests
 def run_all_tests():
     # Authentication tests
@@ -481,19 +808,32 @@ def run_all_tests():
     run_test("User Login", test_user_login)
     run_test("Admin Login", test_admin_login)
     run_test("Get Current User", test_get_current_user)
+    run_test("Token Refresh", test_token_refresh)
     
     # YouTube integration tests
     run_test("YouTube Video Info", test_youtube_video_info)
+    run_test("Batch Video Info", test_batch_video_info)
     run_test("Create Video Clip", test_create_video_clip)
     run_test("Get User Clips", test_get_user_clips)
+    run_test("Clip Progress Stream", test_clip_progress_stream)
+    run_test("Cancel Clip", test_cancel_clip)
     
     # Admin feature tests
     run_test("Admin - Get All Users", test_admin_get_users)
     run_test("Admin - Get Platform Stats", test_admin_get_stats)
+    run_test("Admin - Disk Metrics", test_admin_disk_metrics)
+    run_test("Admin - Scheduler Stats", test_admin_scheduler_stats)
+    run_test("Admin - Stream URL Metrics", test_admin_stream_url_metrics)
     
     # AI feature tests
     run_test("AI - Auto Caption", test_ai_auto_caption)
     run_test("AI - Generate Script", test_ai_generate_script)
+    run_test("AI - Hook Titles", test_ai_hook_titles)
+    run_test("AI - Transcript Search", test_transcript_search)
+    run_test("AI - Highlight Scoring", test_ai_highlights)
+    
+    # Upload tests
+    run_test("Resumable Upload", test_resumable_upload)
     
     # Security tests
     run_test("Security - Invalid Token", test_security_invalid_token)
@@ -190,10 +190,11 @@ export const AppProvider = ({ children }) => {
         password
       });
       
-      const { access_token, user: userData } = response.data;
+      const { access_token, refresh_token, user: userData } = response.data;
       
-      // Store token
+      // Store tokens
       localStorage.setItem('token', access_token);
+      localStorage.setItem('refresh_token', refresh_token);
       localStorage.setItem('user', JSON.stringify(userData));
       
       // Set axios default header
@@ -220,9 +221,10 @@ export const AppProvider = ({ children }) => {
         language_preference: language
       });
       
-      const { access_token, user: userData } = response.data;
+      const { access_token, refresh_token, user: userData } = response.data;
       
       localStorage.setItem('token', access_token);
+      localStorage.setItem('refresh_token', refresh_token);
       localStorage.setItem('user', JSON.stringify(userData));
       
       axios.defaults.headers.common['Authorization'] = `Bearer ${access_token}`;
@@ -239,13 +241,52 @@ export const AppProvider = ({ children }) => {
   };
 
   const logout = () => {
+    const refresh_token = localStorage.getItem('refresh_token');
+    axios.post(`${API_BASE_URL}/api/auth/logout`, { refresh_token }).catch(() => {});
     localStorage.removeItem('token');
+    localStorage.removeItem('refresh_token');
     localStorage.removeItem('user');
     delete axios.defaults.headers.common['Authorization'];
     setUser(null);
     toast.success('Logged out successfully!');
   };
 
+  // Access tokens are short-lived: on a 401, trade the refresh token for a new pair once and retry
+  useEffect(() => {
+    let refreshing = null;
+    const interceptor = axios.interceptors.response.use(
+      (response) => response,
+      async (error) => {
+        const original = error.config;
+        const refresh_token = localStorage.getItem('refresh_token');
+        const isAuthCall = original?.url?.includes('/api/auth/');
+        if (error.response?.status !== 401 || !refresh_token || original._retried || isAuthCall) {
+          return Promise.reject(error);
+        }
+        original._retried = true;
+        try {
+          refreshing = refreshing || axios.post(`${API_BASE_URL}/api/auth/refresh`, { refresh_token });
+          const { data } = await refreshing;
+          localStorage.setItem('token', data.access_token);
+          localStorage.setItem('refresh_token', data.refresh_token);
+          axios.defaults.headers.common['Authorization'] = `Bearer ${data.access_token}`;
+          original.headers['Authorization'] = `Bearer ${data.access_token}`;
+          return axios(original);
+        } catch (refreshError) {
+          localStorage.removeItem('token');
+          localStorage.removeItem('refresh_token');
+          localStorage.removeItem('user');
+          delete axios.defaults.headers.common['Authorization'];
+          setUser(null);
+          return Promise.reject(error);
+        } finally {
+          refreshing = null;
+        }
+      }
+    );
+    return () => axios.interceptors.response.eject(interceptor);
+  }, [API_BASE_URL]);
+
   // Initialize user from localStorage
   useEffect(() => {
     const token = localStorage.getItem('token');
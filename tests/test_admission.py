@@ -0,0 +1,95 @@
+"""Pure admission helpers: token buckets, duplicate fingerprints, token revocation, cost estimates and media URL expiry"""
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import rate_limiter
+from auth_tokens import RevocationFilter
+from idempotency import clip_fingerprint
+from scheduling import estimate_clip_cost, estimate_hls_cost
+from stream_urls import url_expiry
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_refills_at_its_rate(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    backend = rate_limiter.MemoryBackend()
+    bucket = rate_limiter.per_minute("user:a", 60, 2)
+
+    def consume():
+        return asyncio.run(backend.consume([bucket]))
+
+    assert consume().allowed and consume().allowed
+    rejected = consume()
+    assert not rejected.allowed and rejected.retry_after == 1.0
+    clock.now += 0.5
+    assert not consume().allowed
+    clock.now += 0.5
+    assert consume().allowed
+
+
+def test_rejected_requests_spend_no_tokens(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    backend = rate_limiter.MemoryBackend()
+    user = rate_limiter.per_minute("user:a", 60, 5)
+    endpoint = rate_limiter.per_minute("global", 60, 1)
+
+    assert asyncio.run(backend.consume([user, endpoint])).allowed
+    assert not asyncio.run(backend.consume([user, endpoint])).allowed
+    # The endpoint bucket refused, so the user's own bucket still has its 4 tokens
+    assert backend._state["user:a"][0] == 4
+
+
+def test_idle_buckets_are_dropped(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    backend = rate_limiter.MemoryBackend(sweep_interval=10)
+    asyncio.run(backend.consume([rate_limiter.per_minute("user:a", 60, 2)]))
+    clock.now += 60
+    asyncio.run(backend.consume([rate_limiter.per_minute("user:b", 60, 2)]))
+    assert list(backend._state) == ["user:b"]
+
+
+def test_clip_fingerprint_ignores_feature_order_and_float_noise():
+    base = clip_fingerprint("u1", "yt:abc", 10, 20, ["hook_titles", "auto_captions"])
+    assert clip_fingerprint("u1", "yt:abc", 10.0001, 20, ["auto_captions", "hook_titles", "hook_titles"]) == base
+    assert clip_fingerprint("u2", "yt:abc", 10, 20, ["hook_titles", "auto_captions"]) != base
+    assert clip_fingerprint("u1", "yt:abc", 10, None, ["hook_titles", "auto_captions"]) != base
+
+
+def test_user_revocation_uses_whole_second_iat():
+    revoked = RevocationFilter(SimpleNamespace(revoked_tokens=None), ttl=timedelta(hours=1))
+    cutoff = datetime(2026, 1, 1, 12, 0, 0, 700000)
+    revoked._add({"kind": "user", "user_id": "u1", "not_before": cutoff, "expires_at": cutoff + timedelta(hours=1)})
+
+    def iat(moment):
+        return int((moment - datetime(1970, 1, 1)).total_seconds())
+
+    assert revoked.is_revoked({"sub": "u1", "iat": iat(datetime(2026, 1, 1, 11, 59, 59))})
+    # Issued in the cutoff's own second, e.g. the login right after a password change
+    assert not revoked.is_revoked({"sub": "u1", "iat": iat(datetime(2026, 1, 1, 12, 0, 0, 900000))})
+    assert not revoked.is_revoked({"sub": "u2", "iat": 0})
+
+
+def test_cost_estimates_grow_with_length_and_features():
+    short = estimate_clip_cost(600, 30, 40, [])
+    assert estimate_clip_cost(600, 30, 90, []) > short
+    assert estimate_clip_cost(600, 30, 40, ["background_removal"]) > short
+    # An open-ended clip runs to the end of the video
+    assert estimate_clip_cost(600, 0, None, []) == estimate_clip_cost(600, 0, 600, [])
+    assert estimate_hls_cost(600, 0, 60) > 0
+
+
+def test_url_expiry_from_query_or_path():
+    assert url_expiry("https://r1.googlevideo.com/videoplayback?expire=1760000000&itag=18") == 1760000000
+    assert url_expiry("https://manifest.googlevideo.com/api/manifest/hls/expire/1760000000/ei/x/file/index.m3u8") == 1760000000
+    assert url_expiry("https://example.com/video.mp4") is None
@@ -0,0 +1,30 @@
+"""AnalysisPool recovery: a dead worker fails its own job, not every analysis after it"""
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pytest
+
+from analysis_pool import AnalysisPool
+
+
+def frame_means(frames):
+    return [float(frame.mean()) for frame in frames]
+
+
+def crash(frames):
+    os._exit(1)
+
+
+def test_pool_is_rebuilt_after_a_worker_dies():
+    async def scenario():
+        pool = AnalysisPool(1, memory_limit_mb=0)
+        try:
+            with pytest.raises(BrokenProcessPool):
+                await pool.map_batches(crash, [np.zeros((1, 2, 2), np.uint8)])
+            return await pool.map_batches(frame_means, [np.ones((2, 2, 2), np.uint8)])
+        finally:
+            pool.close()
+
+    assert asyncio.run(scenario()) == [[1.0, 1.0]]
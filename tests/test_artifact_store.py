@@ -0,0 +1,72 @@
+"""ArtifactStore: shared renders are reference counted, and one renderer at a time holds an artifact's lease"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+from mongomock_motor import AsyncMongoMockClient
+
+from artifact_store import ArtifactStore
+
+
+def store(tmp_path):
+    return ArtifactStore(AsyncMongoMockClient()["test"], str(tmp_path / "artifacts"), poll_interval=0.01)
+
+
+async def rendered(artifacts, tmp_path, key):
+    source = tmp_path / "render.mp4"
+    source.write_bytes(b"clip")
+    return await artifacts.publish(key, str(source), ".mp4")
+
+
+def test_file_is_removed_with_its_last_reference(tmp_path):
+    async def scenario():
+        artifacts = store(tmp_path)
+        # Acquiring twice, as a retried job does, still counts one reference
+        for clip_id in ("c1", "c1", "c2"):
+            await artifacts.acquire("k", clip_id)
+        artifact = await rendered(artifacts, tmp_path, "k")
+        first = await artifacts.release("k", "c1")
+        exists_after_first = os.path.exists(artifact["path"])
+        last = await artifacts.release("k", "c2")
+        return artifact, first, exists_after_first, last
+
+    artifact, first, exists_after_first, last = asyncio.run(scenario())
+    assert artifact["refs"] == ["c1", "c2"]
+    assert not first and exists_after_first
+    assert last and not os.path.exists(artifact["path"])
+
+
+def test_render_lease_goes_to_one_owner_until_it_expires(tmp_path):
+    async def scenario():
+        artifacts = store(tmp_path)
+        await artifacts.acquire("k", "c1")
+        await artifacts.acquire("k", "c2")
+        claims = [await artifacts.claim_render("k", "c1"), await artifacts.claim_render("k", "c2")]
+        # c1's worker died: once its lease runs out c2 takes over, and c1 can no longer renew
+        await artifacts.artifacts.update_one(
+            {"_id": "k"}, {"$set": {"render_lease_expires_at": datetime.utcnow() - timedelta(seconds=1)}}
+        )
+        claims.append(await artifacts.claim_render("k", "c2"))
+        return claims, await artifacts.renew_render("k", "c1"), await artifacts.renew_render("k", "c2")
+
+    claims, renewed_by_dead, renewed_by_owner = asyncio.run(scenario())
+    assert claims == [True, False, True]
+    assert not renewed_by_dead and renewed_by_owner
+
+
+def test_waiters_get_the_shared_render_or_take_over_a_failed_one(tmp_path):
+    async def scenario():
+        artifacts = store(tmp_path)
+        for clip_id in ("c1", "c2", "c3"):
+            await artifacts.acquire("k", clip_id)
+        assert await artifacts.wait_ready("k", owner="c1") is None
+        waiter = asyncio.create_task(artifacts.wait_ready("k", owner="c2"))
+        await asyncio.sleep(0.05)
+        await artifacts.mark_failed("k", owner="c1")
+        # The waiter renders it itself rather than waiting for a render nobody is doing
+        taken_over = await asyncio.wait_for(waiter, 1)
+        await rendered(artifacts, tmp_path, "k")
+        return taken_over, await artifacts.wait_ready("k", owner="c3")
+
+    taken_over, shared = asyncio.run(scenario())
+    assert taken_over is None and shared["status"] == "ready"
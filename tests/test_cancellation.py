@@ -0,0 +1,58 @@
+"""cancellation.popen: cancelling the token or passing the deadline kills the whole process group"""
+import subprocess
+import threading
+import time
+
+import pytest
+
+import cancellation
+from cancellation import Cancelled, CancelToken, DeadlineExceeded
+
+# The shell starts a grandchild, as yt-dlp does with ffmpeg, and reports its pid
+SPAWNS_GRANDCHILD = ["sh", "-c", "sleep 30 & echo $!; wait"]
+
+
+def gone(pid: int, within: float = 2.0) -> bool:
+    """Whether pid dies within the given time; SIGKILL reaches the rest of a group asynchronously"""
+    give_up = time.monotonic() + within
+    while time.monotonic() < give_up:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                # An orphan nobody has reaped yet is dead all the same
+                if f.read().rsplit(")", 1)[1].split()[0] == "Z":
+                    return True
+        except FileNotFoundError:
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def start_and_wait(token: CancelToken, pids: list, timeout=None) -> None:
+    """Run the shell under token, noting its grandchild's pid, until something kills it"""
+    with cancellation.bound(token):
+        with cancellation.popen(SPAWNS_GRANDCHILD, timeout=timeout, stdout=subprocess.PIPE) as process:
+            pids.append(int(process.stdout.readline()))
+            process.wait()
+
+
+def test_cancel_kills_children_of_children():
+    token, pids = CancelToken(), []
+    threading.Timer(0.2, token.cancel).start()
+    with pytest.raises(Cancelled):
+        start_and_wait(token, pids)
+    assert gone(pids[0])
+
+
+def test_deadline_kills_the_group_and_says_so():
+    pids = []
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        start_and_wait(CancelToken(), pids, timeout=0.2)
+    assert time.monotonic() - started < 5 and gone(pids[0])
+
+
+def test_cancelled_token_refuses_to_start():
+    token = CancelToken()
+    token.cancel("client disconnected")
+    with cancellation.bound(token), pytest.raises(Cancelled, match="client disconnected"):
+        cancellation.run(["true"])
@@ -0,0 +1,33 @@
+"""Highlight requests: score weights are validated up front and the endpoint has its own rate limit"""
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+import server
+
+
+def test_weights_name_known_features():
+    request = server.HighlightRequest(youtube_url="https://youtu.be/x", weights={"audio_energy": 0.5, "keywords": 0})
+    assert request.weights == {"audio_energy": 0.5, "keywords": 0.0}
+    with pytest.raises(ValidationError, match="unknown feature"):
+        server.HighlightRequest(youtube_url="https://youtu.be/x", weights={"loudness": 1.0})
+    with pytest.raises(ValidationError, match="must not be negative"):
+        server.HighlightRequest(youtube_url="https://youtu.be/x", weights={"scene_cuts": -1.0})
+    with pytest.raises(ValidationError):
+        server.HighlightRequest(youtube_url="https://youtu.be/x", weights={"scene_cuts": "loud"})
+
+
+def test_bad_weights_are_a_422():
+    server.app.dependency_overrides[server.get_current_active_user] = lambda: {"_id": "u1"}
+    try:
+        response = TestClient(server.app).post(
+            "/api/ai/highlights", json={"youtube_url": "https://youtu.be/x", "weights": {"speech_rate": -0.5}}
+        )
+    finally:
+        server.app.dependency_overrides.clear()
+    assert response.status_code == 422
+
+
+def test_highlights_have_a_tighter_bucket_than_video_info():
+    highlights, video_info = server.RATE_LIMITS["highlights"], server.RATE_LIMITS["video_info"]
+    assert highlights["user"] < video_info["user"] and highlights["global"] < video_info["global"]
@@ -0,0 +1,55 @@
+"""HookTitleGenerator batching: callers that give up or fail must never strand the others"""
+import asyncio
+import json
+
+from hook_titles import HookTitleGenerator, extractive_titles
+
+
+class SlowProvider:
+    name = "test"
+
+    def __init__(self, fail: bool = False):
+        self.release = asyncio.Event()
+        self.fail = fail
+        self.calls = 0
+
+    async def stream(self, messages, label, context, options):
+        self.calls += 1
+        await self.release.wait()
+        if self.fail:
+            raise RuntimeError("model unavailable")
+        clips = json.loads(messages[1]["content"].split("\n", 1)[1])["clips"]
+        yield json.dumps({"clips": [{"id": clip["id"], "titles": [f"Title for {clip['id']}"]} for clip in clips]})
+
+
+def test_cancelled_caller_does_not_strand_a_full_batch():
+    async def scenario():
+        provider = SlowProvider()
+        generator = HookTitleGenerator(provider, count=1, batch_size=1)
+        first = asyncio.create_task(generator.titles("a transcript about rockets"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        second = asyncio.create_task(generator.titles("a transcript about rockets"))
+        await asyncio.sleep(0.01)
+        provider.release.set()
+        titles = await asyncio.wait_for(second, 1)
+        return provider.calls, titles, generator._inflight
+
+    calls, titles, inflight = asyncio.run(scenario())
+    assert calls == 1 and titles == ["Title for c0"] and inflight == {}
+
+
+def test_failed_request_falls_back_without_caching():
+    async def scenario():
+        provider = SlowProvider(fail=True)
+        provider.release.set()
+        generator = HookTitleGenerator(provider, count=2, batch_size=1)
+        transcript = "Rockets launch every week now. Rockets are cheap."
+        first = await asyncio.wait_for(generator.titles(transcript), 1)
+        await asyncio.wait_for(generator.titles(transcript), 1)
+        return first, extractive_titles(transcript, 2), provider.calls, generator._inflight
+
+    first, fallback, calls, inflight = asyncio.run(scenario())
+    assert first == fallback
+    # The fallback was not cached, so the second call asked the model again
+    assert calls == 2 and inflight == {}
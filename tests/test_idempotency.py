@@ -0,0 +1,49 @@
+"""IdempotencyStore.claim: duplicates collapse onto the first clip, and reused keys or expired records are handled"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from idempotency import IdempotencyConflict, IdempotencyStore
+
+
+def test_concurrent_duplicates_collapse_onto_one_clip():
+    async def scenario():
+        store = IdempotencyStore(AsyncMongoMockClient()["test"])
+        return await asyncio.gather(*(store.claim("u1", "fp", f"clip{i}") for i in range(5)))
+
+    results = asyncio.run(scenario())
+    winners = [result for result in results if result is None]
+    assert len(winners) == 1
+    assert {result["clip_id"] for result in results if result} == {f"clip{results.index(None)}"}
+
+
+def test_new_key_on_a_duplicate_request_points_at_the_earlier_clip():
+    async def scenario():
+        store = IdempotencyStore(AsyncMongoMockClient()["test"])
+        assert await store.claim("u1", "fp", "c1") is None
+        duplicate = await store.claim("u1", "fp", "c2", key="k1")
+        # A retry with the same key finds c1 through the key record alone
+        retried = await store.claim("u1", "fp", "c3", key="k1")
+        with pytest.raises(IdempotencyConflict):
+            await store.claim("u1", "other", "c4", key="k1")
+        return duplicate, retried
+
+    duplicate, retried = asyncio.run(scenario())
+    assert duplicate["clip_id"] == "c1" and retried["clip_id"] == "c1" and retried["_id"] == "key:u1:k1"
+
+
+def test_expired_and_released_records_free_the_request():
+    async def scenario():
+        store = IdempotencyStore(AsyncMongoMockClient()["test"], fingerprint_window_seconds=600)
+        await store.claim("u1", "fp", "c1")
+        # Past its window, but not yet removed by the TTL monitor
+        await store.records.update_one({"_id": "fp:fp"}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+        after_expiry = await store.claim("u1", "fp", "c2")
+        await store.release("c2")
+        after_release = await store.claim("u1", "fp", "c3")
+        return after_expiry, after_release, await store.records.find_one({"_id": "fp:fp"})
+
+    after_expiry, after_release, record = asyncio.run(scenario())
+    assert after_expiry is None and after_release is None and record["clip_id"] == "c3"
@@ -0,0 +1,73 @@
+"""JobQueue leases: dead workers' jobs are reclaimed, and per-user slots hold the running cap across nodes"""
+import asyncio
+from datetime import datetime, timedelta
+
+from mongomock_motor import AsyncMongoMockClient
+
+from job_queue import JobQueue
+from scheduling import FairShareScheduler
+
+
+def queue(db, max_running_per_user=None, **options):
+    # A long counts_ttl stands for a node whose cached running counts are stale
+    scheduler = FairShareScheduler(db, max_running_per_user, counts_ttl=3600) if max_running_per_user else None
+    return JobQueue(db, scheduler=scheduler, **options)
+
+
+async def expire_lease(db, job_id):
+    await db.jobs.update_one({"_id": job_id}, {"$set": {"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+
+
+def test_expired_lease_is_reclaimed_by_another_worker():
+    async def scenario():
+        db = AsyncMongoMockClient()["test"]
+        jobs = queue(db)
+        await jobs.ensure_indexes()
+        await jobs.enqueue("render_clip", {}, "j1")
+        first = await jobs.claim("w1")
+        assert await jobs.claim("w2") is None
+        await expire_lease(db, "j1")
+        second = await jobs.claim("w2")
+        # The first worker comes back from a pause and finds its job taken over
+        return first, second, await jobs.heartbeat("j1", "w1"), await jobs.complete("j1", "w1"), await jobs.complete("j1", "w2")
+
+    first, second, heartbeat, stale_complete, complete = asyncio.run(scenario())
+    assert first["_id"] == second["_id"] == "j1" and second["worker_id"] == "w2" and second["attempts"] == 2
+    assert heartbeat == "lost" and not stale_complete and complete
+
+
+def test_job_that_keeps_killing_workers_is_dead_lettered():
+    async def scenario():
+        db = AsyncMongoMockClient()["test"]
+        jobs = queue(db, max_attempts=2)
+        await jobs.enqueue("render_clip", {}, "j1")
+        for worker in ("w1", "w2"):
+            assert (await jobs.claim(worker))["_id"] == "j1"
+            await expire_lease(db, "j1")
+        return await jobs.claim("w3"), await jobs.stats()
+
+    claimed, stats = asyncio.run(scenario())
+    assert claimed is None and stats == {"dead": 1}
+
+
+def test_user_slots_cap_running_jobs_despite_stale_counts():
+    async def scenario():
+        db = AsyncMongoMockClient()["test"]
+        node_a, node_b = queue(db, 1), queue(db, 1)
+        await node_a.ensure_indexes()
+        for job_id in ("j1", "j2"):
+            await node_a.enqueue("render_clip", {}, job_id, user_id="u1", cost=10)
+        # Both nodes read the running counts while nothing ran
+        for node in (node_a, node_b):
+            await node.scheduler.cached_running_counts(db.jobs, datetime.utcnow())
+
+        first = await node_a.claim("wa")
+        # Node B still believes u1 has a free slot; the unique slot index refuses its lease
+        blocked = await node_b.claim("wb")
+        await node_a.complete(first["_id"], "wa")
+        second = await node_b.claim("wb")
+        return first, blocked, second
+
+    first, blocked, second = asyncio.run(scenario())
+    assert first["slot"] == 0 and blocked is None
+    assert second["_id"] != first["_id"] and second["slot"] == 0
@@ -0,0 +1,203 @@
+"""Pure media helpers: silence detection, smart-cut planning, waveform peaks, highlight scoring, HLS ladders and frame fan-out"""
+from types import SimpleNamespace
+
+import numpy as np
+
+import hls
+import smart_cut
+import waveform
+from frames import Tap, fan_out
+from highlights import SceneCutTap, normalize, suggest_highlights, top_windows
+from silence import SilenceDetector, jump_cut_filters, keep_segments, trim_bounds
+
+RATE = 1000
+
+
+def tone(seconds, amplitude=0.3):
+    return (amplitude * np.sin(np.arange(int(seconds * RATE)) * 0.3)).astype(np.float32)
+
+
+def quiet(seconds, amplitude=0.0):
+    return np.full(int(seconds * RATE), amplitude, dtype=np.float32)
+
+
+# Silence detection
+
+
+def detect(samples, block=None, **options):
+    detector = SilenceDetector(sample_rate=RATE, **options)
+    block = block or len(samples)
+    found = []
+    for start in range(0, len(samples), block):
+        found += detector.feed(samples[start:start + block])
+    return found + detector.finish(), detector
+
+
+def test_silence_intervals_and_min_length():
+    audio = np.concatenate([tone(1), quiet(0.6), tone(1), quiet(0.3), tone(1), quiet(1)])
+    silences, detector = detect(audio, min_silence=0.5)
+    # The 0.3 s gap is shorter than min_silence; the trailing one is closed by finish()
+    assert silences == [(1.0, 1.6), (3.9, 4.9)]
+    assert detector.duration == 4.9
+
+
+def test_silence_threshold_is_relative_to_full_scale():
+    # -40 dBFS is an RMS of 0.01: a 0.005 hum counts as silence, 0.02 does not
+    hum = np.concatenate([tone(1), quiet(1, 0.005), tone(1)])
+    noise = np.concatenate([tone(1), quiet(1, 0.02), tone(1)])
+    assert detect(hum, threshold_db=-40)[0] == [(1.0, 2.0)]
+    assert detect(noise, threshold_db=-40)[0] == []
+
+
+def test_silence_is_independent_of_block_boundaries():
+    audio = np.concatenate([quiet(0.7), tone(1.3), quiet(0.9), tone(0.5)])
+    whole, _ = detect(audio)
+    # Blocks that split frames and silences in odd places
+    assert detect(audio, block=333)[0] == whole
+    assert detect(audio, block=17)[0] == whole
+
+
+def test_keep_segments_and_trim():
+    silences = [(0.0, 1.0), (4.0, 6.0), (9.5, 10.0)]
+    assert keep_segments(silences, 10.0, padding=0.1) == [(0.9, 4.1), (5.9, 9.6)]
+    # Silences too short to survive the padding are left in
+    assert keep_segments([(2.0, 2.15)], 5.0, padding=0.1) == [(0.0, 5.0)]
+    assert trim_bounds(silences, 10.0) == (1.0, 9.5)
+    filters = jump_cut_filters([(0.9, 4.1), (5.9, 9.6)])
+    assert filters["video"].startswith("select='between(t,0.9,4.1)+between(t,5.9,9.6)'")
+
+
+# Smart cut
+
+
+def test_plan_copies_whole_gops_and_encodes_edges():
+    keyframes = [0.0, 2.0, 4.0, 6.0, 8.0]
+    assert smart_cut.plan(keyframes, 1.0, 7.0) == [("encode", 1.0, 2.0), ("copy", 2.0, 6.0), ("encode", 6.0, 7.0)]
+
+
+def test_plan_at_gop_edges():
+    keyframes = [0.0, 2.0, 4.0, 6.0, 8.0]
+    # Cuts on keyframes need no edge encodes; float noise around a keyframe is absorbed
+    assert smart_cut.plan(keyframes, 2.0, 6.0) == [("copy", 2.0, 6.0)]
+    assert smart_cut.plan(keyframes, 1.9999, 6.0004) == [("copy", 2.0, 6.0)]
+    # Inside a single GOP there is nothing to copy
+    assert smart_cut.plan(keyframes, 2.5, 3.5) == [("encode", 2.5, 3.5)]
+    assert smart_cut.plan(keyframes, 8.5, 9.0) == [("encode", 8.5, 9.0)]
+    assert smart_cut.plan([], 1.0, 3.0) == [("encode", 1.0, 3.0)]
+
+
+def test_encoder_options_match_the_source():
+    options = smart_cut.encoder_options(
+        {"codec_name": "h264", "profile": "High", "level": 41, "pix_fmt": "yuv420p", "r_frame_rate": "30000/1001"}
+    )
+    assert options[:2] == ["-c:v", "libx264"]
+    assert options[options.index("-profile:v") + 1] == "high"
+    assert options[options.index("-level:v") + 1] == "4.1"
+    assert options[options.index("-r") + 1] == "30000/1001"
+    # Codecs we cannot encode to match are re-encoded whole as plain H.264
+    assert smart_cut.encoder_options({"codec_name": "vp9"})[:2] == ["-c:v", "libx264"]
+
+
+# Waveform peaks
+
+
+def test_waveform_peaks_round_trip():
+    samples = np.zeros(waveform.SAMPLES_PER_PEAK * 3 + 10, dtype=np.int16)
+    samples[5] = 32767
+    samples[waveform.SAMPLES_PER_PEAK + 1] = -32768
+    builder = waveform.PeakBuilder()
+    # Odd block sizes exercise the carry between feeds
+    for start in range(0, len(samples), 700):
+        builder.feed(samples[start:start + 700])
+    builder.finish()
+
+    decoded = waveform.decode(builder.encode())
+    finest = decoded["levels"][0]
+    assert decoded["sample_rate"] == waveform.SAMPLE_RATE
+    assert list(finest["maxs"]) == [127, 0, 0, 0]
+    assert list(finest["mins"]) == [0, -128, 0, 0]
+
+
+def test_waveform_levels_fold_by_level_factor():
+    builder = waveform.PeakBuilder(samples_per_peak=4)
+    builder.feed(np.arange(-8192, 8192, dtype=np.int16))
+    builder.finish()
+    levels = builder.levels()
+    assert [level[0] for level in levels] == [4 * waveform.LEVEL_FACTOR ** i for i in range(len(levels))]
+    # Coarser levels keep the envelope of the finer ones
+    for _, mins, maxs in levels:
+        assert mins.min() == -32 and maxs.max() == 31
+
+
+# Highlights
+
+
+def test_normalize_handles_spikes_and_flat_signals():
+    assert normalize(np.zeros(5)).tolist() == [0.0] * 5
+    values = normalize(np.array([0, 1, 2, 3] * 10 + [100]))
+    assert values.max() == 1.0 and 0.0 < values[1] < 1.0
+
+
+def test_top_windows_do_not_overlap():
+    score = np.zeros(60)
+    score[10:15] = 1.0
+    score[40:45] = 0.8
+    windows = top_windows(score, window=5, count=3)
+    assert [(w["start"], w["end"]) for w in windows[:2]] == [(10, 15), (40, 45)]
+    for a in windows:
+        for b in windows:
+            assert a is b or a["end"] <= b["start"] or b["end"] <= a["start"]
+
+
+def test_suggest_highlights_follows_keywords():
+    segments = [{"start": float(s), "end": float(s + 1), "text": "filler"} for s in range(60)]
+    segments[30]["text"] = "the big reveal"
+    windows = suggest_highlights(60, segments, keywords=["reveal"], window=10, count=1)
+    assert windows[0]["start"] <= 30 < windows[0]["end"]
+
+
+def test_scene_cut_tap_across_batches():
+    frames = np.zeros((6, 9, 16), np.uint8)
+    frames[3:] = 200
+    tap = SceneCutTap(threshold=0.3)
+    tap.feed(frames[:2], np.arange(2) / 4)
+    tap.feed(frames[2:5], np.arange(2, 5) / 4)
+    tap.feed(frames[5:], np.array([1.25]))
+    assert tap.cuts == [0.75]
+
+
+def test_fan_out_keeps_stride_across_batches():
+    batches = [np.arange(i, i + 3) for i in range(0, 9, 3)]
+    source = SimpleNamespace(batches=lambda batch: iter(batches), times=lambda first, count: np.arange(first, first + count) / 2)
+    every, all_frames = [], []
+    fan_out(source, [Tap(lambda f, t: every.extend(f), every=2), Tap(lambda f, t: all_frames.extend(t))])
+    assert every == [0, 2, 4, 6, 8]
+    assert all_frames == [i / 2 for i in range(9)]
+
+
+# HLS
+
+
+def test_ladder_never_upscales():
+    assert [r["name"] for r in hls.ladder_for(1080)] == ["1080p", "720p", "480p"]
+    assert [r["name"] for r in hls.ladder_for(720)] == ["720p", "480p"]
+    short = hls.ladder_for(361)
+    assert [(r["name"], r["height"]) for r in short] == [("360p", 360)]
+    assert int(short[0]["video_bitrate"][:-1]) < int(hls.LADDER[-1]["video_bitrate"][:-1])
+    # Unknown height: the lowest rung
+    assert hls.ladder_for(0) == [hls.LADDER[-1]]
+
+
+def test_hls_command_applies_edits_in_the_same_pass():
+    command = hls.hls_command("in.mp4", "/out", hls.ladder_for(720), edits=[(0.0, 1.5), (2.0, 4.0)])
+    graph = command[command.index("-filter_complex") + 1]
+    assert graph.count("[0:v]select=") == 1 and graph.count("[0:a]aselect=") == 1 and "asplit=3" in graph
+    assert command.count("-i") == 1
+
+
+def test_hls_command_without_audio_is_video_only():
+    for edits in (None, [(0.0, 1.5), (2.0, 4.0)]):
+        command = hls.hls_command("in.mp4", "/out", hls.ladder_for(720), edits=edits, audio=False)
+        graph = command[command.index("-filter_complex") + 1]
+        assert "0:a" not in graph and "0:a:0?" not in command and "-c:a:0" not in command
+        assert command[command.index("-var_stream_map") + 1] == "v:0,name:720p v:1,name:480p"
@@ -0,0 +1,49 @@
+"""run_for_request: in-request media work answers within its deadline even when the work itself cannot be killed"""
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+class FakeRequest:
+    def __init__(self, disconnected: bool = False):
+        self.disconnected = disconnected
+
+    async def is_disconnected(self) -> bool:
+        return self.disconnected
+
+
+def test_hung_work_returns_504_at_the_deadline():
+    release = threading.Event()
+
+    async def scenario():
+        started = time.monotonic()
+        with pytest.raises(HTTPException) as error:
+            await server.run_for_request(FakeRequest(), release.wait, 30, timeout=0.3)
+        elapsed = time.monotonic() - started
+        # Let the abandoned thread end, or asyncio.run waits for it on shutdown
+        release.set()
+        return error.value.status_code, elapsed
+
+    status, elapsed = asyncio.run(scenario())
+    assert status == 504 and elapsed < 2
+
+
+def test_disconnected_client_gets_499_without_waiting():
+    release = threading.Event()
+
+    async def scenario():
+        with pytest.raises(HTTPException) as error:
+            await server.run_for_request(FakeRequest(disconnected=True), release.wait, 30, timeout=10)
+        release.set()
+        return error.value.status_code
+
+    assert asyncio.run(scenario()) == 499
+
+
+def test_result_is_returned():
+    assert asyncio.run(server.run_for_request(FakeRequest(), sum, [1, 2, 3])) == 6
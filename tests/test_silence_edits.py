@@ -0,0 +1,57 @@
+"""Silence edit lists: a clip with nothing to cut keeps its render, and a clip mid-render is not given cuts it will miss"""
+import asyncio
+
+import numpy as np
+from fastapi import HTTPException
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+from artifact_store import artifact_key
+from silence import cuts_anything
+
+
+class FakeRequest:
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+def speech_only(url, start, end, detector):
+    audio = (0.3 * np.sin(np.arange(5 * detector.sample_rate) * 0.1)).astype(np.float32)
+    return detector.feed(audio) + detector.finish()
+
+
+def analyze(monkeypatch, status):
+    """Run the endpoint on a five-second clip of speech; returns its response, or HTTPException, and the stored clip"""
+    monkeypatch.setattr(server, "detect_clip_silence", speech_only)
+
+    async def scenario():
+        monkeypatch.setattr(server, "db", AsyncMongoMockClient()["test"])
+        await server.db.clips.insert_one(
+            {"_id": "c1", "user_id": "u1", "youtube_url": "https://youtu.be/x", "start_time": 0, "end_time": 5, "status": status}
+        )
+        try:
+            result = await server.analyze_clip_silence("c1", server.SilenceRequest(), FakeRequest(), current_user={"_id": "u1"})
+        except HTTPException as error:
+            result = error
+        return result, await server.db.clips.find_one({"_id": "c1"})
+
+    return asyncio.run(scenario())
+
+
+def test_full_length_keep_is_no_edit():
+    assert not cuts_anything([(0.0, 5.0)], 5.0)
+    assert cuts_anything([(0.0, 4.0)], 5.0) and cuts_anything([(0.5, 5.0)], 5.0)
+
+
+def test_clip_without_silence_is_not_rendered_again(monkeypatch):
+    result, stored = analyze(monkeypatch, "completed")
+    assert result["rerender"] is False and result["keep_segments"] == [] and result["filters"] is None
+    assert stored["status"] == "completed"
+    # Same key as before the analysis, so the existing artifact still serves the clip
+    assert artifact_key("v", 0, 5, [], "p", stored["silence"]["keep_segments"]) == artifact_key("v", 0, 5, [], "p")
+
+
+def test_clip_mid_render_is_refused(monkeypatch):
+    error, stored = analyze(monkeypatch, "processing")
+    assert isinstance(error, HTTPException) and error.status_code == 409
+    assert "silence" not in stored
@@ -0,0 +1,92 @@
+"""UploadStore: resuming at the stored offset, finalizing once per content hash, and expiring abandoned sessions"""
+import asyncio
+import hashlib
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from uploads import UploadError, UploadStore
+
+
+async def body(*parts):
+    for part in parts:
+        yield part
+
+
+def store(tmp_path):
+    return UploadStore(AsyncMongoMockClient()["test"], str(tmp_path), max_size=100, max_chunk=10, session_ttl=timedelta(hours=1))
+
+
+def test_resume_and_finalize(tmp_path):
+    async def scenario():
+        uploads = store(tmp_path)
+        session = await uploads.create("u1", "a.mp4", 12, "video/mp4")
+        await uploads.write_chunk("u1", session["_id"], 0, body(b"hello ", b"wor"))
+        # A retried chunk from the old offset is refused with the offset to resume from
+        with pytest.raises(UploadError) as error:
+            await uploads.write_chunk("u1", session["_id"], 0, body(b"hello "))
+        assert error.value.status_code == 409 and error.value.offset == 9
+        # A new process has no running hash; it is rebuilt from the partial file
+        uploads._hashers.clear()
+        await uploads.write_chunk("u1", session["_id"], 9, body(b"ld!"))
+        media = await uploads.finalize("u1", session["_id"], hashlib.sha256(b"hello world!").hexdigest())
+        again = await uploads.finalize("u1", session["_id"])
+        return media, again
+
+    media, again = asyncio.run(scenario())
+    assert media["_id"] == again["_id"] == hashlib.sha256(b"hello world!").hexdigest()
+    with open(media["path"], "rb") as f:
+        assert f.read() == b"hello world!"
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    async def scenario():
+        uploads = store(tmp_path)
+        results = []
+        for user_id in ("u1", "u2"):
+            session = await uploads.create(user_id, "a.mp4", 4, "video/mp4")
+            await uploads.write_chunk(user_id, session["_id"], 0, body(b"same"))
+            results.append(await uploads.finalize(user_id, session["_id"]))
+            assert not os.path.exists(uploads.partial_path(session["_id"]))
+        return results
+
+    first, second = asyncio.run(scenario())
+    assert not first["deduplicated"] and second["deduplicated"]
+    assert second["owners"] == ["u1", "u2"]
+
+
+def test_incomplete_or_corrupt_uploads_are_not_finalized(tmp_path):
+    async def scenario():
+        uploads = store(tmp_path)
+        session = await uploads.create("u1", "a.mp4", 8, "video/mp4")
+        await uploads.write_chunk("u1", session["_id"], 0, body(b"abcd"))
+        with pytest.raises(UploadError) as incomplete:
+            await uploads.finalize("u1", session["_id"])
+        await uploads.write_chunk("u1", session["_id"], 4, body(b"efgh"))
+        with pytest.raises(UploadError) as mismatch:
+            await uploads.finalize("u1", session["_id"], "0" * 64)
+        return incomplete.value.status_code, mismatch.value.status_code, await uploads.sessions.count_documents({})
+
+    assert asyncio.run(scenario()) == (409, 422, 0)
+
+
+def test_stale_sessions_expire_unless_a_finalizer_holds_them(tmp_path):
+    async def scenario():
+        uploads = store(tmp_path)
+        past, future = datetime.utcnow() - timedelta(minutes=1), datetime.utcnow() + timedelta(minutes=5)
+        # Backdated only once all exist, since create() itself expires stale sessions
+        ids = [(await uploads.create("u1", "a.mp4", 4, "video/mp4"))["_id"] for _ in range(3)]
+        for session_id, status, locked_until in zip(ids, ("uploading", "finalizing", "finalizing"), (None, past, future)):
+            await uploads.sessions.update_one(
+                {"_id": session_id}, {"$set": {"status": status, "locked_until": locked_until, "expires_at": past}}
+            )
+        expired = await uploads.expire_stale()
+        left = [session["_id"] async for session in uploads.sessions.find({})]
+        return ids, expired, left
+
+    (abandoned, dead_finalizer, finalizing), expired, left = asyncio.run(scenario())
+    assert expired == 2 and left == [finalizing]
+    for session_id in (abandoned, dead_finalizer):
+        assert not os.path.exists(os.path.join(str(tmp_path), "partial", session_id))